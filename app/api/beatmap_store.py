@@ -0,0 +1,187 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: the store is disabled
+    fcntl = None
+
+
+# osu! beatmap statuses, stored as their index + 1 (0 marks an empty slot)
+STATUSES = ('graveyard', 'wip', 'pending', 'ranked', 'approved', 'qualified', 'loved')
+
+# Ranked/approved beatmaps never change; anything else (pending, qualified,
+# loved, graveyard) may still be edited, so it is never persisted
+IMMUTABLE_BEATMAP_STATUSES = ('ranked', 'approved')
+
+# status, difficulty_rating, ar, bpm, total_length
+_RECORD = struct.Struct('<BxxxfffI')
+
+
+class BeatmapStore:
+    """Persistent beatmap metadata store in a memory-mapped fixed-record file.
+
+    Record N holds beatmap id N, so a lookup is an offset computation and an
+    unpack straight from the shared page cache: no syscalls, no parsing, and
+    every worker process on the host maps the same pages. The file is sparse,
+    so unused id ranges cost no disk space.
+
+    Only the fields the analysis reads are kept (difficulty_rating, ar, bpm,
+    status and total_length), and only for beatmaps whose status makes them
+    immutable, so a record never needs rewriting once it exists.
+    """
+
+    def __init__(self, path: str, grow_records: int = 1 << 18):
+        self.path = path
+        self.grow_records = grow_records
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+        self._map = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, beatmap_id: int) -> Optional[Dict]:
+        """Return the stored metadata for a beatmap, or None"""
+        record = self._read(beatmap_id)
+        if record is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record
+
+    def get_many(self, beatmap_ids: Iterable[int]) -> Dict[int, Dict]:
+        found = {}
+        for beatmap_id in beatmap_ids:
+            record = self.get(beatmap_id)
+            if record is not None:
+                found[beatmap_id] = record
+        return found
+
+    def put(self, beatmap: Dict) -> bool:
+        """Persist a beatmap if it is immutable; returns whether it was stored"""
+        beatmap_id = beatmap.get('id')
+        status = beatmap.get('status')
+        if not beatmap_id or beatmap_id < 0 or status not in IMMUTABLE_BEATMAP_STATUSES:
+            return False
+        if any(beatmap.get(field) is None for field in ('difficulty_rating', 'ar', 'bpm')):
+            return False
+
+        payload = _RECORD.pack(
+            STATUSES.index(status) + 1,
+            float(beatmap['difficulty_rating']),
+            float(beatmap['ar']),
+            float(beatmap['bpm']),
+            int(beatmap.get('total_length') or 0)
+        )
+        offset = beatmap_id * _RECORD.size
+
+        with self._lock:
+            fd = self._open()
+            if fd is None:
+                return False
+            self._ensure_size(fd, offset + _RECORD.size)
+            # Fields first, status byte last: a reader that sees a non-zero
+            # status always sees the complete record
+            os.pwrite(fd, payload[1:], offset + 1)
+            os.pwrite(fd, payload[:1], offset)
+
+        self.writes += 1
+        return True
+
+    def put_many(self, beatmaps: Iterable[Dict]) -> int:
+        return sum(1 for beatmap in beatmaps if self.put(beatmap))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'mapped_bytes': len(self._map) if self._map is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'writes': self.writes
+        }
+
+    def _read(self, beatmap_id: int) -> Optional[Dict]:
+        if not beatmap_id or beatmap_id < 0:
+            return None
+
+        offset = beatmap_id * _RECORD.size
+        mapped = self._map
+        if mapped is None or offset + _RECORD.size > len(mapped):
+            # Another process may have grown the file since we mapped it
+            mapped = self._remap()
+            if mapped is None or offset + _RECORD.size > len(mapped):
+                return None
+
+        status, difficulty_rating, ar, bpm, total_length = _RECORD.unpack_from(mapped, offset)
+        if not status:
+            return None
+
+        return {
+            'id': beatmap_id,
+            'status': STATUSES[status - 1],
+            'difficulty_rating': round(difficulty_rating, 2),
+            'ar': round(ar, 1),
+            'bpm': round(bpm, 2),
+            'total_length': total_length
+        }
+
+    def _open(self) -> Optional[int]:
+        # Reopen after fork() so each worker has its own descriptor (and lock)
+        pid = os.getpid()
+        if self._fd is None or self._fd_pid != pid:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._fd_pid = pid
+            except OSError as e:
+                print(f"Beatmap store unavailable at {self.path}: {e}")
+                return None
+        return self._fd
+
+    def _ensure_size(self, fd: int, size: int):
+        """Grow (never shrink) the file to hold size bytes, in grow_records steps"""
+        if os.fstat(fd).st_size >= size:
+            return
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            # Re-check under the lock: another worker may have grown it further
+            if os.fstat(fd).st_size < size:
+                step = self.grow_records * _RECORD.size
+                os.ftruncate(fd, -(-size // step) * step)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _remap(self) -> Optional[mmap.mmap]:
+        with self._lock:
+            fd = self._open()
+            if fd is None:
+                return None
+
+            size = os.fstat(fd).st_size
+            if size == 0:
+                return None
+            if self._map is None or len(self._map) < size:
+                # The old map is left to the garbage collector, as other
+                # threads may still be reading from it
+                self._map = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+            return self._map
+
+
+def beatmap_store_from_env() -> Optional[BeatmapStore]:
+    """BeatmapStore at OSU_BEATMAP_STORE (default: temp dir); empty disables it"""
+    if fcntl is None:
+        return None
+
+    default_path = os.path.join(tempfile.gettempdir(), 'osu-skillcheck-beatmaps.bin')
+    path = os.getenv('OSU_BEATMAP_STORE', default_path)
+    return BeatmapStore(path) if path else None
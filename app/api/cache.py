@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate the memory footprint of a cached value by its JSON length"""
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and entry/byte limits.
+
+    Each instance is one namespace with its own lock, so lookups in different
+    caches never contend. Entry sizes are estimated before taking the lock and
+    every operation under the lock is O(1) (amortised over evictions).
+    """
+
+    def __init__(self, name: str, max_entries: int = 1000, max_bytes: Optional[int] = None,
+                 default_ttl: Optional[float] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+
+        # key -> (value, expires_at or None, size in bytes), least recently used first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        # Counters are only updated under the lock, but read without it by stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes_inserted = 0
+        self.bytes_removed = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            return self._get_locked(key, default, time.time())
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Return cached values for the keys that are present, under one lock acquisition"""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                value = self._get_locked(key, _MISSING, now)
+                if value is not _MISSING:
+                    found[key] = value
+        return found
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value; ttl overrides the cache's default_ttl (None = no expiry)"""
+        size = estimate_size(value)
+        if ttl is None:
+            ttl = self.default_ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._set_locked(key, value, expires_at, size)
+
+    def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        """Store several values under one lock acquisition"""
+        if ttl is None:
+            ttl = self.default_ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        sized = [(key, value, estimate_size(value)) for key, value in items.items()]
+
+        with self._lock:
+            for key, value, size in sized:
+                self._set_locked(key, value, expires_at, size)
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove a key, returning whether it was present"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._remove_bytes(entry[2])
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._remove_bytes(self._bytes)
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                key for key, (_, expires_at, _) in self._entries.items()
+                if expires_at is not None and expires_at <= now
+            ]
+            for key in expired:
+                _, _, size = self._entries.pop(key)
+                self._remove_bytes(size)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict:
+        """Counters for this namespace.
+
+        Every figure is maintained incrementally, so this is O(1) and reads
+        without taking the lock: a health check never waits on, or delays, a
+        cache lookup. Fields may be off by an in-flight operation.
+        """
+        hits = self.hits
+        misses = self.misses
+        lookups = hits + misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'bytes_inserted': self.bytes_inserted,
+            'bytes_removed': self.bytes_removed
+        }
+
+    def _remove_bytes(self, size: int):
+        self._bytes -= size
+        self.bytes_removed += size
+
+    def _get_locked(self, key: Hashable, default: Any, now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at, size = entry
+        if expires_at is not None and expires_at <= now:
+            del self._entries[key]
+            self._remove_bytes(size)
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _set_locked(self, key: Hashable, value: Any, expires_at: Optional[float], size: int):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._remove_bytes(previous[2])
+
+        # Values larger than the whole byte budget are not worth caching
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        self._entries[key] = (value, expires_at, size)
+        self._bytes += size
+        self.bytes_inserted += size
+
+        # Untouched entries drift to the LRU end, so expired ones are reclaimed
+        # here even if nobody looks them up again
+        now = time.time()
+        while self._entries:
+            oldest_key, (_, oldest_expires_at, oldest_size) = next(iter(self._entries.items()))
+            if oldest_expires_at is None or oldest_expires_at > now:
+                break
+            del self._entries[oldest_key]
+            self._remove_bytes(oldest_size)
+            self.expirations += 1
+
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._remove_bytes(evicted_size)
+            self.evictions += 1
+
+
+_MISSING = object()
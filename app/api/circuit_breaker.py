@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Stop calling the osu! API while it is failing or too slow.
+
+    Outcomes of the calls made in the last `window` seconds are kept. Once at
+    least `min_calls` were made and the share of failures (5xx, timeouts,
+    connection errors) or of calls slower than `slow_call_seconds` reaches its
+    threshold, the breaker opens and calls are refused for `open_seconds`.
+    After that it is half-open: one probe call at a time is let through, and
+    `probe_successes` healthy probes in a row close it again, while a single
+    bad probe re-opens it.
+    """
+
+    def __init__(self, window: float = 30.0, min_calls: int = 10, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 5.0, slow_call_rate: float = 0.5,
+                 open_seconds: float = 30.0, probe_successes: int = 3):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.probe_successes = probe_successes
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (time, failed, slow)
+        self._failed = 0
+        self._slow = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._probe_streak = 0
+
+        self.trips = 0
+        self.rejected = 0
+
+    def allow_request(self) -> bool:
+        """Whether a call may go out now (in half-open state, claims the probe slot)"""
+        with self._lock:
+            now = time.monotonic()
+            if not self._allows(now):
+                self.rejected += 1
+                return False
+            if self._state != CLOSED:
+                self._state = HALF_OPEN
+                self._probe_started = now
+            return True
+
+    def is_open(self) -> bool:
+        """Whether calls are currently being refused"""
+        with self._lock:
+            return not self._allows(time.monotonic())
+
+    def record(self, failed: bool, duration: float = 0.0):
+        """Record the outcome of a call let through by allow_request()"""
+        slow = not failed and duration >= self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probe_started = None
+                if failed or slow:
+                    self._open(now)
+                    return
+                self._probe_streak += 1
+                if self._probe_streak >= self.probe_successes:
+                    print("osu! API recovered, closing circuit breaker")
+                    self._state = CLOSED
+                    self._calls.clear()
+                    self._failed = self._slow = 0
+                return
+            if self._state == OPEN:
+                # A call that started before the breaker tripped
+                return
+
+            self._calls.append((now, failed, slow))
+            self._failed += failed
+            self._slow += slow
+            self._expire(now)
+
+            calls = len(self._calls)
+            if calls >= self.min_calls and (
+                self._failed / calls >= self.failure_rate or self._slow / calls >= self.slow_call_rate
+            ):
+                print(f"osu! API unhealthy ({self._failed} failed, {self._slow} slow of {calls} calls), "
+                      f"opening circuit breaker for {self.open_seconds:.0f}s")
+                self._open(now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'state': self._state,
+                'calls': len(self._calls),
+                'failed': self._failed,
+                'slow': self._slow,
+                'trips': self.trips,
+                'rejected': self.rejected
+            }
+
+    def _allows(self, now: float) -> bool:
+        if self._state == CLOSED:
+            return True
+        if self._state == OPEN:
+            return now - self._opened_at >= self.open_seconds
+        # Half-open: one probe at a time; a probe that never reported back is
+        # given up on after open_seconds
+        return self._probe_started is None or now - self._probe_started >= self.open_seconds
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_started = None
+        self._probe_streak = 0
+        self.trips += 1
+
+    def _expire(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window:
+            _, failed, slow = self._calls.popleft()
+            self._failed -= failed
+            self._slow -= slow
+
+
+def circuit_breaker_from_env() -> Optional[CircuitBreaker]:
+    """CircuitBreaker tuned by OSU_BREAKER_* variables unless OSU_CIRCUIT_BREAKER=0"""
+    if os.getenv('OSU_CIRCUIT_BREAKER', '1') == '0':
+        return None
+    return CircuitBreaker(
+        failure_rate=float(os.getenv('OSU_BREAKER_FAILURE_RATE', '0.5')),
+        slow_call_seconds=float(os.getenv('OSU_BREAKER_SLOW_CALL', '5')),
+        open_seconds=float(os.getenv('OSU_BREAKER_OPEN_SECONDS', '30'))
+    )
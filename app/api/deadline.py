@@ -0,0 +1,62 @@
+import contextlib
+import contextvars
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError, as_completed
+from typing import Iterable, Iterator, Optional
+
+# Monotonic time by which the current request's osu! API work must be done
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+@contextlib.contextmanager
+def request_deadline(seconds: Optional[float]):
+    """Give osu! API calls made inside the block (and tasks it spawns) a total time budget.
+
+    Nested deadlines can only shorten the budget. Also usable as a decorator.
+    """
+    if seconds is None:
+        yield
+        return
+
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left in the current budget, or None when there is no deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def deadline_expired() -> bool:
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def bounded_timeout(timeout: float) -> float:
+    """A request timeout capped by what is left of the current budget"""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    return max(0.0, min(timeout, remaining))
+
+
+def completed_before_deadline(futures: Iterable) -> Iterator:
+    """as_completed() that stops yielding once the current deadline passes"""
+    futures = list(futures)
+    remaining = remaining_time()
+    try:
+        yield from as_completed(futures, timeout=None if remaining is None else max(0.0, remaining))
+    except FuturesTimeoutError:
+        outstanding = sum(1 for future in futures if not future.done())
+        print(f"Deadline reached with {outstanding} requests outstanding, continuing with partial results")
@@ -0,0 +1,98 @@
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+# At most this fraction of requests is hedged, whatever the latencies
+HEDGE_FRACTION = 0.05
+
+
+def latency_route(endpoint: str) -> str:
+    """Endpoint shape used to group latency samples ('users/123/scores/best' -> 'users/scores/best')"""
+    parts = endpoint.split('/')
+    return '/'.join(parts[:1] + parts[2:])
+
+
+class LatencyTracker:
+    """Rolling per-route response times, used to decide when to hedge a request.
+
+    A request still unanswered after its route's p95 latency is probably stuck
+    behind a slow connection or server; a duplicate sent at that point usually
+    answers first, at the cost of about 5% extra upstream calls.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, quantile: float = 0.95,
+                 min_delay: float = 0.05):
+        self.window = window
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self.min_delay = min_delay
+
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, route: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(route)
+            if samples is None:
+                samples = self._samples[route] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, route: str) -> Optional[float]:
+        """The route's latency at `quantile`, once enough samples exist"""
+        with self._lock:
+            samples = self._samples.get(route)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+
+    def hedge_delay(self, route: str) -> Optional[float]:
+        """How long to wait before hedging a request to route (None: not enough data)"""
+        percentile = self.percentile(route)
+        if percentile is None:
+            return None
+        return max(self.min_delay, percentile)
+
+    def stats(self) -> Dict:
+        routes = {}
+        for route in list(self._samples):
+            percentile = self.percentile(route)
+            routes[route] = {
+                'samples': len(self._samples[route]),
+                'percentile_ms': round(percentile * 1000, 1) if percentile is not None else None
+            }
+        return routes
+
+
+class HedgeBudget:
+    """Limits hedges to a fraction of requests.
+
+    Every request earns `fraction` of a hedge, and a hedge spends a whole one,
+    so hedges stay a small share of traffic even when a route's latency jumps
+    and every request outlives the old p95. At most `burst` hedges can be
+    saved up during quiet periods.
+    """
+
+    def __init__(self, fraction: float = HEDGE_FRACTION, burst: float = 5):
+        self.fraction = fraction
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._credit = 0.0
+
+    def record_request(self):
+        with self._lock:
+            self._credit = min(self.burst, self._credit + self.fraction)
+
+    def try_spend(self) -> bool:
+        """Take one hedge from the budget if there is one"""
+        with self._lock:
+            if self._credit < 1:
+                return False
+            self._credit -= 1
+            return True
+
+    def refund(self):
+        with self._lock:
+            self._credit = min(self.burst, self._credit + 1)
@@ -0,0 +1,156 @@
+import queue
+import threading
+from typing import Dict, List, Optional
+
+
+# Changes above this count are sent as a reset: clients reload instead
+MAX_STREAM_CHANGES = 500
+
+
+def change_event(row: Dict) -> Dict:
+    """Stream payload for one changed leaderboard row.
+
+    The rank is left out: one row's change moves the ranks of the rows
+    below it, so clients place and number rows by skill_score instead.
+    """
+    row = {key: value for key, value in row.items() if key != 'rank'}
+    return {
+        'user_id': row['user_id'],
+        'skill_score': row['skill_score'],
+        'version': row['version'],
+        'row': row
+    }
+
+
+class LeaderboardBroadcaster:
+    """Fan leaderboard changes out to every stream client of this worker.
+
+    However many clients are connected, one thread per worker follows the
+    leaderboard: every `interval` seconds (or at once when this worker's
+    update_leaderboard reports a write) it asks for the rows changed since
+    the last version it saw, and puts one event on each client's queue. The
+    thread only runs while at least one client is connected.
+
+    Events are dicts with a 'type': 'changes' (with 'version' and a list of
+    change_event()s) or 'reset' (the changes can't be sent: rows were deleted,
+    too many changed, or the client fell behind), after which the client
+    should reload.
+    """
+
+    def __init__(self, db, interval: float = 5.0, max_queue: int = 100):
+        self.db = db
+        self.interval = interval
+        self.max_queue = max_queue
+
+        self._lock = threading.Lock()
+        self._clients: List[queue.Queue] = []
+        self._thread = None
+        self._wake = threading.Event()
+        self._version: Optional[int] = None
+
+        self.events_published = 0
+        self.clients_reset = 0
+
+        db.add_leaderboard_listener(self.notify)
+
+    def subscribe(self) -> queue.Queue:
+        """Register a client; its events arrive on the returned queue"""
+        client = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._clients.append(client)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='leaderboard-stream', daemon=True)
+                self._thread.start()
+        return client
+
+    def unsubscribe(self, client: queue.Queue):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def notify(self):
+        """Check for changes now instead of at the next interval"""
+        self._wake.set()
+
+    def stats(self) -> Dict:
+        return {
+            'clients': len(self._clients),
+            'running': self._thread is not None and self._thread.is_alive(),
+            'version': self._version,
+            'events_published': self.events_published,
+            'clients_reset': self.clients_reset
+        }
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if not self._clients:
+                    # Start from the then-current version when clients return
+                    self._thread = None
+                    self._version = None
+                    return
+
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Leaderboard stream poll failed: {e}")
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _poll(self):
+        version = self.db.get_leaderboard_version()
+        if version is None:
+            return
+
+        if self._version is None:
+            # Clients catch up to this point themselves when they connect
+            self._version = version['version']
+            return
+
+        if version['reset_version'] > self._version:
+            self._version = version['version']
+            self._publish({'type': 'reset', 'version': self._version})
+            return
+
+        if version['version'] <= self._version:
+            return
+
+        changes = self.db.get_leaderboard_changes(self._version, MAX_STREAM_CHANGES)
+        if changes is None:
+            return
+
+        if len(changes) >= MAX_STREAM_CHANGES:
+            self._version = version['version']
+            self._publish({'type': 'reset', 'version': self._version})
+            return
+
+        if changes:
+            self._version = max(change['version'] for change in changes)
+            self._publish({
+                'type': 'changes',
+                'version': self._version,
+                'changes': [change_event(change) for change in changes]
+            })
+
+    def _publish(self, event: Dict):
+        with self._lock:
+            clients = list(self._clients)
+
+        for client in clients:
+            try:
+                client.put_nowait(event)
+            except queue.Full:
+                # A client this far behind gets a reset instead of the backlog
+                self._drain(client)
+                client.put_nowait({'type': 'reset', 'version': event['version']})
+                self.clients_reset += 1
+
+        self.events_published += 1
+
+    def _drain(self, client: queue.Queue):
+        try:
+            while True:
+                client.get_nowait()
+        except queue.Empty:
+            pass
@@ -1,12 +1,162 @@
 import os
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
 import json
 import hashlib
+import contextlib
+import contextvars
+
+from app.api.cache import TTLCache
+from app.api.singleflight import SingleFlight
+from app.api.beatmap_store import IMMUTABLE_BEATMAP_STATUSES, beatmap_store_from_env
+from app.api.rate_limiter import BACKGROUND, bucket_from_env, request_lane, throttle_delay
+from app.api.deadline import (
+    bounded_timeout, completed_before_deadline, deadline_expired, remaining_time
+)
+from app.api.hedging import HedgeBudget, LatencyTracker, latency_route
+from app.api.circuit_breaker import circuit_breaker_from_env
+
+# The multi-id beatmaps endpoint accepts at most this many ids per call
+BEATMAPS_BULK_LIMIT = 50
+
+# Worker threads carrying hedgeable requests and their hedges
+HEDGE_POOL_SIZE = 32
+
+# Beatmap fields the analysis reads; scores already carrying them skip enrichment
+REQUIRED_BEATMAP_FIELDS = ('difficulty_rating', 'ar', 'bpm')
+
+# Immutable beatmaps can be cached almost forever
+IMMUTABLE_BEATMAP_TTL = 365 * 24 * 3600
+MUTABLE_BEATMAP_TTL = 6 * 3600
+
+
+def beatmap_cache_ttl(beatmap: Dict) -> int:
+    """Cache lifetime for a beatmap based on its ranked status"""
+    if beatmap.get('status') in IMMUTABLE_BEATMAP_STATUSES:
+        return IMMUTABLE_BEATMAP_TTL
+    return MUTABLE_BEATMAP_TTL
+
+
+def shared_beatmap_key(beatmap_id: int) -> str:
+    """api_cache key for a beatmap"""
+    return f"beatmap:{beatmap_id}"
+
+
+# Mods that change osu! difficulty attributes, in canonical order; NC and DC
+# are rate changes identical to DT and HT as far as difficulty goes
+DIFFICULTY_MODS = ('EZ', 'HT', 'HR', 'DT', 'FL', 'TD')
+DIFFICULTY_MOD_ALIASES = {'NC': 'DT', 'DC': 'HT'}
+
+# Attributes only change when the difficulty algorithm is updated
+DIFFICULTY_ATTRIBUTES_TTL = 7 * 24 * 3600
+
+
+def difficulty_mods(mods: Optional[List]) -> Tuple[str, ...]:
+    """The difficulty-relevant subset of a score's mods, as a cache key component"""
+    acronyms = set()
+    for mod in mods or []:
+        acronym = mod.get('acronym') if isinstance(mod, dict) else mod
+        acronyms.add(DIFFICULTY_MOD_ALIASES.get(acronym, acronym))
+    return tuple(mod for mod in DIFFICULTY_MODS if mod in acronyms)
+
+
+def shared_attributes_key(beatmap_id: int, mods: Tuple[str, ...]) -> str:
+    """api_cache key for a beatmap's difficulty attributes under mods"""
+    return f"attributes:{beatmap_id}:{''.join(mods)}"
+
+
+# Stored score history (see OsuClient.attach_score_db)
+RECENT_HISTORY_DAYS = 60
+RECENT_PAGE_SIZE = 50
+RECENT_MAX_PAGES = 4
+BEST_SNAPSHOT_MAX_AGE = timedelta(days=7)
+
+
+def best_snapshot_is_current(score_sync: Optional[Dict], pp: Optional[float]) -> bool:
+    """Whether stored best scores still match the user (total pp unchanged, snapshot recent)"""
+    if not score_sync or pp is None or score_sync.get('best_pp') is None:
+        return False
+    if abs(score_sync['best_pp'] - pp) >= 0.01 or not score_sync.get('best_synced_at'):
+        return False
+    
+    try:
+        synced_at = datetime.fromisoformat(score_sync['best_synced_at'].replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    return datetime.now(timezone.utc) - synced_at < BEST_SNAPSHOT_MAX_AGE
+
+
+def merge_score_history(new_scores: List[Dict], stored_scores: List[Dict]) -> List[Dict]:
+    """Combine freshly fetched and stored scores, newest first, one entry per score id"""
+    merged = {}
+    for score in new_scores + stored_scores:
+        merged.setdefault(score.get('id'), score)
+    return sorted(merged.values(), key=lambda score: score.get('created_at', ''), reverse=True)
+
+
+class UpstreamCallCounter:
+    """Thread-safe count of osu! API calls made on behalf of one analysis"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+
+class StageTimer:
+    """Start offset and duration of each stage of one data fetch, for finding the critical path"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self.stages[name] = {
+                    'start_ms': round((start - self.started) * 1000, 1),
+                    'duration_ms': round((end - start) * 1000, 1)
+                }
+
+    def as_dict(self) -> Dict:
+        ends = [stage['start_ms'] + stage['duration_ms'] for stage in self.stages.values()]
+        return {'total_ms': round(max(ends, default=0.0), 1), 'stages': dict(self.stages)}
+
+    def summary(self) -> str:
+        ordered = sorted(self.stages.items(), key=lambda item: item[1]['start_ms'])
+        return ', '.join(
+            f"{name} {stage['duration_ms']:.0f}ms (+{stage['start_ms']:.0f})" for name, stage in ordered
+        )
+
+
+# Counter for the analysis running in the current context (None outside one)
+_upstream_call_counter = contextvars.ContextVar('upstream_call_counter', default=None)
+
+
+def _discard_response(future):
+    """Done callback for a hedged request that lost the race"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def submit_in_context(executor: ThreadPoolExecutor, fn, *args, **kwargs):
+    """Submit fn to executor, carrying over the caller's context variables"""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
+
 
 class OsuClient:
     def __init__(self):
@@ -18,18 +168,60 @@ class OsuClient:
         
         self.access_token = None
         self.token_expires_at = None
-        self.base_url = 'https://osu.ppy.sh/api/v2'
+        self.base_url = os.getenv('OSU_API_URL', 'https://osu.ppy.sh/api/v2')
+        self.token_url = os.getenv('OSU_TOKEN_URL', 'https://osu.ppy.sh/oauth/token')
         self.session = requests.Session()
         
-        # Enhanced caching
-        self.beatmap_cache = {}
-        self.user_cache = {}
-        self.score_cache = {}
+        # Bounded TTL+LRU caches (beatmaps never expire, they are only evicted)
+        self.beatmap_cache = TTLCache('beatmaps', max_entries=20000, max_bytes=64 * 1024 * 1024)
+        self.user_cache = TTLCache('users', max_entries=2000, max_bytes=16 * 1024 * 1024, default_ttl=600)
+        self.score_cache = TTLCache('responses', max_entries=5000, max_bytes=64 * 1024 * 1024, default_ttl=300)
+        self.attributes_cache = TTLCache(
+            'attributes', max_entries=20000, max_bytes=16 * 1024 * 1024, default_ttl=DIFFICULTY_ATTRIBUTES_TTL
+        )
         self.cache_lock = threading.Lock()
         
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 0.05  # 50ms between requests (more aggressive)
+        # Identical concurrent upstream calls share one in-flight request
+        self._inflight = SingleFlight()
+        
+        # Token bucket shared by this client's threads and, through a lock
+        # file, by every worker process on the host
+        self.rate_limiter = bucket_from_env(self.client_id)
+        self.max_retries = 4
+        
+        # Per-request timeout, further capped by the caller's deadline (see app.api.deadline)
+        self.request_timeout = float(os.getenv('OSU_REQUEST_TIMEOUT', '10'))
+        
+        # Requests slower than their route's p95 get a duplicate; first answer wins
+        self.hedge_requests = os.getenv('OSU_HEDGE_REQUESTS', '1') != '0'
+        self.latency = LatencyTracker()
+        self.hedge_budget = HedgeBudget()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix='osu-hedge')
+        self._hedge_pool_busy = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+        
+        # Stops calling osu! while it is failing, so routes can serve stored results
+        self.circuit_breaker = circuit_breaker_from_env()
+        
+        # Upstream call accounting (lifetime total, per-analysis via UpstreamCallCounter)
+        self.upstream_calls = 0
+        
+        # Only fetch full beatmaps for scores whose embedded beatmap lacks analysis fields
+        self.elide_enrichment = os.getenv('OSU_ELIDE_ENRICHMENT', '1') != '0'
+        
+        # Fetch real star ratings for modded scores instead of approximating them
+        self.fetch_difficulty_attributes = os.getenv('OSU_DIFFICULTY_ATTRIBUTES', '1') != '0'
+        
+        # Optional second tier shared between instances (see attach_shared_cache)
+        self.shared_cache = None
+        
+        # Host-local persistent store of immutable beatmap metadata
+        self.beatmap_store = beatmap_store_from_env()
+        
+        # Optional score history in the database (see attach_score_db)
+        self.score_db = None
         
         # Performance optimization
         self.session.headers.update({
@@ -43,7 +235,7 @@ class OsuClient:
             return True
             
         try:
-            response = self.session.post('https://osu.ppy.sh/oauth/token', json={
+            response = self.session.post(self.token_url, json={
                 'client_id': self.client_id,
                 'client_secret': self.client_secret,
                 'grant_type': 'client_credentials',
@@ -68,77 +260,234 @@ class OsuClient:
     
     def _rate_limit(self):
         """Enforce rate limiting"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            time.sleep(self.min_request_interval - time_since_last)
-        self.last_request_time = time.time()
+        self.rate_limiter.acquire()
+    
+    def _count_upstream_call(self):
+        """Record one osu! API call globally and for the current analysis"""
+        with self.cache_lock:
+            self.upstream_calls += 1
+        counter = _upstream_call_counter.get()
+        if counter is not None:
+            counter.increment()
     
-    def _get_cache_key(self, endpoint: str, params: Dict = None) -> str:
+    def _get_cache_key(self, endpoint: str, params: Dict = None, json_body: Dict = None) -> str:
         """Generate cache key for request"""
         cache_string = f"{endpoint}:{json.dumps(params or {}, sort_keys=True)}"
+        if json_body is not None:
+            cache_string += f":{json.dumps(json_body, sort_keys=True)}"
         return hashlib.md5(cache_string.encode()).hexdigest()
     
-    def make_request(self, endpoint: str, params: Dict = None, cache_timeout: int = 300) -> Optional[Dict]:
-        """Make authenticated request to osu! API with caching and rate limiting"""
+    def make_request(self, endpoint: str, params: Dict = None, cache_timeout: int = 300,
+                     json_body: Dict = None) -> Optional[Dict]:
+        """Make authenticated request to osu! API with caching and rate limiting (POST when json_body is given)"""
         if not self.get_client_credentials_token():
             print("Failed to get access token")
             return None
         
-        # Check cache first
-        cache_key = self._get_cache_key(endpoint, params)
-        with self.cache_lock:
-            if cache_key in self.score_cache:
-                cached_data, cached_time = self.score_cache[cache_key]
-                if time.time() - cached_time < cache_timeout:
-                    return cached_data
+        # Check cache first (cache_timeout <= 0 bypasses the response cache)
+        cache_key = self._get_cache_key(endpoint, params, json_body)
+        if cache_timeout > 0:
+            cached_data = self.score_cache.get(cache_key)
+            if cached_data is not None:
+                return cached_data
+        
+        # Concurrent callers for the same key wait on one upstream request
+        return self._shared_call(cache_key, self._fetch, endpoint, params, cache_key, cache_timeout, json_body)
+    
+    def _shared_call(self, key, fn, *args):
+        """Run fn through the in-flight registry; None if the deadline passes while waiting on another caller"""
+        try:
+            return self._inflight.do(key, fn, *args)
+        except TimeoutError:
+            print(f"Deadline reached waiting for in-flight request {key}")
+            return None
+    
+    def _fetch(self, endpoint: str, params: Optional[Dict], cache_key: str, cache_timeout: int,
+               json_body: Optional[Dict] = None) -> Optional[Dict]:
+        """Perform the upstream request for make_request (once per in-flight key)"""
+        # The previous flight for this key may have filled the cache after our lookup
+        if cache_timeout > 0:
+            cached_data = self.score_cache.get(cache_key)
+            if cached_data is not None:
+                return cached_data
         
-        self._rate_limit()
         url = f"{self.base_url}/{endpoint}"
         
-        try:
-            response = self.session.get(url, params=params or {}, timeout=10)
+        for attempt in range(self.max_retries + 1):
+            if deadline_expired():
+                print(f"Deadline exceeded, skipping {endpoint}")
+                return None
+            
+            if not self._circuit_allows():
+                print(f"osu! API circuit open, skipping {endpoint}")
+                return None
+            
+            self._rate_limit()
+            self._count_upstream_call()
+            
+            started = time.monotonic()
+            try:
+                response = self._send(endpoint, 'GET' if json_body is None else 'POST', url, params, json_body)
+            except requests.exceptions.Timeout:
+                self._record_outcome(True, started)
+                print(f"Request timeout for {endpoint}")
+                return None
+            except requests.exceptions.RequestException as e:
+                self._record_outcome(True, started)
+                print(f"Request error: {e}")
+                return None
+            except Exception as e:
+                self._record_outcome(True, started)
+                print(f"Unexpected error: {e}")
+                return None
+            
+            self._record_outcome(response.status_code >= 500, started)
             
             if response.status_code == 200:
                 data = response.json()
                 
                 # Cache the result
-                with self.cache_lock:
-                    self.score_cache[cache_key] = (data, time.time())
+                if cache_timeout > 0:
+                    self.score_cache.set(cache_key, data, ttl=cache_timeout)
                 
                 return data
             elif response.status_code == 429:  # Rate limit
-                print("Rate limited, waiting 2 seconds...")
-                time.sleep(2)
-                return self.make_request(endpoint, params, cache_timeout)
+                if attempt == self.max_retries:
+                    break
+                # Back off every thread and worker sharing the bucket, not just this one
+                delay = throttle_delay(response.headers.get('Retry-After'), attempt)
+                print(f"Rate limited, backing off {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                self.rate_limiter.penalize(delay)
+                remaining = remaining_time()
+                if remaining is not None and remaining < delay:
+                    print(f"Deadline leaves no time to retry {endpoint}")
+                    return None
+                continue
             elif response.status_code == 404:
                 print(f"Resource not found: {endpoint}")
                 return None
             else:
                 print(f"API request failed: {response.status_code} - {response.text}")
                 return None
-                
-        except requests.exceptions.Timeout:
-            print(f"Request timeout for {endpoint}")
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
-            return None
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return None
+        
+        print(f"Giving up on {endpoint} after {self.max_retries} rate-limited retries")
+        return None
+    
+    def _circuit_allows(self) -> bool:
+        return self.circuit_breaker is None or self.circuit_breaker.allow_request()
+    
+    def _record_outcome(self, failed: bool, started: float):
+        """Report a call's outcome (5xx and transport errors fail) to the circuit breaker"""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(failed, time.monotonic() - started)
+    
+    def circuit_open(self) -> bool:
+        """Whether osu! API calls are currently refused by the circuit breaker"""
+        return self.circuit_breaker is not None and self.circuit_breaker.is_open()
+    
+    def _send(self, endpoint: str, method: str, url: str, params: Optional[Dict],
+              json_body: Optional[Dict]) -> requests.Response:
+        """Send one request, hedging it with a duplicate if it outlives the route's p95 latency"""
+        route = latency_route(endpoint)
+        timeout = bounded_timeout(self.request_timeout)
+        self.hedge_budget.record_request()
+        hedge_delay = self.latency.hedge_delay(route) if self.hedge_requests else None
+        # A busy pool would queue both the request and its hedge
+        if hedge_delay is None or hedge_delay >= timeout or not self._hedge_pool_has_room():
+            return self._timed_request(route, method, url, params, json_body, timeout)
+        
+        sent = threading.Event()
+        primary = self._submit_request(route, method, url, params, json_body, timeout, sent)
+        try:
+            # The delay runs from when the request went out, not from when it was queued
+            sent.wait(timeout)
+            return primary.result(timeout=hedge_delay)
+        except FuturesTimeoutError:
+            pass
+        
+        if not self._take_hedge():
+            return primary.result()
+        
+        self._count_upstream_call()
+        with self.cache_lock:
+            self.hedged_requests += 1
+        hedge = self._submit_request(route, method, url, params, json_body, bounded_timeout(self.request_timeout))
+        
+        errors = []
+        for future in as_completed((primary, hedge)):
+            try:
+                response = future.result()
+            except requests.exceptions.RequestException as e:
+                errors.append(e)
+                continue
+            loser = hedge if future is primary else primary
+            # A request already sent can't be aborted; release its connection when it lands
+            if not loser.cancel():
+                loser.add_done_callback(_discard_response)
+            if future is hedge:
+                with self.cache_lock:
+                    self.hedge_wins += 1
+            return response
+        raise errors[0]
+    
+    def _take_hedge(self) -> bool:
+        """Whether a hedge may be sent now: within the hedge budget, with a spare token and pool worker"""
+        if not self._hedge_pool_has_room(1) or not self.hedge_budget.try_spend():
+            self._count_skipped_hedge()
+            return False
+        # The hedge is a real upstream call, but not worth queueing for a token
+        if not self.rate_limiter.try_acquire():
+            self.hedge_budget.refund()
+            self._count_skipped_hedge()
+            return False
+        return True
+    
+    def _count_skipped_hedge(self):
+        with self.cache_lock:
+            self.hedges_skipped += 1
+    
+    def _hedge_pool_has_room(self, requests_needed: int = 2) -> bool:
+        with self.cache_lock:
+            return self._hedge_pool_busy + requests_needed <= HEDGE_POOL_SIZE
+    
+    def _submit_request(self, route: str, method: str, url: str, params: Optional[Dict],
+                        json_body: Optional[Dict], timeout: float, sent: threading.Event = None):
+        with self.cache_lock:
+            self._hedge_pool_busy += 1
+        future = self._hedge_pool.submit(self._timed_request, route, method, url, params, json_body, timeout, sent)
+        future.add_done_callback(self._release_hedge_worker)
+        return future
+    
+    def _release_hedge_worker(self, _future):
+        with self.cache_lock:
+            self._hedge_pool_busy -= 1
+    
+    def _timed_request(self, route: str, method: str, url: str, params: Optional[Dict],
+                       json_body: Optional[Dict], timeout: float, sent: threading.Event = None) -> requests.Response:
+        if sent is not None:
+            sent.set()
+        started = time.monotonic()
+        response = self.session.request(method, url, params=params or {}, json=json_body, timeout=timeout)
+        self.latency.record(route, time.monotonic() - started)
+        return response
+    
+    def attach_shared_cache(self, shared_cache):
+        """Back the beatmap cache with a SharedCache (api_cache table)"""
+        self.shared_cache = shared_cache
+    
+    def attach_score_db(self, db):
+        """Store fetched scores in db and analyse the accumulated score history"""
+        self.score_db = db
     
     def get_user_info(self, username: str) -> Optional[Dict]:
         """Get user profile information with caching"""
         if not username:
             return None
 
-        # Check user cache first
-        with self.cache_lock:
-            if username in self.user_cache:
-                cached_data, cached_time = self.user_cache[username]
-                if time.time() - cached_time < 600:  # 10 minute cache
-                    return cached_data
+        # Check user cache first (10 minute TTL)
+        cached_data = self.user_cache.get(username)
+        if cached_data is not None:
+            return cached_data
 
         # If it's all digits, tell API to treat it as a username
         if username.isdigit():
@@ -151,90 +500,399 @@ class OsuClient:
         user_data = self.make_request(endpoint, params=params, cache_timeout=600)
 
         if user_data:
-            with self.cache_lock:
-                self.user_cache[username] = (user_data, time.time())
+            self.user_cache.set(username, user_data)
 
         return user_data
 
     
-    def get_user_scores(self, user_id: int, score_type: str = 'best', limit: int = 50) -> List[Dict]:
+    def get_user_scores(self, user_id: int, score_type: str = 'best', limit: int = 50, offset: int = 0) -> List[Dict]:
         """Get user scores (best/recent) with caching"""
         if not user_id:
             return []
         
         params = {'limit': limit, 'mode': 'osu'}
+        if offset:
+            params['offset'] = offset
         data = self.make_request(f"users/{user_id}/scores/{score_type}", params, cache_timeout=180)
         return data or []
     
+    def get_score_feed(self, cursor_string: Optional[str] = None) -> Optional[Dict]:
+        """Get the next page of the global osu! score feed (newest page without a cursor)"""
+        params = {'ruleset': 'osu'}
+        if cursor_string:
+            params['cursor_string'] = cursor_string
+        return self.make_request("scores", params, cache_timeout=0)
+    
     def get_beatmap_info(self, beatmap_id: int) -> Optional[Dict]:
         """Get beatmap information with aggressive caching"""
         if not beatmap_id:
             return None
             
         # Check cache first
-        with self.cache_lock:
-            if beatmap_id in self.beatmap_cache:
-                return self.beatmap_cache[beatmap_id]
+        cached_data = self.beatmap_cache.get(beatmap_id)
+        if cached_data is not None:
+            return cached_data
+        
+        stored = self._get_stored_beatmaps([beatmap_id])
+        if stored:
+            return stored[beatmap_id]
+        
+        # Shares the in-flight key with get_beatmaps_batch, so a beatmap being
+        # fetched in bulk elsewhere is waited for instead of requested again
+        return self._shared_call(('beatmap', beatmap_id), self._fetch_beatmap, beatmap_id)
+    
+    def _fetch_beatmap(self, beatmap_id: int, check_shared: bool = True) -> Optional[Dict]:
+        """Fetch a single beatmap from the shared cache or the API and cache it"""
+        if check_shared:
+            shared = self._get_shared_beatmaps([beatmap_id])
+            if beatmap_id in shared:
+                return shared[beatmap_id]
         
-        # Fetch from API
         beatmap_data = self.make_request(f"beatmaps/{beatmap_id}", cache_timeout=3600)  # 1 hour cache
         
-        # Cache the result
         if beatmap_data:
-            with self.cache_lock:
-                self.beatmap_cache[beatmap_id] = beatmap_data
+            self._cache_beatmaps({beatmap_id: beatmap_data})
         
         return beatmap_data
     
-    def get_beatmaps_batch(self, beatmap_ids: List[int], max_workers: int = 10, prefix: str = "") -> Dict[int, Dict]:
-        """Get multiple beatmaps concurrently with optimized threading"""
+    def _get_stored_beatmaps(self, beatmap_ids: List[int]) -> Dict[int, Dict]:
+        """Look beatmaps up in the local beatmap store, promoting hits into the cache"""
+        if self.beatmap_store is None or not beatmap_ids:
+            return {}
+        
+        results = self.beatmap_store.get_many(beatmap_ids)
+        if results:
+            self.beatmap_cache.set_many(results, ttl=IMMUTABLE_BEATMAP_TTL)
+        return results
+    
+    def _get_shared_beatmaps(self, beatmap_ids: List[int]) -> Dict[int, Dict]:
+        """Look beatmaps up in the shared cache, promoting hits into the local one"""
+        if self.shared_cache is None or not beatmap_ids:
+            return {}
+        
+        found = self.shared_cache.get_many(shared_beatmap_key(beatmap_id) for beatmap_id in beatmap_ids)
+        results = {
+            beatmap_id: found[shared_beatmap_key(beatmap_id)]
+            for beatmap_id in beatmap_ids
+            if shared_beatmap_key(beatmap_id) in found
+        }
+        for beatmap_id, beatmap_data in results.items():
+            self.beatmap_cache.set(beatmap_id, beatmap_data, ttl=beatmap_cache_ttl(beatmap_data))
+        if results and self.beatmap_store is not None:
+            self.beatmap_store.put_many(results.values())
+        return results
+    
+    def _cache_beatmaps(self, beatmaps: Dict[int, Dict]):
+        """Store freshly fetched beatmaps locally and queue them for the shared cache"""
+        if self.beatmap_store is not None:
+            self.beatmap_store.put_many(beatmaps.values())
+        
+        by_ttl = {}
+        for beatmap_id, beatmap_data in beatmaps.items():
+            by_ttl.setdefault(beatmap_cache_ttl(beatmap_data), {})[beatmap_id] = beatmap_data
+        
+        for ttl, group in by_ttl.items():
+            self.beatmap_cache.set_many(group, ttl=ttl)
+            if self.shared_cache is not None:
+                self.shared_cache.set_many(
+                    {shared_beatmap_key(beatmap_id): data for beatmap_id, data in group.items()}, ttl
+                )
+    
+    def get_beatmaps_bulk(self, beatmap_ids: List[int]) -> Dict[int, Dict]:
+        """Fetch up to BEATMAPS_BULK_LIMIT beatmaps in one call to the multi-id endpoint"""
         if not beatmap_ids:
             return {}
         
-        # Check cache first
+        params = {'ids[]': sorted(beatmap_ids)[:BEATMAPS_BULK_LIMIT]}
+        # Beatmaps are cached individually below, so skip the response cache
+        data = self.make_request("beatmaps", params, cache_timeout=0)
+        
         results = {}
-        uncached_ids = []
+        for beatmap_data in (data or {}).get('beatmaps', []):
+            beatmap_id = beatmap_data.get('id')
+            if beatmap_id:
+                results[beatmap_id] = beatmap_data
         
-        with self.cache_lock:
-            for beatmap_id in beatmap_ids:
-                if beatmap_id in self.beatmap_cache:
-                    results[beatmap_id] = self.beatmap_cache[beatmap_id]
-                else:
-                    uncached_ids.append(beatmap_id)
+        if results:
+            self._cache_beatmaps(results)
+        
+        return results
+    
+    def get_beatmaps_batch(self, beatmap_ids: List[int], max_workers: int = 10, prefix: str = "") -> Dict[int, Dict]:
+        """Get multiple beatmaps through the multi-id endpoint, falling back to per-id lookups"""
+        if not beatmap_ids:
+            return {}
+        
+        # Check cache first, then the local beatmap store
+        results = self.beatmap_cache.get_many(beatmap_ids)
+        uncached_ids = [beatmap_id for beatmap_id in beatmap_ids if beatmap_id not in results]
+        
+        if uncached_ids:
+            results.update(self._get_stored_beatmaps(uncached_ids))
+            uncached_ids = [beatmap_id for beatmap_id in uncached_ids if beatmap_id not in results]
         
         if not uncached_ids:
             return results
         
+        # Claim the ids nobody else is fetching; wait for the others to land
+        owned = {}
+        waiting = {}
+        for beatmap_id in uncached_ids:
+            call, is_leader = self._inflight.begin(('beatmap', beatmap_id))
+            if is_leader:
+                owned[beatmap_id] = call
+            else:
+                waiting[beatmap_id] = call
+        
         # Add prefix to debug output
         debug_prefix = f"[{prefix}] " if prefix else ""
-        print(f"{debug_prefix}Fetching {len(uncached_ids)} beatmaps from API...")
         
-        # Fetch uncached beatmaps in smaller batches
-        batch_size = 20
-        for i in range(0, len(uncached_ids), batch_size):
-            batch = uncached_ids[i:i + batch_size]
-            
-            with ThreadPoolExecutor(max_workers=min(max_workers, len(batch))) as executor:
-                future_to_id = {
-                    executor.submit(self.get_beatmap_info, beatmap_id): beatmap_id 
-                    for beatmap_id in batch
-                }
-                
-                for future in as_completed(future_to_id):
-                    beatmap_id = future_to_id[future]
+        try:
+            if owned:
+                # A flight that just finished may already have cached some of them
+                results.update(self.beatmap_cache.get_many(owned))
+                to_fetch = [beatmap_id for beatmap_id in owned if beatmap_id not in results]
+                if to_fetch:
+                    print(f"{debug_prefix}Fetching {len(to_fetch)} beatmaps from API...")
+                    results.update(self._fetch_beatmaps(to_fetch, max_workers, debug_prefix))
+        finally:
+            for beatmap_id, call in owned.items():
+                self._inflight.finish(('beatmap', beatmap_id), call, results.get(beatmap_id))
+        
+        if waiting:
+            print(f"{debug_prefix}Waiting on {len(waiting)} beatmaps already being fetched")
+            for beatmap_id, call in waiting.items():
+                try:
+                    beatmap_data = call.wait(remaining_time())
+                    if beatmap_data:
+                        results[beatmap_id] = beatmap_data
+                except TimeoutError:
+                    print(f"{debug_prefix}Deadline reached waiting for beatmap {beatmap_id}")
+                except Exception as e:
+                    print(f"Error fetching beatmap {beatmap_id}: {e}")
+        
+        return results
+    
+    def _fetch_beatmaps(self, beatmap_ids: List[int], max_workers: int, debug_prefix: str) -> Dict[int, Dict]:
+        """Fetch beatmaps in bulk chunks, with per-id lookups for any the bulk endpoint missed"""
+        # Another instance may already have stored them in the shared cache
+        results = self._get_shared_beatmaps(beatmap_ids)
+        if len(results) == len(beatmap_ids):
+            return results
+        if results:
+            print(f"{debug_prefix}Shared cache had {len(results)} of {len(beatmap_ids)} beatmaps")
+            beatmap_ids = [beatmap_id for beatmap_id in beatmap_ids if beatmap_id not in results]
+        
+        # Fetch uncached beatmaps in chunks through the multi-id endpoint
+        chunks = [
+            beatmap_ids[i:i + BEATMAPS_BULK_LIMIT]
+            for i in range(0, len(beatmap_ids), BEATMAPS_BULK_LIMIT)
+        ]
+        
+        if len(chunks) == 1:
+            results.update(self.get_beatmaps_bulk(chunks[0]))
+        else:
+            # Not a with-block: past the deadline we return without waiting for
+            # stragglers, which still land in the cache when they finish
+            executor = ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)))
+            try:
+                futures = [submit_in_context(executor, self.get_beatmaps_bulk, chunk) for chunk in chunks]
+                for future in completed_before_deadline(futures):
                     try:
-                        beatmap_data = future.result()
-                        if beatmap_data:
-                            results[beatmap_id] = beatmap_data
+                        results.update(future.result())
                     except Exception as e:
-                        print(f"Error fetching beatmap {beatmap_id}: {e}")
+                        print(f"{debug_prefix}Error fetching beatmap chunk: {e}")
+            finally:
+                executor.shutdown(wait=False)
+        
+        if deadline_expired():
+            return results
+        
+        # Per-id fallback for anything the bulk endpoint did not return
+        missing_ids = [beatmap_id for beatmap_id in beatmap_ids if beatmap_id not in results]
+        if not missing_ids:
+            return results
+        
+        print(f"{debug_prefix}Falling back to per-id lookups for {len(missing_ids)} beatmaps")
+        
+        # _fetch_beatmap rather than get_beatmap_info: these ids are in flight
+        # under our own claim, so joining that flight would wait on ourselves
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(missing_ids)))
+        try:
+            future_to_id = {
+                submit_in_context(executor, self._fetch_beatmap, beatmap_id, False): beatmap_id 
+                for beatmap_id in missing_ids
+            }
+            
+            for future in completed_before_deadline(future_to_id):
+                beatmap_id = future_to_id[future]
+                try:
+                    beatmap_data = future.result()
+                    if beatmap_data:
+                        results[beatmap_id] = beatmap_data
+                except Exception as e:
+                    print(f"Error fetching beatmap {beatmap_id}: {e}")
+        finally:
+            executor.shutdown(wait=False)
         
         return results
     
+    def get_difficulty_attributes(self, beatmap_id: int, mods: Tuple[str, ...]) -> Optional[Dict]:
+        """Get difficulty attributes (star_rating, aim_difficulty, ...) for a beatmap under mods"""
+        if not beatmap_id:
+            return None
+        
+        cached_data = self.attributes_cache.get((beatmap_id, mods))
+        if cached_data is not None:
+            return cached_data
+        
+        return self._shared_call(('attributes', beatmap_id, mods), self._fetch_difficulty_attributes, beatmap_id, mods)
+    
+    def _fetch_difficulty_attributes(self, beatmap_id: int, mods: Tuple[str, ...]) -> Optional[Dict]:
+        """Fetch difficulty attributes from the API and cache them in both tiers"""
+        data = self.make_request(
+            f"beatmaps/{beatmap_id}/attributes",
+            json_body={'mods': list(mods), 'ruleset': 'osu'},
+            cache_timeout=0
+        )
+        attributes = (data or {}).get('attributes')
+        
+        if attributes:
+            self.attributes_cache.set((beatmap_id, mods), attributes)
+            if self.shared_cache is not None:
+                self.shared_cache.set_many(
+                    {shared_attributes_key(beatmap_id, mods): attributes}, DIFFICULTY_ATTRIBUTES_TTL
+                )
+        
+        return attributes
+    
+    def _get_shared_attributes(self, pairs: List[Tuple[int, Tuple[str, ...]]]) -> Dict[Tuple, Dict]:
+        """Look difficulty attributes up in the shared cache, promoting hits into the local one"""
+        if self.shared_cache is None or not pairs:
+            return {}
+        
+        found = self.shared_cache.get_many(shared_attributes_key(*pair) for pair in pairs)
+        results = {pair: found[shared_attributes_key(*pair)] for pair in pairs if shared_attributes_key(*pair) in found}
+        if results:
+            self.attributes_cache.set_many(results)
+        return results
+    
+    def get_difficulty_attributes_batch(self, pairs: List[Tuple[int, Tuple[str, ...]]],
+                                        max_workers: int = 10) -> Dict[Tuple, Dict]:
+        """Get difficulty attributes for many (beatmap_id, mods) pairs at once"""
+        pairs = list(dict.fromkeys(pairs))
+        if not pairs:
+            return {}
+        
+        results = self.attributes_cache.get_many(pairs)
+        missing = [pair for pair in pairs if pair not in results]
+        
+        if missing:
+            results.update(self._get_shared_attributes(missing))
+            missing = [pair for pair in missing if pair not in results]
+        
+        if not missing:
+            return results
+        
+        # The endpoint takes one beatmap per call, so fan the misses out
+        print(f"Fetching difficulty attributes for {len(missing)} modded beatmaps...")
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(missing)))
+        try:
+            future_to_pair = {
+                submit_in_context(executor, self.get_difficulty_attributes, *pair): pair
+                for pair in missing
+            }
+            
+            for future in completed_before_deadline(future_to_pair):
+                pair = future_to_pair[future]
+                try:
+                    attributes = future.result()
+                    if attributes:
+                        results[pair] = attributes
+                except Exception as e:
+                    print(f"Error fetching difficulty attributes for {pair}: {e}")
+        finally:
+            executor.shutdown(wait=False)
+        
+        return results
+    
+    def attach_difficulty_attributes(self, scores: List[Dict]) -> List[Dict]:
+        """Set difficulty_attributes on modded scores whose mods change the star rating"""
+        if not self.fetch_difficulty_attributes:
+            return scores
+        
+        score_pairs = []
+        for score in scores:
+            beatmap_id = score.get('beatmap', {}).get('id')
+            mods = difficulty_mods(score.get('mods'))
+            # Unmodded difficulty is already the beatmap's difficulty_rating
+            if beatmap_id and mods and 'difficulty_attributes' not in score:
+                score_pairs.append((score, (beatmap_id, mods)))
+        
+        if not score_pairs:
+            return scores
+        
+        attributes = self.get_difficulty_attributes_batch([pair for _, pair in score_pairs])
+        for score, pair in score_pairs:
+            if pair in attributes:
+                score['difficulty_attributes'] = attributes[pair]
+        
+        return scores
+    
     def get_user_recent_activity(self, user_id: int, limit: int = 50) -> List[Dict]:
         """Get recent plays with optimized filtering"""
         recent_scores = self.get_user_scores(user_id, 'recent', limit)
+        return self.filter_recent_activity(recent_scores)
+    
+    def get_best_scores(self, user_info: Dict, limit: int) -> List[Dict]:
+        """Get best scores, reusing the stored set while the user's total pp is unchanged"""
+        user_id = user_info.get('id')
+        if self.score_db is None:
+            return self.get_user_scores(user_id, 'best', limit)
+        
+        pp = (user_info.get('statistics') or {}).get('pp')
+        if best_snapshot_is_current(self.score_db.get_score_sync(user_id), pp):
+            stored = self.score_db.get_best_scores(user_id, limit)
+            if len(stored) >= limit:
+                print(f"Using {len(stored)} stored best scores (pp unchanged)")
+                return stored
+        
+        best_scores = self.get_user_scores(user_id, 'best', limit)
+        if best_scores:
+            self.score_db.save_scores(user_id, best_scores, is_best=True)
+            self.score_db.update_score_sync(user_id, best_pp=pp, best_synced_at=datetime.now(timezone.utc))
+        return best_scores
+    
+    def get_recent_history(self, user_id: int, limit: int = 50) -> List[Dict]:
+        """Get the user's last 60 days of plays from stored history plus any new scores"""
+        if self.score_db is None:
+            return self.get_user_recent_activity(user_id, limit)
         
+        since = datetime.now(timezone.utc) - timedelta(days=RECENT_HISTORY_DAYS)
+        stored = self.score_db.get_recent_scores(user_id, since)
+        if stored is None:
+            return self.get_user_recent_activity(user_id, limit)
+        
+        # Page through recent scores until we reach ones already stored
+        known_ids = {score.get('id') for score in stored}
+        new_scores = []
+        for page in range(RECENT_MAX_PAGES):
+            scores = self.get_user_scores(user_id, 'recent', RECENT_PAGE_SIZE, offset=page * RECENT_PAGE_SIZE)
+            fresh = [score for score in scores if score.get('id') not in known_ids]
+            new_scores.extend(fresh)
+            if len(fresh) < len(scores) or len(scores) < RECENT_PAGE_SIZE:
+                break
+        
+        if new_scores:
+            self.score_db.save_scores(user_id, new_scores)
+        self.score_db.update_score_sync(user_id, recent_synced_at=datetime.now(timezone.utc))
+        
+        history = merge_score_history(new_scores, stored)
+        print(f"Recent history: {len(new_scores)} new + {len(stored)} stored scores")
+        return self.filter_recent_activity(history)
+    
+    def filter_recent_activity(self, recent_scores: List[Dict]) -> List[Dict]:
+        """Keep ranked/loved/qualified plays from the last 60 days"""
         if not recent_scores:
             return []
         
@@ -306,15 +964,27 @@ class OsuClient:
         
         return sorted_scores
     
+    def get_score_beatmap(self, score: Dict) -> Dict:
+        """Get beatmap attributes from beatmap_full, or from the score's own beatmap when not enriched"""
+        return score.get('beatmap_full') or score.get('beatmap') or {}
+    
+    def needs_beatmap_enrichment(self, score: Dict) -> bool:
+        """Check whether a score is missing beatmap fields the analysis needs"""
+        if not self.elide_enrichment:
+            return True
+        beatmap = self.get_score_beatmap(score)
+        return any(beatmap.get(field) is None for field in REQUIRED_BEATMAP_FIELDS)
+    
     def calculate_basic_skill_score(self, score: Dict) -> float:
         """Calculate basic skill score for quality filtering"""
-        if not score.get('beatmap_full'):
+        beatmap = self.get_score_beatmap(score)
+        if not beatmap:
             return 0.0
             
         accuracy = score.get('accuracy', 0) * 100  # Convert to percentage
-        star_rating = score.get('beatmap_full', {}).get('difficulty_rating', 0)
-        ar = score.get('beatmap_full', {}).get('ar', 0)
-        bpm = score.get('beatmap_full', {}).get('bpm', 0)
+        star_rating = beatmap.get('difficulty_rating') or 0
+        ar = beatmap.get('ar') or 0
+        bpm = beatmap.get('bpm') or 0
         
         # Basic skill components (simplified version)
         aim_skill = accuracy * (star_rating ** 0.5)
@@ -360,11 +1030,11 @@ class OsuClient:
         if not scores:
             return []
         
-        # Extract unique beatmap IDs
+        # Extract unique beatmap IDs of scores that still miss analysis fields
         beatmap_ids = list(set(
             score.get('beatmap', {}).get('id') 
             for score in scores 
-            if score.get('beatmap', {}).get('id')
+            if score.get('beatmap', {}).get('id') and self.needs_beatmap_enrichment(score)
         ))
         
         if not beatmap_ids:
@@ -383,15 +1053,45 @@ class OsuClient:
         
         return enriched_scores
     
-    def get_comprehensive_user_data(self, username: str, score_limit: int = 25) -> Dict:
-        """Get all user data needed for skill analysis with fair score limiting"""
+    def get_comprehensive_user_data(self, username: str, score_limit: int = 25, analyzer=None) -> Dict:
+        """Get all user data needed for skill analysis with fair score limiting.
+        
+        With an analyzer, its single-list stages run inside the fetch pipeline
+        (see SkillAnalyzer.analyze_top_plays / analyze_recent_plays).
+        """
         if not username:
             return {}
         
+        counter = UpstreamCallCounter()
+        counter_token = _upstream_call_counter.set(counter)
+        try:
+            user_data = self._fetch_comprehensive_user_data(username, score_limit, analyzer)
+        finally:
+            _upstream_call_counter.reset(counter_token)
+        
+        if user_data:
+            user_data['upstream_calls'] = counter.count
+            print(f"osu! API calls for {username}: {counter.count}")
+            if deadline_expired():
+                # Some beatmaps or attributes may be missing; the analysis skips those plays
+                user_data['partial'] = True
+                print(f"Time budget ran out for {username}, analysing partial data")
+        
+        return user_data
+    
+    def _fetch_comprehensive_user_data(self, username: str, score_limit: int, analyzer=None) -> Dict:
+        """Fetch user info, scores and beatmaps for get_comprehensive_user_data.
+        
+        Top and recent plays run as two independent pipelines (scores, then
+        beatmaps and difficulty attributes, then analysis), so neither list
+        waits for the other. Beatmaps both lists need are fetched once: the
+        second batch joins the first one's in-flight lookups.
+        """
         print(f"Fetching user info for {username}...")
-        start_time = time.time()
+        timer = StageTimer()
         
-        user_info = self.get_user_info(username)
+        with timer.stage('user_info'):
+            user_info = self.get_user_info(username)
         if not user_info:
             return {}
         
@@ -399,94 +1099,106 @@ class OsuClient:
         if not user_id:
             return {}
         
-        print(f"User info fetched in {time.time() - start_time:.2f}s")
+        def top_pipeline():
+            with timer.stage('top_scores'):
+                # Get more than we need to allow for filtering
+                top_plays_raw = self.get_best_scores(user_info, score_limit + 10)
+            # Top plays are already sorted by pp: just limit and detect retries
+            top_plays = self.detect_retries(top_plays_raw[:score_limit] if top_plays_raw else [])
+            with timer.stage('top_enrich'):
+                self.enrich_scores_with_beatmap_data(top_plays, prefix="TOP")
+                self.attach_difficulty_attributes(top_plays)
+            stage = None
+            if analyzer is not None:
+                with timer.stage('top_analysis'):
+                    stage = analyzer.analyze_top_plays(top_plays)
+            return top_plays, stage
         
-        # Get scores concurrently with better limits
-        scores_start = time.time()
-        
-        def get_top_plays():
-            # Get more than we need to allow for filtering
-            return self.get_user_scores(user_id, 'best', score_limit + 10)
-        
-        def get_recent_plays():
-            # Get more than we need to allow for filtering
-            return self.get_user_recent_activity(user_id, score_limit + 10)
+        def recent_pipeline():
+            with timer.stage('recent_scores'):
+                recent_plays_raw = self.get_recent_history(user_id, score_limit + 10)
+            # Apply quality filtering and retry detection to recent plays
+            recent_plays = self.filter_recent_for_analysis(recent_plays_raw, score_limit)
+            print(f"Quality filtering: {len(recent_plays_raw)} → {len(recent_plays)} recent plays")
+            with timer.stage('recent_enrich'):
+                self.enrich_scores_with_beatmap_data(recent_plays, prefix="RECENT")
+                self.attach_difficulty_attributes(recent_plays)
+            stage = None
+            if analyzer is not None:
+                with timer.stage('recent_analysis'):
+                    stage = analyzer.analyze_recent_plays(recent_plays)
+            return recent_plays, stage
         
         with ThreadPoolExecutor(max_workers=2) as executor:
-            top_future = executor.submit(get_top_plays)
-            recent_future = executor.submit(get_recent_plays)
+            top_future = submit_in_context(executor, top_pipeline)
+            recent_future = submit_in_context(executor, recent_pipeline)
             
-            top_plays_raw = top_future.result()
-            recent_plays_raw = recent_future.result()
-        
-        # Apply quality filtering and retry detection to recent plays
-        recent_plays_filtered = self.filter_recent_for_analysis(recent_plays_raw, score_limit)
-        
-        # For top plays, just limit and detect retries (they're already sorted by pp)
-        top_plays_limited = top_plays_raw[:score_limit] if top_plays_raw else []
-        top_plays = self.detect_retries(top_plays_limited)
-        
-        print(f"Scores processed: {len(top_plays)} top plays, {len(recent_plays_filtered)} recent plays")
-        print(f"Quality filtering: {len(recent_plays_raw)} → {len(recent_plays_filtered)} recent plays")
-        
-        print(f"Scores fetched in {time.time() - scores_start:.2f}s")
-        # print(f"Limited to    {len(top_plays)} top plays and {len(get_recent_plays)} recent plays")
-        
-        # Enrich with beatmap data
-        enrich_start = time.time()
+            top_plays, top_analysis = top_future.result()
+            recent_plays, recent_analysis = recent_future.result()
         
-        def enrich_top():
-            return self.enrich_scores_with_beatmap_data(top_plays, prefix="TOP")
+        print(f"Scores processed: {len(top_plays)} top plays, {len(recent_plays)} recent plays")
+        print(f"Data fetch stages for {username}: {timer.summary()}")
         
-        def enrich_recent():
-            return self.enrich_scores_with_beatmap_data(recent_plays_filtered, prefix="RECENT")
-        
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            top_future = executor.submit(enrich_top)
-            recent_future = executor.submit(enrich_recent)
-            
-            top_plays_enriched = top_future.result()
-            recent_plays_enriched = recent_future.result()
-        
-        print(f"Enrichment completed in {time.time() - enrich_start:.2f}s")
-        print(f"Total data fetch time: {time.time() - start_time:.2f}s")
-        
-        return {
+        user_data = {
             'user_info': user_info,
-            'top_plays': top_plays_enriched,
-            'recent_plays': recent_plays_enriched
+            'top_plays': top_plays,
+            'recent_plays': recent_plays,
+            'timings': timer.as_dict()
         }
+        if top_analysis is not None:
+            user_data['top_analysis'] = top_analysis
+        if recent_analysis is not None:
+            user_data['recent_analysis'] = recent_analysis
+        return user_data
     
     def clear_cache(self):
         """Clear all caches"""
-        with self.cache_lock:
-            self.beatmap_cache.clear()
-            self.user_cache.clear()
-            self.score_cache.clear()
+        self.beatmap_cache.clear()
+        self.user_cache.clear()
+        self.score_cache.clear()
+        self.attributes_cache.clear()
     
     def get_cache_stats(self) -> Dict:
-        """Get cache statistics"""
-        with self.cache_lock:
-            return {
-                'cached_beatmaps': len(self.beatmap_cache),
-                'cached_users': len(self.user_cache),
-                'cached_scores': len(self.score_cache),
-                'cache_size_mb': (
-                    len(json.dumps(self.beatmap_cache)) + 
-                    len(json.dumps(self.user_cache)) + 
-                    len(json.dumps(self.score_cache))
-                ) / (1024 * 1024)
+        """Get cache statistics in constant time (counters are maintained on insert/evict)"""
+        caches = {
+            cache.name: cache.stats()
+            for cache in (self.beatmap_cache, self.user_cache, self.score_cache, self.attributes_cache)
+        }
+        return {
+            'cached_beatmaps': caches['beatmaps']['entries'],
+            'cached_users': caches['users']['entries'],
+            'cached_scores': caches['responses']['entries'],
+            'upstream_calls': self.upstream_calls,
+            'coalesced_calls': self._inflight.coalesced,
+            'cache_size_mb': sum(stats['bytes'] for stats in caches.values()) / (1024 * 1024),
+            'caches': caches,
+            'shared_cache': self.shared_cache.stats() if self.shared_cache is not None else None,
+            'beatmap_store': self.beatmap_store.stats() if self.beatmap_store is not None else None,
+            'rate_limiter': self.rate_limiter.stats(),
+            'circuit_breaker': self.circuit_breaker.stats() if self.circuit_breaker is not None else None,
+            'hedging': {
+                'enabled': self.hedge_requests,
+                'hedged_requests': self.hedged_requests,
+                'hedge_wins': self.hedge_wins,
+                'hedges_skipped': self.hedges_skipped,
+                'latency': self.latency.stats()
             }
+        }
     
     def preload_user_data(self, username: str) -> bool:
         """Preload user data in background"""
         try:
             threading.Thread(
-                target=self.get_comprehensive_user_data,
+                target=self._preload_user_data,
                 args=(username,),
                 daemon=True
             ).start()
             return True
         except Exception as e:
             print(f"Error preloading data for {username}: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    def _preload_user_data(self, username: str):
+        """Prefetch on the background lane so it never delays interactive requests"""
+        with request_lane(BACKGROUND):
+            self.get_comprehensive_user_data(username)
\ No newline at end of file
@@ -0,0 +1,281 @@
+import contextlib
+import contextvars
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets fall back to per-process state
+    fcntl = None
+
+
+# tokens, last refill time, time before which nobody may send (Retry-After)
+_STATE = struct.Struct('<ddd')
+
+# Priority lanes: interactive requests (a user waiting on a page) always go
+# first; background work (reanalysis sweeps, prefetches) only gets leftovers
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+LANES = (INTERACTIVE, BACKGROUND)
+
+_request_lane = contextvars.ContextVar('request_lane', default=INTERACTIVE)
+
+
+def current_lane() -> str:
+    return _request_lane.get()
+
+
+@contextlib.contextmanager
+def request_lane(lane: str):
+    """Tag osu! API calls made inside the block (and tasks it spawns) with a lane"""
+    token = _request_lane.set(lane)
+    try:
+        yield
+    finally:
+        _request_lane.reset(token)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by threads and, optionally, processes.
+
+    Tokens refill at `rate` per second up to `burst`. Interactive callers
+    reserve a token immediately (the count may go negative, queueing them in
+    arrival order) and sleep for the returned delay outside any lock.
+    Background callers never queue: they only take a token when the bucket
+    holds more than `background_headroom` spare tokens, so a queued or newly
+    arriving interactive request always finds capacity first.
+
+    With a `state_path` the bucket lives in a small file guarded by flock(),
+    so every worker process on the host draws from the same budget. Without
+    one (or without fcntl) the bucket is local to the process. A rate of 0
+    disables the steady-state limit but still honours penalize().
+    """
+
+    def __init__(self, rate: float, burst: float = 1, state_path: Optional[str] = None,
+                 background_headroom: Optional[float] = None):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.state_path = state_path if fcntl is not None else None
+        if background_headroom is None:
+            background_headroom = (self.burst - 1) / 2
+        self.background_headroom = min(max(0.0, background_headroom), self.burst - 1)
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+        self._state = (self.burst, time.time(), 0.0)
+
+        self.penalties = 0
+        self._lane_stats = {lane: _LaneStats() for lane in LANES}
+
+    def acquire(self, lane: Optional[str] = None):
+        """Block the calling thread until its lane may send a request"""
+        lane = lane or current_lane()
+        started = time.monotonic()
+        while True:
+            granted, wait = self._take(lane)
+            if wait > 0:
+                time.sleep(wait)
+            if granted:
+                break
+        self._lane_stats[lane].record(time.monotonic() - started)
+
+    def try_acquire(self, lane: Optional[str] = None) -> bool:
+        """Take a token only if one is spare right now; never waits or queues.
+
+        For optional extra calls (e.g. hedges) that are only worth sending
+        while the bucket has room. Interactive callers may use any spare
+        token; background callers must leave `background_headroom`.
+        """
+        lane = lane or current_lane()
+        headroom = self.background_headroom if lane == BACKGROUND else 0.0
+        with self._lock:
+            now = time.time()
+            tokens, updated, blocked_until = self._read_state(now)
+            if self.rate > 0:
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+
+            granted = blocked_until <= now and (self.rate <= 0 or tokens - 1 >= headroom)
+            if granted and self.rate > 0:
+                tokens -= 1
+
+            self._write_state((tokens, now, blocked_until))
+
+        if granted:
+            self._lane_stats[lane].record(0.0)
+        return granted
+
+    def penalize(self, delay: float):
+        """Hold every caller sharing this bucket back for delay seconds (e.g. on 429)"""
+        if delay <= 0:
+            return
+
+        with self._lock:
+            now = time.time()
+            tokens, updated, blocked_until = self._read_state(now)
+            # Drop accumulated burst so callers resume at the steady rate
+            self._write_state((min(tokens, 0.0), now, max(blocked_until, now + delay)))
+            self.penalties += 1
+
+    def stats(self) -> Dict:
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'background_headroom': self.background_headroom,
+            'shared': self.state_path is not None,
+            'penalties': self.penalties,
+            'lanes': {lane: stats.as_dict() for lane, stats in self._lane_stats.items()}
+        }
+
+    def _take(self, lane: str) -> Tuple[bool, float]:
+        """Try to take a token for lane; returns (granted, seconds to sleep).
+
+        A granted token is used after sleeping; otherwise sleep and try again.
+        """
+        with self._lock:
+            now = time.time()
+            tokens, updated, blocked_until = self._read_state(now)
+            if self.rate > 0:
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+
+            if lane == BACKGROUND:
+                if blocked_until > now:
+                    granted, wait = False, blocked_until - now
+                elif self.rate <= 0 or tokens - 1 >= self.background_headroom:
+                    tokens = tokens - 1 if self.rate > 0 else tokens
+                    granted, wait = True, 0.0
+                else:
+                    # Re-check once enough tokens should have refilled
+                    granted, wait = False, max(0.01, (self.background_headroom + 1 - tokens) / self.rate)
+            else:
+                wait = blocked_until - now
+                if self.rate > 0:
+                    # Tokens may go negative: each negative token is a queued caller
+                    tokens -= 1
+                    if tokens < 0:
+                        wait = max(wait, -tokens / self.rate)
+                granted, wait = True, max(0.0, wait)
+
+            self._write_state((tokens, now, blocked_until))
+            return granted, wait
+
+    def _read_state(self, now: float) -> tuple:
+        """Read the bucket state, taking the file lock if shared (held until _write_state)"""
+        fd = self._open_state_file()
+        if fd is None:
+            return self._state
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        data = os.pread(fd, _STATE.size, 0)
+        if len(data) != _STATE.size:
+            return (self.burst, now, 0.0)
+        return _STATE.unpack(data)
+
+    def _write_state(self, state: tuple):
+        fd = self._open_state_file()
+        if fd is None:
+            self._state = state
+            return
+
+        try:
+            os.pwrite(fd, _STATE.pack(*state), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _open_state_file(self) -> Optional[int]:
+        if self.state_path is None:
+            return None
+
+        # flock() locks belong to the open file, so a descriptor inherited
+        # through fork() would not exclude the parent: reopen per process
+        pid = os.getpid()
+        if self._fd is None or self._fd_pid != pid:
+            try:
+                self._fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._fd_pid = pid
+            except OSError as e:
+                print(f"Rate limiter state file unavailable ({e}), using a per-process bucket")
+                self.state_path = None
+                return None
+        return self._fd
+
+
+class _LaneStats:
+    """Queue-wait accounting for one lane"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        with self._lock:
+            self.acquired += 1
+            if wait > 0.001:
+                self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self) -> Dict:
+        return {
+            'acquired': self.acquired,
+            'waited': self.waited,
+            'total_wait_s': round(self.total_wait, 3),
+            'avg_wait_ms': round(self.total_wait / self.acquired * 1000, 2) if self.acquired else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 2)
+        }
+
+
+def default_state_path(client_id: str) -> str:
+    """Per-client bucket file shared by all workers on this host"""
+    return os.path.join(tempfile.gettempdir(), f'osu-skillcheck-ratelimit-{client_id}.bin')
+
+
+def bucket_from_env(client_id: str) -> TokenBucket:
+    """Build the osu! API bucket from OSU_RATE_LIMIT / OSU_RATE_BURST / OSU_RATE_LIMIT_FILE"""
+    rate = float(os.getenv('OSU_RATE_LIMIT', '20'))
+    burst = float(os.getenv('OSU_RATE_BURST', '10'))
+    state_path = os.getenv('OSU_RATE_LIMIT_FILE', default_state_path(client_id)) or None
+    return TokenBucket(rate, burst, state_path)
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with jitter for the given (0-based) retry attempt"""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def throttle_delay(retry_after: Optional[str], attempt: int, cap: float = 60.0) -> float:
+    """How long to back off after a 429: the server's Retry-After if given, else backoff"""
+    delay = retry_after_seconds(retry_after)
+    if delay is None:
+        delay = backoff_delay(attempt)
+    return min(cap, delay)
@@ -0,0 +1,185 @@
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from app.api.rate_limiter import BACKGROUND, request_lane
+
+
+# Name of this ingester's row in ingest_state
+FEED_NAME = 'osu_score_feed'
+
+
+def normalize_feed_score(score: Dict, beatmap: Optional[Dict]) -> Dict:
+    """Convert a /scores feed entry to the shape of the per-user score endpoints"""
+    normalized = dict(score)
+    normalized.setdefault('created_at', score.get('ended_at'))
+    normalized['mods'] = [
+        mod.get('acronym') if isinstance(mod, dict) else mod
+        for mod in score.get('mods') or []
+    ]
+    normalized['beatmap'] = beatmap or {'id': score.get('beatmap_id')}
+    return normalized
+
+
+class ScoreFeedIngester:
+    """Follow the global osu! score feed and keep tracked users' scores current.
+
+    Each page of GET /scores holds the newest scores from every player. Only
+    scores by users in our users table are kept: they are appended to the
+    scores table and their owners are marked for reanalysis, so one feed
+    request can replace a per-user poll of every tracked player. The feed
+    cursor is checkpointed after every page, so a restart resumes where the
+    previous run stopped.
+    """
+
+    def __init__(self, osu_client, db, interval: float = 60, max_pages: int = 20,
+                 tracked_refresh: float = 300):
+        self.osu_client = osu_client
+        self.db = db
+        self.interval = interval
+        self.max_pages = max_pages
+        self.tracked_refresh = tracked_refresh
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._tracked: Set[int] = set()
+        self._tracked_at = 0.0
+
+        self.pages = 0
+        self.scores_seen = 0
+        self.scores_stored = 0
+        self.users_marked = 0
+        self.last_run = None
+
+    def run_once(self) -> Dict:
+        """Ingest feed pages until caught up (or max_pages); returns this run's counts"""
+        # Only one run at a time: two would race on the cursor checkpoint
+        if not self._lock.acquire(blocking=False):
+            return {'skipped': 'ingest already running'}
+
+        try:
+            with request_lane(BACKGROUND):
+                return self._run()
+        finally:
+            self._lock.release()
+
+    def start(self):
+        """Run the ingester every `interval` seconds on a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='score-feed-ingester', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'tracked_users': len(self._tracked),
+            'pages': self.pages,
+            'scores_seen': self.scores_seen,
+            'scores_stored': self.scores_stored,
+            'users_marked': self.users_marked,
+            'last_run': self.last_run
+        }
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Score feed ingest failed: {e}")
+            self._stop.wait(self.interval)
+
+    def _run(self) -> Dict:
+        tracked = self._get_tracked_osu_ids()
+        cursor = self.db.get_ingest_cursor(FEED_NAME)
+        run = {'pages': 0, 'scores_seen': 0, 'scores_stored': 0, 'users_marked': 0, 'cursor': cursor}
+
+        for _ in range(self.max_pages):
+            page = self.osu_client.get_score_feed(cursor)
+            if page is None:
+                break
+
+            scores = page.get('scores') or []
+            next_cursor = page.get('cursor_string') or cursor
+
+            ingested = self._ingest(scores, tracked)
+            if ingested is None:
+                # Leave the cursor on this page so the next run retries it
+                print(f"Score feed: storing page at cursor {cursor} failed, stopping")
+                break
+
+            stored, marked = ingested
+            run['pages'] += 1
+            run['scores_seen'] += len(scores)
+            run['scores_stored'] += stored
+            run['users_marked'] += marked
+
+            # Checkpoint only after the page's scores are stored
+            if next_cursor and next_cursor != cursor:
+                self.db.save_ingest_cursor(FEED_NAME, next_cursor)
+            cursor = next_cursor
+            run['cursor'] = cursor
+
+            if not scores:
+                break
+
+        self.pages += run['pages']
+        self.scores_seen += run['scores_seen']
+        self.scores_stored += run['scores_stored']
+        self.users_marked += run['users_marked']
+        self.last_run = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+        print(f"Score feed: {run['scores_seen']} scores over {run['pages']} pages, "
+              f"{run['scores_stored']} stored, {run['users_marked']} users marked")
+        return run
+
+    def _ingest(self, scores: List[Dict], tracked: Set[int]) -> Optional[tuple]:
+        """Store tracked users' scores from one feed page.
+
+        Returns (stored, users marked), or None if any write failed; saving is
+        idempotent, so the whole page can simply be ingested again.
+        """
+        relevant = [
+            score for score in scores
+            if score.get('user_id') in tracked and score.get('passed', True)
+        ]
+        if not relevant:
+            return 0, 0
+
+        # Feed scores carry only beatmap_id; attach beatmaps so stored scores
+        # look like the per-user endpoints' (status is needed for filtering)
+        beatmaps = self.osu_client.get_beatmaps_batch(
+            list({score['beatmap_id'] for score in relevant if score.get('beatmap_id')}),
+            prefix="FEED"
+        )
+
+        by_user: Dict[int, List[Dict]] = {}
+        for score in relevant:
+            by_user.setdefault(score['user_id'], []).append(
+                normalize_feed_score(score, beatmaps.get(score.get('beatmap_id')))
+            )
+
+        stored = 0
+        for osu_user_id, user_scores in by_user.items():
+            saved = self.db.save_scores(osu_user_id, user_scores)
+            if saved is None:
+                return None
+            stored += saved
+
+        marked = self.db.mark_users_for_reanalysis(list(by_user))
+        if marked is None:
+            return None
+        return stored, marked
+
+    def _get_tracked_osu_ids(self) -> Set[int]:
+        if not self._tracked or time.time() - self._tracked_at >= self.tracked_refresh:
+            tracked = self.db.get_tracked_osu_ids()
+            if tracked is not None:
+                self._tracked = tracked
+                self._tracked_at = time.time()
+        return self._tracked
@@ -0,0 +1,171 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+import pytz
+
+
+class SharedCache:
+    """Second cache tier backed by the api_cache table.
+
+    Sits behind the in-process TTLCache so cold instances (new Vercel lambdas,
+    restarted workers) can reuse what any other instance already fetched.
+    Reads are batched into a few multi-key queries; writes are buffered and
+    flushed by a background thread, which also purges expired rows. A failing
+    database only costs misses, never a request.
+
+    Serverless hosts freeze the process between requests, so a background
+    writer (or an atexit flush) may never run there. With background=False
+    nothing is written until flush() is called, which the app does before
+    sending each response; expired rows are purged from there too.
+    """
+
+    def __init__(self, db, flush_interval: float = 1.0, purge_interval: float = 3600,
+                 max_pending: int = 5000, background: bool = True):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+        self.max_pending = max_pending
+        self.background = background
+
+        # cache_key -> (value, expires_at), written by the flusher thread
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer = None
+        self._writer_pid = None
+        self._last_purge = time.time()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.dropped = 0
+        self.errors = 0
+        self.purged = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return unexpired values for the keys found in the write buffer or the table"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        found = {}
+        now = datetime.now(pytz.UTC)
+        # Entries not flushed yet are visible to this process straight away
+        with self._lock:
+            for key in keys:
+                pending = self._pending.get(key)
+                if pending is not None and pending[1] > now:
+                    found[key] = pending[0]
+
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            try:
+                found.update(self.db.get_api_cache_entries(remaining))
+            except Exception as e:
+                self.errors += 1
+                print(f"Shared cache read failed: {e}")
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: float):
+        """Queue values for the table; they are written by the next flush"""
+        if not items:
+            return
+
+        expires_at = datetime.now(pytz.UTC) + timedelta(seconds=ttl)
+        with self._lock:
+            for key, value in items.items():
+                if key not in self._pending and len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                self._pending[key] = (value, expires_at)
+
+        if self.background:
+            self._ensure_writer()
+            self._wake.set()
+
+    def flush(self):
+        """Write every buffered entry now"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not self.background and time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+        if not pending:
+            return
+
+        try:
+            self.db.set_api_cache_entries(pending)
+            self.writes += len(pending)
+        except Exception as e:
+            self.errors += 1
+            print(f"Shared cache write failed for {len(pending)} entries: {e}")
+
+    def purge_expired(self):
+        """Delete expired rows from the table"""
+        self._last_purge = time.time()
+        try:
+            self.purged += self.db.purge_expired_api_cache()
+        except Exception as e:
+            self.errors += 1
+            print(f"Shared cache purge failed: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'pending_writes': len(self._pending),
+            'writes': self.writes,
+            'dropped_writes': self.dropped,
+            'errors': self.errors,
+            'purged_rows': self.purged
+        }
+
+    def _ensure_writer(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        pid = os.getpid()
+        if self._writer is not None and self._writer_pid == pid and self._writer.is_alive():
+            return
+
+        with self._lock:
+            if self._writer is not None and self._writer_pid == pid and self._writer.is_alive():
+                return
+            first_start = self._writer is None
+            self._writer = threading.Thread(target=self._run, name='shared-cache-writer', daemon=True)
+            self._writer_pid = pid
+            self._writer.start()
+
+        if first_start:
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            # Let a burst of set_many calls accumulate into one upsert
+            time.sleep(min(self.flush_interval, 0.2))
+            self.flush()
+
+            if time.time() - self._last_purge >= self.purge_interval:
+                self.purge_expired()
+
+
+def shared_cache_from_env(db) -> Optional[SharedCache]:
+    """SharedCache over db unless OSU_SHARED_CACHE=0.
+
+    Writes go through a background thread unless OSU_SHARED_CACHE_BACKGROUND=0,
+    which is the default on Vercel (detected by its VERCEL variable).
+    """
+    if db is None or os.getenv('OSU_SHARED_CACHE', '1') == '0':
+        return None
+    default_background = '0' if os.getenv('VERCEL') else '1'
+    background = os.getenv('OSU_SHARED_CACHE_BACKGROUND', default_background) != '0'
+    return SharedCache(db, background=background)
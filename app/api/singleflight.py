@@ -0,0 +1,97 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.api.deadline import remaining_time
+from app.api.rate_limiter import BACKGROUND, current_lane
+
+
+class _Call:
+    """One in-flight execution that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """The call's result; raises TimeoutError if it is not done within timeout"""
+        if not self.done.wait(timeout):
+            raise TimeoutError("in-flight call did not finish in time")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single execution.
+
+    The first caller for a key (the leader) runs the work; callers arriving
+    while it is in flight block and receive the leader's result or exception.
+    A waiting caller gives up with TimeoutError when its request deadline
+    (see deadline.py) passes first. Nothing is remembered once the call
+    finishes - caching is left to the caller.
+
+    Background-lane callers (see rate_limiter.request_lane) join flights but
+    never lead one: their upstream calls yield to interactive ones, so an
+    interactive caller waiting on them would be held to background priority.
+    They run their work privately instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.unshared = 0
+
+    def begin(self, key: Hashable) -> Tuple[_Call, bool]:
+        """Join or start the flight for key; returns (call, is_leader).
+
+        A leader must always call finish() for the key, even on failure.
+        """
+        background = current_lane() == BACKGROUND
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+
+            call = _Call()
+            if background:
+                self.unshared += 1
+            else:
+                self._calls[key] = call
+            self.executed += 1
+            return call, True
+
+    def finish(self, key: Hashable, call: _Call, result: Any = None, error: BaseException = None):
+        """Publish the leader's outcome and release waiting callers"""
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn once per key among concurrent callers and share its result"""
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            return call.wait(remaining_time())
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            'in_flight': len(self._calls),
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'unshared': self.unshared
+        }
+
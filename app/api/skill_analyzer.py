@@ -10,6 +10,8 @@ class SkillAnalyzer:
             'HD': 1.06, 'HR': 1.12, 'DT': 1.18, 'EZ': 0.88, 'FL': 1.15,
             'SO': 0.92, 'NF': 0.98, 'SD': 1.0, 'PF': 1.0, 'NC': 1.18, 'HT': 0.82
         }
+        # Mods already reflected in a fetched (mod-adjusted) star rating
+        self.star_rating_mods = {'EZ', 'HT', 'HR', 'DT', 'NC', 'FL'}
         
         self.min_recent_plays = 6
         self.min_top_plays = 8
@@ -29,18 +31,37 @@ class SkillAnalyzer:
             'easy_map_threshold': 3.5,
             'high_accuracy_threshold': 0.96,
             'easy_high_acc_min_count': 5,
+            'max_star_rating': 15,
             'normal_bpm': 180,
             'max_bpm_multiplier': 2.5
         }
 
-    def get_effective_star_rating(self, play: Dict) -> float:
-        """Calculate effective star rating accounting for mods"""
-        base_sr = play.get('beatmap_full', {}).get('difficulty_rating', 0)
+    def get_beatmap_data(self, play: Dict) -> Dict:
+        """Get beatmap attributes from beatmap_full, or from the score's own beatmap when not enriched"""
+        return play.get('beatmap_full') or play.get('beatmap') or {}
+
+    def has_adjusted_star_rating(self, play: Dict) -> bool:
+        """Whether the client fetched the play's real mod-adjusted star rating"""
+        return (play.get('difficulty_attributes') or {}).get('star_rating') is not None
+
+    def get_effective_star_rating(self, play: Dict, approximate: bool = True) -> float:
+        """Calculate effective star rating accounting for mods
+        
+        Without fetched difficulty attributes the mods' effect is approximated,
+        or left out with approximate=False (for scoring, where get_mod_multiplier
+        accounts for the mods instead).
+        """
+        # Real mod-adjusted rating when the client fetched difficulty attributes
+        if self.has_adjusted_star_rating(play):
+            return play['difficulty_attributes']['star_rating']
+        
+        base_sr = self.get_beatmap_data(play).get('difficulty_rating', 0)
         mods = play.get('mods', [])
         
-        if not mods:
+        if not mods or not approximate:
             return base_sr
         
+        # Otherwise approximate the effect of each mod
         # DT/NC increases star rating significantly
         if 'DT' in mods or 'NC' in mods:
             base_sr *= 1.4  # Approximate DT star rating multiplier
@@ -67,7 +88,7 @@ class SkillAnalyzer:
             if not play.get(field):
                 return False
         
-        beatmap_full = play.get('beatmap_full', {})
+        beatmap_full = self.get_beatmap_data(play)
         if not beatmap_full:
             return False
             
@@ -80,8 +101,8 @@ class SkillAnalyzer:
         if not (0 <= accuracy <= 1):
             return False
         
-        star_rating = beatmap_full.get('difficulty_rating', 0)
-        if not (0 <= star_rating <= 12):
+        star_rating = self.get_effective_star_rating(play, approximate=False)
+        if not (0 <= star_rating <= self.THRESHOLDS['max_star_rating']):
             return False
             
         ar = beatmap_full.get('ar', 0)
@@ -104,9 +125,9 @@ class SkillAnalyzer:
 
     def calculate_skill_components(self, play: Dict) -> Tuple[float, float, float]:
         """Calculate aim, speed, and accuracy skill components"""
-        beatmap = play.get('beatmap_full', {})
+        beatmap = self.get_beatmap_data(play)
         accuracy = play.get('accuracy', 0) * 100
-        star_rating = beatmap.get('difficulty_rating', 0)
+        star_rating = self.get_effective_star_rating(play, approximate=False)
         ar = beatmap.get('ar', 9)
         bpm = beatmap.get('bpm', 120)
         passed = play.get('passed', True)
@@ -149,8 +170,15 @@ class SkillAnalyzer:
 
         return aim_skill * fail_penalty, speed_skill * fail_penalty, accuracy_skill * fail_penalty
 
-    def get_mod_multiplier(self, mods: List[str]) -> float:
-        """Calculate mod multiplier for a play"""
+    def get_mod_multiplier(self, mods: List[str], star_rating_adjusted: bool = False) -> float:
+        """Calculate mod multiplier for a play
+        
+        With star_rating_adjusted (the play is scored on its real mod-adjusted
+        star rating), mods that change the star rating get no bonus here, so
+        DT, HR and the like aren't counted twice.
+        """
+        if star_rating_adjusted and mods:
+            mods = [mod for mod in mods if mod not in self.star_rating_mods]
         if not mods:
             return 1.0
             
@@ -197,7 +225,7 @@ class SkillAnalyzer:
         """Calculate overall skill score for a play"""
         aim, speed, accuracy = self.calculate_skill_components(play)
         mods = play.get('mods', [])
-        mod_multiplier = self.get_mod_multiplier(mods)
+        mod_multiplier = self.get_mod_multiplier(mods, self.has_adjusted_star_rating(play))
         
         # Rebalanced weights
         base_score = (0.4 * aim + 0.4 * speed + 0.2 * accuracy)
@@ -509,20 +537,43 @@ class SkillAnalyzer:
             
         return insights
 
+    def analyze_top_plays(self, top_plays: List[Dict]) -> Dict:
+        """Analysis stage that needs only top plays (runs as soon as they are enriched)"""
+        valid_top_plays = self.filter_valid_plays(top_plays)
+        return {
+            'valid_top_plays': valid_top_plays,
+            'peak_skill': self.calculate_peak_skill(valid_top_plays)
+        }
+
+    def analyze_recent_plays(self, recent_plays: List[Dict]) -> Dict:
+        """Analysis stage that needs only recent plays (runs as soon as they are enriched)"""
+        valid_recent_plays = self.filter_valid_plays(recent_plays)
+        confidence_factors = self.calculate_confidence_factors(recent_plays)
+        return {
+            'valid_recent_plays': valid_recent_plays,
+            'recent_skill': self.calculate_recent_skill(valid_recent_plays),
+            'confidence_factors': confidence_factors,
+            'confidence': self.calculate_confidence_score(confidence_factors)
+        }
+
     def analyze_user_skill(self, user_data: Dict) -> Dict:
         """Perform comprehensive skill analysis"""
         recent_plays = user_data.get('recent_plays', [])
         top_plays = user_data.get('top_plays', [])
 
-        valid_recent_plays = self.filter_valid_plays(recent_plays)
-        valid_top_plays = self.filter_valid_plays(top_plays)
+        # Single-list stages may already have run during the data fetch
+        top_stage = user_data.get('top_analysis') or self.analyze_top_plays(top_plays)
+        recent_stage = user_data.get('recent_analysis') or self.analyze_recent_plays(recent_plays)
 
-        recent_skill = self.calculate_recent_skill(valid_recent_plays)
-        peak_skill = self.calculate_peak_skill(valid_top_plays)
+        valid_recent_plays = recent_stage['valid_recent_plays']
+        valid_top_plays = top_stage['valid_top_plays']
+
+        recent_skill = recent_stage['recent_skill']
+        peak_skill = top_stage['peak_skill']
         skill_match = self.calculate_skill_match(recent_skill, peak_skill, len(valid_recent_plays))
 
-        confidence_factors = self.calculate_confidence_factors(recent_plays)
-        confidence = self.calculate_confidence_score(confidence_factors)
+        confidence_factors = recent_stage['confidence_factors']
+        confidence = recent_stage['confidence']
 
         verdict = self.determine_verdict(skill_match, confidence, valid_recent_plays, valid_top_plays)
 
@@ -1,10 +1,61 @@
 import os
 import json
+import threading
+import time
 from datetime import datetime, timedelta  # Add timedelta import here
 from typing import Dict, List, Optional
 from supabase import create_client, Client
 import pytz
 
+from app.api.cache import TTLCache
+
+# Profile fields whose change requires rewriting a users row
+USER_FINGERPRINT_FIELDS = ('username', 'avatar_url', 'rank', 'pp', 'playcount')
+
+# How long a written profile is trusted before it is written again regardless
+USER_FINGERPRINT_TTL = 3600
+
+# Leaderboard ranks are counted at read time from the (skill_score, user_id)
+# index. On long-lived servers, setting this to a number of seconds also keeps
+# the stored rank_position column current: a background thread recomputes it
+# that long after a change, once for all changes made meanwhile. Serverless
+# hosts freeze background threads, so the default (0) leaves it alone
+RANK_UPDATE_DEBOUNCE = float(os.getenv('LEADERBOARD_RANK_DEBOUNCE', '0'))
+
+# Seconds the database statistics shown on the leaderboard are reused for
+USER_STATS_TTL = 60
+
+# Seconds a read of the leaderboard version is reused for; polling clients
+# within this window are answered without touching the database
+LEADERBOARD_VERSION_TTL = 5
+
+# Leaderboard columns (with the user's profile) behind every leaderboard row the API returns
+LEADERBOARD_COLUMNS = '''
+    recent_skill,
+    peak_skill,
+    skill_match,
+    confidence,
+    verdict,
+    skill_score,
+    updated_at,
+    last_analysis_at,
+    user_id,
+    users (
+        osu_id,
+        username,
+        avatar_url,
+        rank,
+        pp
+    )
+'''
+
+def like_literal(value: str) -> str:
+    """Escape LIKE wildcards so value only matches itself"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def user_fingerprint(user_record: Dict) -> tuple:
+    return tuple(user_record.get(field) for field in USER_FINGERPRINT_FIELDS)
+
 class SupabaseDatabase:
     def __init__(self, url: str = None, key: str = None):
         """Initialize Supabase client"""
@@ -15,6 +66,20 @@ class SupabaseDatabase:
             raise ValueError("Supabase URL and key are required. Set SUPABASE_URL and SUPABASE_ANON_KEY environment variables.")
         
         self.client: Client = create_client(self.url, self.key)
+        
+        # osu_id -> (fingerprint, users.id) of the profile this process last
+        # wrote. Entries expire so writes made by other workers are picked up
+        self.user_fingerprints = TTLCache('user_fingerprints', max_entries=20000, default_ttl=USER_FINGERPRINT_TTL)
+        
+        self.stats_cache = TTLCache('stats', max_entries=16, default_ttl=USER_STATS_TTL)
+        
+        # Called after every leaderboard write made through this instance
+        self.leaderboard_listeners = []
+        
+        # Pending rank recompute, run by one background thread per process
+        self._ranks_dirty = threading.Event()
+        self._rank_thread = None
+        self._rank_thread_lock = threading.Lock()
         print("Supabase client initialized successfully")
     
     def get_user_by_osu_id(self, osu_id: int) -> Optional[Dict]:
@@ -29,60 +94,61 @@ class SupabaseDatabase:
             print(f"Error getting user by osu_id {osu_id}: {e}")
             return None
     
+    def _build_user_record(self, user_data: Dict) -> Dict:
+        """users row for an osu! API user payload"""
+        if not isinstance(user_data, dict):
+            raise ValueError(f"Invalid user_data type: {type(user_data)}")
+        
+        user_id = user_data.get('id')
+        if not user_id:
+            raise ValueError("Missing user ID in user_data")
+        
+        # Build user record with safe defaults; created_at is left to the
+        # column default so an upsert never overwrites it
+        statistics = user_data.get('statistics') or {}
+        user_record = {
+            'osu_id': user_id,
+            'username': user_data.get('username', ''),
+            'avatar_url': user_data.get('avatar_url', ''),
+            'rank': statistics.get('global_rank'),
+            'pp': statistics.get('pp'),
+            'playcount': statistics.get('play_count'),
+            'updated_at': datetime.now(pytz.UTC).isoformat()
+        }
+        
+        # Validate numeric fields
+        for field in ['rank', 'pp', 'playcount']:
+            if user_record[field] is not None and not isinstance(user_record[field], (int, float)):
+                print(f"Warning: Invalid {field} value: {user_record[field]}, setting to None")
+                user_record[field] = None
+        
+        return user_record
+    
+    def _unchanged_user_id(self, user_record: Dict) -> Optional[int]:
+        """users.id if this exact profile was the last one written for the osu! user"""
+        written = self.user_fingerprints.get(user_record['osu_id'])
+        if written and written[0] == user_fingerprint(user_record):
+            return written[1]
+        return None
+    
     def upsert_user(self, user_data: Dict) -> Optional[int]:
-        """Insert or update user data with better error handling"""
+        """Insert or update user data in one round trip, skipping unchanged profiles"""
         try:
-            # Validate input
-            if not isinstance(user_data, dict):
-                raise ValueError(f"Invalid user_data type: {type(user_data)}")
-            
-            user_id = user_data.get('id')
-            if not user_id:
-                raise ValueError("Missing user ID in user_data")
+            user_record = self._build_user_record(user_data)
             
-            # Check if user exists
-            existing_user = self.get_user_by_osu_id(user_id)
+            user_id = self._unchanged_user_id(user_record)
+            if user_id:
+                return user_id
             
-            timestamp = datetime.now(pytz.UTC).isoformat()
-            
-            # Build user record with safe defaults
-            user_record = {
-                'osu_id': user_id,
-                'username': user_data.get('username', ''),
-                'avatar_url': user_data.get('avatar_url', ''),
-                'rank': user_data.get('statistics', {}).get('global_rank'),
-                'pp': user_data.get('statistics', {}).get('pp'),
-                'playcount': user_data.get('statistics', {}).get('play_count'),
-                'updated_at': timestamp
-            }
+            response = self.client.table('users').upsert(user_record, on_conflict='osu_id').execute()
+            if not response.data:
+                print(f"Error: User upsert returned no data for osu_id: {user_record['osu_id']}")
+                return None
             
-            # Validate numeric fields
-            for field in ['rank', 'pp', 'playcount']:
-                if user_record[field] is not None and not isinstance(user_record[field], (int, float)):
-                    print(f"Warning: Invalid {field} value: {user_record[field]}, setting to None")
-                    user_record[field] = None
-            
-            if existing_user:
-                # Update existing user
-                response = self.client.table('users').update(user_record).eq('osu_id', user_id).execute()
-                if response.data:
-                    print(f"Updated user {user_data.get('username')} (ID: {existing_user['id']})")
-                    return existing_user['id']
-                else:
-                    print(f"Warning: User update returned no data for osu_id: {user_id}")
-                    return existing_user['id']  # Return existing ID as fallback
-            else:
-                # Insert new user
-                user_record['created_at'] = timestamp
-                response = self.client.table('users').insert(user_record).execute()
-                
-                if response.data and len(response.data) > 0:
-                    new_user_id = response.data[0]['id']
-                    print(f"Created new user {user_data.get('username')} (ID: {new_user_id})")
-                    return new_user_id
-                else:
-                    print(f"Error: User creation returned no data for osu_id: {user_id}")
-                    return None
+            user_id = response.data[0]['id']
+            self.user_fingerprints.set(user_record['osu_id'], (user_fingerprint(user_record), user_id))
+            print(f"Saved user {user_record['username']} (ID: {user_id})")
+            return user_id
                         
         except Exception as e:
             print(f"Error upserting user with osu_id {user_data.get('id', 'unknown')}: {e}")
@@ -90,6 +156,44 @@ class SupabaseDatabase:
             traceback.print_exc()
             return None
     
+    def upsert_users(self, users_data: List[Dict], chunk_size: int = 500) -> Dict[int, int]:
+        """Bulk upsert_user for sweeps and seeding; returns {osu_id: users.id}.
+        
+        Unchanged profiles are skipped the same way, and the rest are written
+        chunk_size rows per request.
+        """
+        user_ids = {}
+        pending = {}
+        for user_data in users_data:
+            try:
+                user_record = self._build_user_record(user_data)
+            except ValueError as e:
+                print(f"Skipping user payload: {e}")
+                continue
+            
+            user_id = self._unchanged_user_id(user_record)
+            if user_id:
+                user_ids[user_record['osu_id']] = user_id
+            else:
+                # One row per osu_id: Postgres rejects an upsert touching a row twice
+                pending[user_record['osu_id']] = user_record
+        
+        rows = list(pending.values())
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            try:
+                response = self.client.table('users').upsert(chunk, on_conflict='osu_id').execute()
+            except Exception as e:
+                print(f"Error bulk upserting {len(chunk)} users: {e}")
+                continue
+            
+            for row in response.data or []:
+                user_ids[row['osu_id']] = row['id']
+                self.user_fingerprints.set(row['osu_id'], (user_fingerprint(pending[row['osu_id']]), row['id']))
+        
+        print(f"Bulk upserted {len(rows)} users ({len(users_data) - len(rows)} unchanged or skipped)")
+        return user_ids
+    
     def save_analysis_result(self, user_id: int, analysis_result: Dict) -> Optional[int]:
         """Save analysis result to database with better error handling"""
         try:
@@ -152,34 +256,7 @@ class SupabaseDatabase:
                     .execute())
             
             if response.data and len(response.data) > 0:
-                row = response.data[0]
-                
-                # Validate the data before processing
-                result = {
-                    'recent_skill': row.get('recent_skill', 0) or 0,
-                    'peak_skill': row.get('peak_skill', 0) or 0,
-                    'skill_match': row.get('skill_match', 0) or 0,
-                    'confidence': row.get('confidence', 0) or 0,
-                    'verdict': row.get('verdict', 'unknown') or 'unknown',
-                    'insights': [],
-                    'confidence_factors': {},
-                    'created_at': row.get('created_at')
-                }
-                
-                # Safely parse JSON fields
-                try:
-                    if row.get('insights'):
-                        result['insights'] = json.loads(row['insights'])
-                except (json.JSONDecodeError, TypeError) as e:
-                    print(f"Warning: Failed to parse insights JSON: {e}")
-                    result['insights'] = []
-                
-                try:
-                    if row.get('confidence_factors'):
-                        result['confidence_factors'] = json.loads(row['confidence_factors'])
-                except (json.JSONDecodeError, TypeError) as e:
-                    print(f"Warning: Failed to parse confidence_factors JSON: {e}")
-                    result['confidence_factors'] = {}
+                result = self._parse_analysis_row(response.data[0])
                 
                 print(f"Retrieved cached analysis for user_id {user_id}: {result['created_at']}")
                 return result
@@ -193,6 +270,37 @@ class SupabaseDatabase:
             traceback.print_exc()
             return None
     
+    def _parse_analysis_row(self, row: Dict) -> Dict:
+        """Turn an analysis_results row into an analysis dict (JSON fields decoded)"""
+        # Validate the data before processing
+        result = {
+            'recent_skill': row.get('recent_skill', 0) or 0,
+            'peak_skill': row.get('peak_skill', 0) or 0,
+            'skill_match': row.get('skill_match', 0) or 0,
+            'confidence': row.get('confidence', 0) or 0,
+            'verdict': row.get('verdict', 'unknown') or 'unknown',
+            'insights': [],
+            'confidence_factors': {},
+            'created_at': row.get('created_at')
+        }
+        
+        # Safely parse JSON fields
+        try:
+            if row.get('insights'):
+                result['insights'] = json.loads(row['insights'])
+        except (json.JSONDecodeError, TypeError) as e:
+            print(f"Warning: Failed to parse insights JSON: {e}")
+            result['insights'] = []
+        
+        try:
+            if row.get('confidence_factors'):
+                result['confidence_factors'] = json.loads(row['confidence_factors'])
+        except (json.JSONDecodeError, TypeError) as e:
+            print(f"Warning: Failed to parse confidence_factors JSON: {e}")
+            result['confidence_factors'] = {}
+        
+        return result
+    
     def update_leaderboard(self, user_id: int, analysis_result: Dict):
         """Update user's leaderboard position with better error handling for new users"""
         try:
@@ -236,6 +344,8 @@ class SupabaseDatabase:
                 'confidence': confidence,
                 'verdict': verdict,
                 'skill_score': skill_score,
+                # Denormalized so the leaderboard needs no analysis_results lookup
+                'last_analysis_at': analysis_result.get('created_at') or timestamp,
                 'updated_at': timestamp
             }
             
@@ -245,12 +355,10 @@ class SupabaseDatabase:
             if response.data:
                 print(f"Successfully updated leaderboard for user_id {user_id} with skill_score {skill_score:.2f}")
                 
-                # Update rank positions after successful upsert
-                try:
-                    self._update_leaderboard_ranks()
-                except Exception as rank_error:
-                    print(f"Warning: Failed to update ranks after leaderboard update: {rank_error}")
-                    # Don't fail the whole operation if rank update fails
+                # Ranks are counted when read; this only refreshes the stored
+                # rank_position column, if that is enabled
+                self.schedule_rank_update()
+                self._publish_leaderboard_change()
             else:
                 print(f"Warning: No data returned from leaderboard upsert for user_id {user_id}")
                 
@@ -259,113 +367,90 @@ class SupabaseDatabase:
             import traceback
             traceback.print_exc()
 
-    def _update_leaderboard_ranks(self):
-        """Update all rank positions using PostgreSQL window function"""
-        try:
-            # PostgreSQL query to update ranks using window function
-            query = """
-            UPDATE leaderboard 
-            SET rank_position = ranked.rank
-            FROM (
-                SELECT id, 
-                       ROW_NUMBER() OVER (ORDER BY skill_score DESC) as rank
-                FROM leaderboard
-            ) ranked
-            WHERE leaderboard.id = ranked.id
-            """
-            
-            # Execute raw SQL using RPC (Remote Procedure Call)
-            response = self.client.rpc('update_leaderboard_ranks').execute()
-            
+    def add_leaderboard_listener(self, callback):
+        """Call callback() after each leaderboard write made by this process"""
+        self.leaderboard_listeners.append(callback)
+    
+    def _publish_leaderboard_change(self):
+        # The cached version predates this write
+        self.stats_cache.delete('leaderboard_version')
+        for callback in self.leaderboard_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Leaderboard listener failed: {e}")
+    
+    def schedule_rank_update(self):
+        """Request a rank_position recompute (when RANK_UPDATE_DEBOUNCE is set); requests made while one is pending coalesce"""
+        if RANK_UPDATE_DEBOUNCE <= 0:
+            return
+        
+        self._ranks_dirty.set()
+        with self._rank_thread_lock:
+            # Threads don't survive fork(), so a worker starts its own
+            if self._rank_thread is None or not self._rank_thread.is_alive():
+                self._rank_thread = threading.Thread(target=self._rank_update_loop, name='leaderboard-ranks', daemon=True)
+                self._rank_thread.start()
+    
+    def _rank_update_loop(self):
+        while True:
+            self._ranks_dirty.wait()
+            time.sleep(RANK_UPDATE_DEBOUNCE)
+            # Cleared before the recompute: changes landing during it schedule another
+            self._ranks_dirty.clear()
+            self.update_leaderboard_ranks()
+    
+    def update_leaderboard_ranks(self) -> bool:
+        """Update the stored rank_position column (ROW_NUMBER() by skill_score) via the update_leaderboard_ranks RPC.
+        
+        The leaderboard reads don't use it; they count ranks themselves. The
+        function only writes rows whose position changed; see schema.sql.
+        """
+        try:
+            self.client.rpc('update_leaderboard_ranks').execute()
+            return True
         except Exception as e:
             print(f"Error updating leaderboard ranks: {e}")
+            return False
 
-    def get_leaderboard(self, limit: int = 50, search_query: str = None, verdict_filter: str = None) -> List[Dict]:
-        """Get leaderboard with user info and analysis data, with optional search and filtering - OPTIMIZED"""
+    def get_leaderboard(self, limit: int = 50, search_query: str = None, verdict_filter: str = None,
+                        after: tuple = None) -> List[Dict]:
+        """Get leaderboard with user info and analysis data, with optional search and filtering - OPTIMIZED
+        
+        Rows are ordered by (skill_score DESC, user_id). Pass the (skill_score, user_id)
+        of the last row seen as `after` to get the next page: a keyset seek on the
+        skill_score index, so every page costs the same however deep it is.
+        Each row's rank is its position in that order (within the filters),
+        counted from the rows up to `after` rather than read from rank_position.
+        """
         try:
             # Single optimized query that joins all required data
-            query = (self.client.table('leaderboard')
-                    .select('''
-                        rank_position,
-                        recent_skill,
-                        peak_skill,
-                        skill_match,
-                        confidence,
-                        verdict,
-                        skill_score,
-                        updated_at,
-                        user_id,
-                        users (
-                            osu_id,
-                            username,
-                            avatar_url,
-                            rank,
-                            pp
-                        )
-                    '''))
-            
-            # Add search filter
-            if search_query:
-                query = query.ilike('users.username', f'%{search_query}%')
-            
-            # Add verdict filter
-            if verdict_filter and verdict_filter != 'all':
-                query = query.eq('verdict', verdict_filter)
+            query = self._filter_leaderboard(
+                self.client.table('leaderboard').select(LEADERBOARD_COLUMNS), search_query, verdict_filter
+            )
+            
+            # Continue after the previous page's last row
+            offset = 0
+            if after:
+                skill_score, user_id = after
+                query = query.or_(
+                    f'skill_score.lt.{skill_score},and(skill_score.eq.{skill_score},user_id.gt.{user_id})'
+                )
+                offset = self._count_leaderboard_rows(
+                    f'skill_score.gt.{skill_score},and(skill_score.eq.{skill_score},user_id.lte.{user_id})',
+                    search_query, verdict_filter
+                )
             
             # Execute query with ordering and limit
-            response = query.order('skill_score', desc=True).limit(limit).execute()
+            response = query.order('skill_score', desc=True).order('user_id').limit(limit).execute()
             
             if not response.data:
                 return []
             
-            # Get all user IDs for batch analysis timestamp lookup
-            user_ids = [row['user_id'] for row in response.data]
-            
-            # Batch query for analysis timestamps - single query for all users
-            analysis_timestamps = {}
-            try:
-                # Get the most recent analysis timestamp for each user in a single query
-                analysis_response = (self.client.table('analysis_results')
-                                .select('user_id, created_at')
-                                .in_('user_id', user_ids)
-                                .order('created_at', desc=True)
-                                .execute())
-                
-                # Group by user_id and get the most recent timestamp
-                for row in analysis_response.data:
-                    user_id = row['user_id']
-                    if user_id not in analysis_timestamps:
-                        analysis_timestamps[user_id] = row['created_at']
-                        
-            except Exception as e:
-                print(f"Error getting batch analysis timestamps: {e}")
-                # Continue with leaderboard update timestamps as fallback
-            
-            # Build results using batch-fetched data
-            results = []
-            for row in response.data:
-                user_data = row['users']
-                user_id = row['user_id']
-                
-                # Use batch-fetched analysis timestamp or fallback to leaderboard timestamp
-                analysis_timestamp = analysis_timestamps.get(user_id, row['updated_at'])
-                
-                results.append({
-                    'rank': row['rank_position'] or 0,
-                    'osu_id': user_data['osu_id'],
-                    'username': user_data['username'],
-                    'avatar_url': user_data['avatar_url'],
-                    'rank_global': user_data['rank'],
-                    'pp': user_data['pp'],
-                    'recent_skill': row['recent_skill'] or 0,
-                    'peak_skill': row['peak_skill'] or 0,
-                    'skill_match': row['skill_match'] or 0,
-                    'confidence': row['confidence'] or 0,
-                    'verdict': row['verdict'] or 'unknown',
-                    'skill_score': row['skill_score'] or 0,
-                    'analysis_timestamp': analysis_timestamp,
-                    'updated_at': row['updated_at']
-                })
+            results = [
+                {'rank': offset + index + 1, **self._format_leaderboard_row(row)}
+                for index, row in enumerate(response.data)
+            ]
             
             return results
             
@@ -373,30 +458,114 @@ class SupabaseDatabase:
             print(f"Error getting leaderboard: {e}")
             return []
 
+    def _filter_leaderboard(self, query, search_query: str = None, verdict_filter: str = None):
+        """Apply the leaderboard's search and verdict filters to a leaderboard query"""
+        if search_query:
+            query = query.ilike('users.username', f'%{search_query}%')
+        
+        if verdict_filter and verdict_filter != 'all':
+            query = query.eq('verdict', verdict_filter)
+        
+        return query
+    
+    def _count_leaderboard_rows(self, condition: str, search_query: str = None, verdict_filter: str = None) -> int:
+        """Number of leaderboard rows matching the or_() condition and the filters.
+        
+        Conditions on (skill_score, user_id) are answered from its index.
+        """
+        columns = 'user_id, users (username)' if search_query else 'user_id'
+        query = self._filter_leaderboard(
+            self.client.table('leaderboard').select(columns, count='exact'), search_query, verdict_filter
+        )
+        response = query.or_(condition).limit(1).execute()
+        return response.count or 0
+
+    def _format_leaderboard_row(self, row: Dict) -> Dict:
+        """API shape of a leaderboard row selected with LEADERBOARD_COLUMNS, without its rank"""
+        user_data = row['users']
+        
+        # Rows written before last_analysis_at existed fall back to updated_at
+        analysis_timestamp = row['last_analysis_at'] or row['updated_at']
+        
+        return {
+            'user_id': row['user_id'],
+            'osu_id': user_data['osu_id'],
+            'username': user_data['username'],
+            'avatar_url': user_data['avatar_url'],
+            'rank_global': user_data['rank'],
+            'pp': user_data['pp'],
+            'recent_skill': row['recent_skill'] or 0,
+            'peak_skill': row['peak_skill'] or 0,
+            'skill_match': row['skill_match'] or 0,
+            'confidence': row['confidence'] or 0,
+            'verdict': row['verdict'] or 'unknown',
+            'skill_score': row['skill_score'] or 0,
+            'analysis_timestamp': analysis_timestamp,
+            'updated_at': row['updated_at']
+        }
+    
+    def get_leaderboard_version(self) -> Optional[Dict]:
+        """{'version', 'reset_version'} of the leaderboard, reused for LEADERBOARD_VERSION_TTL seconds.
+        
+        version grows with every change to a leaderboard row; reset_version is
+        the version at the last deletion, which get_leaderboard_changes can't
+        report. None if it could not be read.
+        """
+        version = self.stats_cache.get('leaderboard_version')
+        if version is not None:
+            return version
+        
+        try:
+            row = (self.client.rpc('get_leaderboard_version').execute().data or [{}])[0]
+            version = {
+                'version': row.get('version') or 0,
+                'reset_version': row.get('reset_version') or 0
+            }
+            self.stats_cache.set('leaderboard_version', version, ttl=LEADERBOARD_VERSION_TTL)
+            return version
+        except Exception as e:
+            print(f"Error getting leaderboard version: {e}")
+            return None
+    
+    def get_leaderboard_changes(self, since: int, limit: int = 500) -> Optional[List[Dict]]:
+        """Leaderboard rows changed after version `since`, oldest change first, each with its 'version'.
+        
+        None if the changes could not be read.
+        """
+        try:
+            response = (self.client.table('leaderboard')
+                       .select(LEADERBOARD_COLUMNS + ', version')
+                       .gt('version', since)
+                       .order('version')
+                       .limit(limit)
+                       .execute())
+            
+            changes = []
+            for row in response.data or []:
+                change = self._format_leaderboard_row(row)
+                change['version'] = row['version']
+                changes.append(change)
+            return changes
+        except Exception as e:
+            print(f"Error getting leaderboard changes since {since}: {e}")
+            return None
+    
     def get_leaderboard_stats(self, verdict_filter: str = None) -> Dict:
+        """Player count, average/top skill and average confidence from the per-verdict leaderboard_stats rows"""
         try:
-            count_query = self.client.table('leaderboard').select('id', count='exact')
+            query = self.client.table('leaderboard_stats').select('*')
             if verdict_filter and verdict_filter != 'all':
-                count_query = count_query.eq('verdict', verdict_filter)
-            count_response = count_query.execute()
-            total_players = count_response.count or 0
-
-            data_query = self.client.table('leaderboard').select('recent_skill, confidence')
-            if verdict_filter and verdict_filter != 'all':
-                data_query = data_query.eq('verdict', verdict_filter)
-            data_query = data_query.limit(1000)  # only for avg/top calc
-
-            data_response = data_query.execute()
-            data_rows = data_response.data or []
+                query = query.eq('verdict', verdict_filter)
+            rows = query.execute().data or []
 
-            skills = [row['recent_skill'] for row in data_rows if row['recent_skill']]
-            confidences = [row['confidence'] for row in data_rows if row['confidence']]
+            skill_count = sum(row['skill_count'] for row in rows)
+            confidence_count = sum(row['confidence_count'] for row in rows)
 
             return {
-                'total_players': total_players,  # ✅ now correct
-                'avg_skill': sum(skills) / len(skills) if skills else 0,
-                'top_skill': max(skills) if skills else 0,
-                'avg_confidence': sum(confidences) / len(confidences) if confidences else 0
+                'total_players': sum(row['players'] for row in rows),
+                'avg_skill': sum(row['skill_sum'] for row in rows) / skill_count if skill_count else 0,
+                'top_skill': max((row['top_skill'] for row in rows if row['skill_count']), default=0),
+                'avg_confidence': sum(row['confidence_sum'] for row in rows) / confidence_count if confidence_count else 0
             }
 
         except Exception as e:
@@ -405,48 +574,29 @@ class SupabaseDatabase:
 
 
     def get_user_stats(self) -> Dict:
-        """Get database statistics - OPTIMIZED"""
-        try:
-            # Use connection pooling and batch queries
-            from concurrent.futures import ThreadPoolExecutor
-            import time
-            
-            def get_users_count():
-                return self.client.table('users').select('id', count='exact').execute().count
-            
-            def get_analyses_count():
-                return self.client.table('analysis_results').select('id', count='exact').execute().count
-            
-            def get_recent_analyses_count():
-                seven_days_ago = (datetime.now(pytz.UTC) - timedelta(days=7)).isoformat()
-                return (self.client.table('analysis_results')
-                    .select('id', count='exact')
-                    .gte('created_at', seven_days_ago)
-                    .execute().count)
-            
-            # Execute queries in parallel with timeout
-            with ThreadPoolExecutor(max_workers=3) as executor:
-                futures = {
-                    'total_users': executor.submit(get_users_count),
-                    'total_analyses': executor.submit(get_analyses_count),
-                    'recent_analyses': executor.submit(get_recent_analyses_count)
-                }
-                
-                results = {}
-                for key, future in futures.items():
-                    try:
-                        results[key] = future.result(timeout=5)  # 5 second timeout
-                    except Exception as e:
-                        print(f"Error getting {key}: {e}")
-                        results[key] = 0
-                
-                return results
+        """User/analysis counts from the get_user_stats RPC, cached for USER_STATS_TTL seconds.
+        
+        Totals are exact (trigger-maintained row_counters); the 7-day analysis
+        count is the planner's estimate.
+        """
+        stats = self.stats_cache.get('user_stats')
+        if stats is not None:
+            return stats
+        
+        try:
+            response = self.client.rpc('get_user_stats').execute()
+            row = (response.data or [{}])[0]
+            stats = {
+                'total_users': row.get('total_users') or 0,
+                'total_analyses': row.get('total_analyses') or 0,
+                'recent_analyses': row.get('recent_analyses') or 0
+            }
+            self.stats_cache.set('user_stats', stats)
+            return stats
                 
         except Exception as e:
             print(f"Error getting user stats: {e}")
             return {'total_users': 0, 'total_analyses': 0, 'recent_analyses': 0}
-
-
     
     def clear_old_analyses(self, days_old: int = 30):
         """Clear analyses older than specified days"""
@@ -548,41 +698,28 @@ class SupabaseDatabase:
             return []
 
     def get_user_leaderboard_position(self, user_id: int) -> Optional[Dict]:
-        """Get user's current leaderboard position"""
+        """Get user's current leaderboard position (one more than the rows ranked ahead of them)"""
         try:
             response = (self.client.table('leaderboard')
-                       .select('''
-                            rank_position,
-                            recent_skill,
-                            peak_skill,
-                            skill_match,
-                            confidence,
-                            verdict,
-                            skill_score,
-                            updated_at,
-                            user_id,
-                            users (
-                                osu_id,
-                                username,
-                                avatar_url,
-                                rank,
-                                pp
-                            )
-                        ''')
+                       .select(LEADERBOARD_COLUMNS)
                        .eq('user_id', user_id)
                        .execute())
             
             if response.data:
                 row = response.data[0]
+                ahead = self._count_leaderboard_rows(
+                    f"skill_score.gt.{row['skill_score']},"
+                    f"and(skill_score.eq.{row['skill_score']},user_id.lt.{row['user_id']})"
+                )
                 return {
-                    'rank': row['rank_position'],
+                    'rank': ahead + 1,
                     'recent_skill': row['recent_skill'],
                     'peak_skill': row['peak_skill'],
                     'skill_match': row['skill_match'],
                     'confidence': row['confidence'],
                     'verdict': row['verdict'],
                     'skill_score': row['skill_score'],
-                    'analysis_timestamp': row['updated_at'],
+                    'analysis_timestamp': row['last_analysis_at'] or row['updated_at'],
                     'username': row['users']['username'],
                     'avatar_url': row['users']['avatar_url'],
                     'rank_global': row['users']['rank'],
@@ -620,6 +757,265 @@ class SupabaseDatabase:
             print(f"Error setting user role: {e}")
             return False
 
+    def get_api_cache_entries(self, cache_keys: List[str], chunk_size: int = 200) -> Dict[str, object]:
+        """Get unexpired api_cache values for many keys in a few IN queries"""
+        entries = {}
+        now = datetime.now(pytz.UTC).isoformat()
+        
+        for i in range(0, len(cache_keys), chunk_size):
+            chunk = cache_keys[i:i + chunk_size]
+            response = (self.client.table('api_cache')
+                       .select('cache_key, cache_data')
+                       .in_('cache_key', chunk)
+                       .gt('expires_at', now)
+                       .execute())
+            
+            for row in response.data or []:
+                try:
+                    entries[row['cache_key']] = json.loads(row['cache_data'])
+                except (TypeError, ValueError):
+                    continue
+        
+        return entries
+    
+    def set_api_cache_entries(self, entries: Dict[str, tuple], chunk_size: int = 200):
+        """Upsert api_cache rows from {cache_key: (value, expires_at)}"""
+        rows = [
+            {
+                'cache_key': cache_key,
+                'cache_data': json.dumps(value),
+                'expires_at': expires_at.isoformat()
+            }
+            for cache_key, (value, expires_at) in entries.items()
+        ]
+        
+        for i in range(0, len(rows), chunk_size):
+            self.client.table('api_cache').upsert(rows[i:i + chunk_size], on_conflict='cache_key').execute()
+    
+    def purge_expired_api_cache(self) -> int:
+        """Delete expired api_cache rows, returning how many were removed"""
+        now = datetime.now(pytz.UTC).isoformat()
+        response = self.client.table('api_cache').delete().lt('expires_at', now).execute()
+        return len(response.data or [])
+    
+    def save_scores(self, osu_user_id: int, scores: List[Dict], is_best: bool = False) -> Optional[int]:
+        """Store fetched osu! scores, deduplicated by score id.
+        
+        Saving best scores replaces the user's previous best set in one
+        transaction (the replace_best_scores RPC); other scores are recent
+        plays and are flagged is_recent, so the recent history never picks up
+        best scores that weren't played recently.
+        Returns how many scores were stored, or None if the write failed.
+        """
+        try:
+            rows = []
+            for score in scores:
+                if not score.get('id') or not score.get('created_at'):
+                    continue
+                rows.append({
+                    'id': score['id'],
+                    'osu_user_id': osu_user_id,
+                    'beatmap_id': (score.get('beatmap') or {}).get('id'),
+                    'pp': score.get('pp'),
+                    'score_data': score,
+                    'created_at': score['created_at']
+                })
+            
+            if is_best:
+                self.client.rpc('replace_best_scores', {
+                    'p_osu_user_id': osu_user_id,
+                    'p_scores': rows
+                }).execute()
+            elif rows:
+                # Not ignore_duplicates: a score stored as a best score may
+                # only now show up among recent plays. is_best isn't sent, so
+                # it is left as it was
+                for row in rows:
+                    row['is_recent'] = True
+                self.client.table('scores').upsert(rows, on_conflict='id').execute()
+            
+            return len(rows)
+        except Exception as e:
+            print(f"Error saving scores for osu user {osu_user_id}: {e}")
+            return None
+    
+    def get_recent_scores(self, osu_user_id: int, since: datetime, limit: int = 500) -> Optional[List[Dict]]:
+        """Get stored recent plays set since a point in time, newest first (None on error)"""
+        try:
+            response = (self.client.table('scores')
+                       .select('score_data')
+                       .eq('osu_user_id', osu_user_id)
+                       .eq('is_recent', True)
+                       .gte('created_at', since.isoformat())
+                       .order('created_at', desc=True)
+                       .limit(limit)
+                       .execute())
+            
+            return [row['score_data'] for row in response.data or []]
+        except Exception as e:
+            print(f"Error getting stored scores for osu user {osu_user_id}: {e}")
+            return None
+    
+    def get_best_scores(self, osu_user_id: int, limit: int = 100) -> List[Dict]:
+        """Get the user's last stored best scores, highest pp first"""
+        try:
+            response = (self.client.table('scores')
+                       .select('score_data')
+                       .eq('osu_user_id', osu_user_id)
+                       .eq('is_best', True)
+                       .order('pp', desc=True)
+                       .limit(limit)
+                       .execute())
+            
+            return [row['score_data'] for row in response.data or []]
+        except Exception as e:
+            print(f"Error getting stored best scores for osu user {osu_user_id}: {e}")
+            return []
+    
+    def get_score_sync(self, osu_user_id: int) -> Optional[Dict]:
+        """Get when the user's scores were last fetched"""
+        try:
+            response = self.client.table('score_sync').select('*').eq('osu_user_id', osu_user_id).execute()
+            
+            if response.data:
+                return response.data[0]
+            return None
+        except Exception as e:
+            print(f"Error getting score sync state for osu user {osu_user_id}: {e}")
+            return None
+    
+    def update_score_sync(self, osu_user_id: int, **fields) -> bool:
+        """Record score sync state (best_pp, best_synced_at, recent_synced_at)"""
+        try:
+            row = {'osu_user_id': osu_user_id}
+            for key, value in fields.items():
+                row[key] = value.isoformat() if isinstance(value, datetime) else value
+            
+            self.client.table('score_sync').upsert(row, on_conflict='osu_user_id').execute()
+            return True
+        except Exception as e:
+            print(f"Error updating score sync state for osu user {osu_user_id}: {e}")
+            return False
+    
+    def get_tracked_osu_ids(self) -> Optional[set]:
+        """Get the osu! ids of every user in the users table (None on error)"""
+        try:
+            osu_ids = set()
+            page_size = 1000
+            offset = 0
+            
+            while True:
+                response = (self.client.table('users')
+                           .select('osu_id')
+                           .order('id')
+                           .range(offset, offset + page_size - 1)
+                           .execute())
+                
+                rows = response.data or []
+                osu_ids.update(row['osu_id'] for row in rows)
+                
+                if len(rows) < page_size:
+                    break
+                offset += page_size
+            
+            return osu_ids
+        except Exception as e:
+            print(f"Error getting tracked osu ids: {e}")
+            return None
+    
+    def mark_users_for_reanalysis(self, osu_ids: List[int]) -> Optional[int]:
+        """Flag users whose scores changed so the next reanalysis sweep picks them up (None on error)"""
+        try:
+            if not osu_ids:
+                return 0
+            
+            response = (self.client.table('users')
+                       .update({'needs_reanalysis': True})
+                       .in_('osu_id', osu_ids)
+                       .execute())
+            return len(response.data or [])
+        except Exception as e:
+            print(f"Error marking users for reanalysis: {e}")
+            return None
+    
+    def get_users_marked_for_reanalysis(self, limit: int = 100) -> List[Dict]:
+        """Get users flagged by the score feed ingester"""
+        try:
+            response = (self.client.table('users')
+                       .select('id, osu_id, username')
+                       .eq('needs_reanalysis', True)
+                       .order('updated_at')
+                       .limit(limit)
+                       .execute())
+            return response.data or []
+        except Exception as e:
+            print(f"Error getting users marked for reanalysis: {e}")
+            return []
+    
+    def clear_reanalysis_mark(self, user_id: int) -> bool:
+        """Clear a user's reanalysis flag before they are reanalysed"""
+        try:
+            self.client.table('users').update({'needs_reanalysis': False}).eq('id', user_id).execute()
+            return True
+        except Exception as e:
+            print(f"Error clearing reanalysis mark for user {user_id}: {e}")
+            return False
+    
+    def get_ingest_cursor(self, name: str) -> Optional[str]:
+        """Get the checkpointed cursor of a feed ingester"""
+        try:
+            response = self.client.table('ingest_state').select('cursor_string').eq('name', name).execute()
+            
+            if response.data:
+                return response.data[0]['cursor_string']
+            return None
+        except Exception as e:
+            print(f"Error getting ingest cursor {name}: {e}")
+            return None
+    
+    def save_ingest_cursor(self, name: str, cursor_string: str) -> bool:
+        """Checkpoint a feed ingester's cursor"""
+        try:
+            self.client.table('ingest_state').upsert({
+                'name': name,
+                'cursor_string': cursor_string,
+                'updated_at': datetime.now(pytz.UTC).isoformat()
+            }, on_conflict='name').execute()
+            return True
+        except Exception as e:
+            print(f"Error saving ingest cursor {name}: {e}")
+            return False
+    
+    def get_user_with_latest_analysis(self, osu_id: int = None, username: str = None) -> Optional[Dict]:
+        """Get a user (by osu ID or username) and their latest analysis in one query.
+        
+        The analysis is returned under 'latest_analysis' (None if there is none yet).
+        """
+        try:
+            query = self.client.table('users').select('*, analysis_results(*)')
+            if osu_id is not None:
+                query = query.eq('osu_id', osu_id)
+            else:
+                # osu! usernames are case-insensitive
+                query = query.ilike('username', like_literal(username))
+            
+            response = (query
+                    .order('created_at', desc=True, foreign_table='analysis_results')
+                    .limit(1, foreign_table='analysis_results')
+                    .limit(1)
+                    .execute())
+            
+            if not response.data:
+                return None
+            
+            user = response.data[0]
+            analyses = user.pop('analysis_results', None) or []
+            user['latest_analysis'] = self._parse_analysis_row(analyses[0]) if analyses else None
+            return user
+        except Exception as e:
+            print(f"Error getting user {osu_id or username} with latest analysis: {e}")
+            return None
+    
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """Get user by username"""
         try:
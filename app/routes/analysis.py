@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request
+from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request, make_response, Response
 from datetime import datetime, timedelta
 from functools import wraps
 
+import base64
+import json
 import os
+import queue
 import sys
 import threading
 import time
@@ -12,6 +15,11 @@ import pytz
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.api.osu_client import OsuClient
+from app.api.rate_limiter import BACKGROUND, request_lane
+from app.api.deadline import request_deadline
+from app.api.shared_cache import shared_cache_from_env
+from app.api.score_ingester import ScoreFeedIngester
+from app.api.leaderboard_stream import LeaderboardBroadcaster
 from app.api.skill_analyzer import SkillAnalyzer
 from app.models.database import SupabaseDatabase  # Changed from Database to SupabaseDatabase
 
@@ -21,8 +29,33 @@ analysis_bp = Blueprint('analysis', __name__)
 _db = None
 _osu_client = None
 _analyzer = None
+_shared_cache = None
+_score_ingester = None
+_leaderboard_broadcaster = None
 _lock = threading.Lock()
 
+# Total osu! API time budget for one analysis request; when it runs out the
+# analysis goes ahead with whatever beatmaps have arrived
+ANALYSIS_BUDGET = float(os.getenv('OSU_ANALYSIS_BUDGET', '20'))
+
+# Largest leaderboard page /api/leaderboard returns
+MAX_LEADERBOARD_PAGE = 200
+
+# More changed rows than this and /api/leaderboard/changes asks for a reload
+MAX_LEADERBOARD_CHANGES = 500
+
+# Live leaderboard stream (/api/leaderboard/stream). Each open stream holds a
+# worker thread, which serverless hosts (Vercel) and sync gunicorn workers
+# can't spare, so it is off unless enabled; the page then polls for changes
+LEADERBOARD_STREAM = os.getenv('LEADERBOARD_STREAM', '0') == '1'
+
+# Seconds between keep-alive comments on an idle leaderboard stream
+STREAM_KEEPALIVE = 15
+
+# Seconds a stream stays open; the client then reconnects (and catches up),
+# so a stream never pins a worker thread for longer
+STREAM_MAX_AGE = float(os.getenv('LEADERBOARD_STREAM_MAX_AGE', '300'))
+
 ADMIN_USERS = {
     'snovn',  # Replace with your actual osu! username
     # Add more admin usernames as needed
@@ -53,20 +86,127 @@ def can_access_user(username):
     current_user = session.get('username')
     return current_user == username or is_admin(current_user)
 
+@analysis_bp.after_app_request
+def flush_shared_cache(response):
+    """Write shared cache entries buffered by this request when there is no background writer"""
+    if _shared_cache is not None and not _shared_cache.background:
+        _shared_cache.flush()
+    return response
+
 def get_components():
     """Get singleton instances of components"""
-    global _db, _osu_client, _analyzer
+    global _db, _osu_client, _analyzer, _shared_cache
     
     with _lock:
         if _db is None:
             _db = SupabaseDatabase()  # Changed from Database() to SupabaseDatabase()
+            # api_cache-backed second tier shared by every instance
+            _shared_cache = shared_cache_from_env(_db)
         if _osu_client is None:
             _osu_client = OsuClient()
+            _osu_client.attach_shared_cache(_shared_cache)
+            _osu_client.attach_score_db(_db)
         if _analyzer is None:
             _analyzer = SkillAnalyzer()
     
     return _db, _osu_client, _analyzer
 
+def get_score_ingester():
+    """Get singleton instance of the global score feed ingester"""
+    global _score_ingester
+    
+    db, osu_client, _ = get_components()
+    with _lock:
+        if _score_ingester is None:
+            _score_ingester = ScoreFeedIngester(osu_client, db)
+            # Long-running servers follow the feed continuously; otherwise
+            # /api/admin/ingest_scores can be called from a cron job
+            if os.getenv('OSU_SCORE_INGESTER', '0') == '1':
+                _score_ingester.start()
+    
+    return _score_ingester
+
+def get_leaderboard_broadcaster():
+    """Get singleton instance of this worker's leaderboard change broadcaster"""
+    global _leaderboard_broadcaster
+    
+    db, _, _ = get_components()
+    with _lock:
+        if _leaderboard_broadcaster is None:
+            _leaderboard_broadcaster = LeaderboardBroadcaster(db)
+    
+    return _leaderboard_broadcaster
+
+def fetch_user_data(osu_client, username, analyzer=None):
+    """Fetch comprehensive user data with the osu! client.
+    
+    With an analyzer, its single-list stages run as each list arrives.
+    """
+    return osu_client.get_comprehensive_user_data(username, analyzer=analyzer)
+
+def stored_user_info(user):
+    """Rebuild osu! API-shaped user info from a users row"""
+    return {
+        'id': user.get('osu_id'),
+        'username': user.get('username'),
+        'avatar_url': user.get('avatar_url'),
+        'statistics': {
+            'global_rank': user.get('rank'),
+            'pp': user.get('pp'),
+            'play_count': user.get('playcount')
+        }
+    }
+
+def render_stale_dashboard(username, user, analysis):
+    """Dashboard with the stored analysis flagged as stale (osu! API circuit open)"""
+    print(f"osu! API circuit open, serving stored analysis for {username}")
+    return render_template('dashboard.html',
+                         username=username,
+                         user_info=stored_user_info(user),
+                         analysis=analysis,
+                         from_cache=True,
+                         stale=True)
+
+def resolve_user(db, username):
+    """users row (with 'latest_analysis') for username, resolved without the osu! API.
+    
+    The logged-in user is looked up by the osu! id stored in the session at login.
+    """
+    if username.lower() == (session.get('username') or '').lower() and session.get('user_id'):
+        return db.get_user_with_latest_analysis(osu_id=session['user_id'])
+    return db.get_user_with_latest_analysis(username=username)
+
+def stale_analysis_response(username, user, analysis):
+    """JSON counterpart of render_stale_dashboard"""
+    print(f"osu! API circuit open, serving stored analysis for {username}")
+    return jsonify({
+        'user_info': stored_user_info(user),
+        'analysis': analysis,
+        'timestamp': analysis['created_at'],
+        'from_cache': True,
+        'stale': True
+    })
+
+def encode_leaderboard_cursor(row):
+    """Opaque cursor for the leaderboard page following row"""
+    raw = json.dumps([row['skill_score'], row['user_id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_leaderboard_cursor(cursor):
+    """(skill_score, user_id) from a leaderboard cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        skill_score, user_id = json.loads(raw)
+        return float(skill_score), int(user_id)
+    except (ValueError, TypeError):
+        return None
+
+def leaderboard_etag(version):
+    """ETag of /api/leaderboard responses at a leaderboard version (None if unknown)"""
+    if not version:
+        return None
+    return f"leaderboard-{version['version']}-{version['reset_version']}"
+
 def is_cache_valid(cached_analysis, cache_duration_minutes=30):
     """Check if cached analysis is still valid"""
     if not cached_analysis or not cached_analysis.get('created_at'):
@@ -106,6 +246,7 @@ def is_cache_valid(cached_analysis, cache_duration_minutes=30):
         
 
 @analysis_bp.route('/dashboard')
+@request_deadline(ANALYSIS_BUDGET)
 def dashboard():
     """Dashboard route - shows analysis results"""
     if 'username' not in session:
@@ -115,54 +256,57 @@ def dashboard():
     db, osu_client, analyzer = get_components()
     
     try:
-        # Get user info first
-        print(f"Fetching user info for {username}...")
-        user_info = osu_client.get_user_info(username)
-        if not user_info:
-            return render_template('dashboard.html', 
-                                 username=username,
-                                 error="Could not fetch user data from osu! API")
-        
-        # Save/update user in database
-        user_id = db.upsert_user(user_info)
-        if not user_id:
-            print("Failed to save user to database")
-            return render_template('dashboard.html',
-                                 username=username,
-                                 error="Failed to save user data")
-        
-        # Check for cached analysis
-        print(f"Checking cache for user_id: {user_id}")
-        cached_analysis = db.get_latest_analysis(user_id)
+        # One DB read resolves the logged-in user and their latest analysis;
+        # a cached dashboard needs nothing else (no osu! API call, no writes)
+        user = resolve_user(db, username)
+        cached_analysis = user.get('latest_analysis') if user else None
         
         # Use cached analysis if valid
         if cached_analysis and is_cache_valid(cached_analysis, 30):
             print("Using cached analysis")
-            # Ensure leaderboard is updated with cached analysis
-            try:
-                db.update_leaderboard(user_id, cached_analysis)
-            except Exception as e:
-                print(f"Warning: Failed to update leaderboard with cached data: {e}")
-            
             return render_template('dashboard.html',
                                  username=username,
-                                 user_info=user_info,
+                                 user_info=stored_user_info(user),
                                  analysis=cached_analysis,
                                  from_cache=True)
         
+        # While osu! is failing, show the stored analysis instead of waiting on it
+        if cached_analysis and osu_client.circuit_open():
+            return render_stale_dashboard(username, user, cached_analysis)
+        
         # Perform new analysis for new users or when cache is invalid
         if cached_analysis:
             print("Cache expired, performing new analysis")
         else:
             print("No cached analysis found (new user), performing initial analysis")
         
+        # The profile is refreshed together with the analysis
+        print(f"Fetching user info for {username}...")
+        user_info = osu_client.get_user_info(username)
+        if not user_info:
+            if cached_analysis and osu_client.circuit_open():
+                return render_stale_dashboard(username, user, cached_analysis)
+            return render_template('dashboard.html', 
+                                 username=username,
+                                 error="Could not fetch user data from osu! API")
+        
+        # Save/update user in database
+        user_id = db.upsert_user(user_info)
+        if not user_id:
+            print("Failed to save user to database")
+            return render_template('dashboard.html',
+                                 username=username,
+                                 error="Failed to save user data")
+        
         print(f"Starting comprehensive analysis for {username}...")
         start_time = time.time()
         
         # Get comprehensive data
-        user_data = osu_client.get_comprehensive_user_data(username)
+        user_data = fetch_user_data(osu_client, username, analyzer)
         
         if not user_data or not user_data.get('user_info'):
+            if cached_analysis and osu_client.circuit_open():
+                return render_stale_dashboard(username, user, cached_analysis)
             return render_template('dashboard.html',
                                  username=username,
                                  error="Could not fetch comprehensive user data")
@@ -228,6 +372,7 @@ def wiki():
     return render_template('wiki.html', username=session.get('username'), user_avatar=session.get('avatar_url'))
 
 @analysis_bp.route('/api/analyze/<username>')
+@request_deadline(ANALYSIS_BUDGET)
 def api_analyze(username):
     """API endpoint for skill analysis"""
     if 'username' not in session:
@@ -236,27 +381,34 @@ def api_analyze(username):
     db, osu_client, analyzer = get_components()
     
     try:
-        # Check for recent analysis first
-        user_info = osu_client.get_user_info(username)
-        if not user_info:
-            return jsonify({'error': 'User not found'}), 404
-        
-        user_id = db.upsert_user(user_info)
-        
-        # Check cache
-        cached_analysis = db.get_latest_analysis(user_id)
+        # Check for recent analysis first, straight from the database
+        user = resolve_user(db, username)
+        cached_analysis = user.get('latest_analysis') if user else None
         if cached_analysis and is_cache_valid(cached_analysis, 30):
             return jsonify({
-                'user_info': user_info,
+                'user_info': stored_user_info(user),
                 'analysis': cached_analysis,
                 'timestamp': cached_analysis['created_at'],
                 'from_cache': True
             })
         
+        if cached_analysis and osu_client.circuit_open():
+            return stale_analysis_response(username, user, cached_analysis)
+        
+        user_info = osu_client.get_user_info(username)
+        if not user_info:
+            if cached_analysis and osu_client.circuit_open():
+                return stale_analysis_response(username, user, cached_analysis)
+            return jsonify({'error': 'User not found'}), 404
+        
+        user_id = db.upsert_user(user_info)
+        
         # Perform new analysis
-        user_data = osu_client.get_comprehensive_user_data(username)
+        user_data = fetch_user_data(osu_client, username, analyzer)
         
         if not user_data or not user_data.get('user_info'):
+            if cached_analysis and osu_client.circuit_open():
+                return stale_analysis_response(username, user, cached_analysis)
             return jsonify({'error': 'Could not fetch comprehensive user data'}), 404
         
         # Perform analysis
@@ -306,32 +458,138 @@ def leaderboard():
         leaderboard_stats=leaderboard_stats,
         search_query=search_query,
         verdict_filter=verdict_filter,
+        leaderboard_stream=LEADERBOARD_STREAM,
         username=session.get('username'),
         user_avatar=session.get('avatar_url')
     )
 
 @analysis_bp.route('/api/leaderboard')
 def api_leaderboard():
-    """API endpoint for leaderboard data"""
+    """API endpoint for leaderboard data, one page at a time.
+    
+    Pass a response's next_cursor as ?cursor= to get the following page;
+    next_cursor is null on the last page.
+    """
     db, _, _ = get_components()
-    limit = request.args.get('limit', 50, type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), MAX_LEADERBOARD_PAGE))
     search_query = request.args.get('search', '')
     verdict_filter = request.args.get('verdict', 'all')
+    cursor = request.args.get('cursor')
     
-    leaderboard_data = db.get_leaderboard(limit, search_query, verdict_filter)
+    after = None
+    if cursor:
+        after = decode_leaderboard_cursor(cursor)
+        if after is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
     
-    # Get leaderboard stats
-    leaderboard_stats = db.get_leaderboard_stats(verdict_filter)
+    # Read before the rows, so changes landing meanwhile are reported again
+    # by /api/leaderboard/changes rather than missed
+    version = db.get_leaderboard_version()
+    etag = leaderboard_etag(version)
+    if etag and request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        return response
     
-    return jsonify({
+    leaderboard_data = db.get_leaderboard(limit, search_query, verdict_filter, after)
+    next_cursor = encode_leaderboard_cursor(leaderboard_data[-1]) if len(leaderboard_data) == limit else None
+    
+    # Leaderboard stats are only needed with the first page
+    leaderboard_stats = db.get_leaderboard_stats(verdict_filter) if not cursor else None
+    
+    response = jsonify({
         'leaderboard': leaderboard_data,
         'stats': leaderboard_stats,
+        'next_cursor': next_cursor,
+        'version': version['version'] if version else None,
         'total_entries': len(leaderboard_data),
         'filters': {
             'search': search_query,
             'verdict': verdict_filter
         }
     })
+    if etag:
+        # Browsers keep the page but revalidate it, getting a 304 while nothing changed
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@analysis_bp.route('/api/leaderboard/changes')
+def api_leaderboard_changes():
+    """Leaderboard rows changed since ?since=<version> (from /api/leaderboard or a previous call).
+    
+    Returns the changed rows in any verdict and the version to pass next time.
+    With reset=true the changes can't be listed (rows were deleted, or too
+    many changed) and the client should reload the leaderboard instead.
+    """
+    db, _, _ = get_components()
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since is required'}), 400
+    
+    version = db.get_leaderboard_version()
+    if version is None:
+        return jsonify({'error': 'Leaderboard version unavailable'}), 503
+    
+    if since < version['reset_version']:
+        return jsonify({'version': version['version'], 'reset': True, 'changes': []})
+    
+    # Nothing changed: answered from the cached version, without a query
+    if since >= version['version']:
+        return jsonify({'version': since, 'reset': False, 'changes': []})
+    
+    changes = db.get_leaderboard_changes(since, MAX_LEADERBOARD_CHANGES)
+    if changes is None:
+        return jsonify({'error': 'Could not load leaderboard changes'}), 503
+    if len(changes) >= MAX_LEADERBOARD_CHANGES:
+        return jsonify({'version': version['version'], 'reset': True, 'changes': []})
+    
+    return jsonify({
+        'version': max([since] + [change['version'] for change in changes]),
+        'reset': False,
+        'changes': changes
+    })
+
+@analysis_bp.route('/api/leaderboard/stream')
+def api_leaderboard_stream():
+    """Server-Sent Events stream of leaderboard changes (404 unless LEADERBOARD_STREAM=1).
+    
+    'changes' events carry the changed rows (user_id, skill_score and the
+    full row) and the new version; rows carry no rank, since one row's
+    change moves the ranks of others: clients number rows by their order. After a 'reset' event the client should reload. Events only
+    cover changes made after the client connected, so it should catch up
+    from its version with /api/leaderboard/changes once connected. The
+    stream ends after STREAM_MAX_AGE seconds and the client reconnects.
+    """
+    if not LEADERBOARD_STREAM:
+        return jsonify({'error': 'Live leaderboard stream is disabled'}), 404
+    
+    broadcaster = get_leaderboard_broadcaster()
+    client = broadcaster.subscribe()
+    
+    def stream():
+        closes_at = time.monotonic() + STREAM_MAX_AGE
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                remaining = closes_at - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = client.get(timeout=min(STREAM_KEEPALIVE, remaining))
+                except queue.Empty:
+                    # Keeps proxies from closing the connection, and notices
+                    # disconnected clients
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broadcaster.unsubscribe(client)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @analysis_bp.route('/api/status')
 def api_status():
@@ -345,8 +603,8 @@ def api_status():
         # Test osu! API connection
         api_status = osu_client.get_client_credentials_token()
         
-        # Get cache stats if available
-        cache_stats = getattr(osu_client, 'get_cache_stats', lambda: {})()
+        # Cache counters are maintained incrementally, so this is O(1)
+        cache_stats = osu_client.get_cache_stats()
         
         return jsonify({
             'database': {
@@ -420,15 +678,14 @@ def api_user_history(username):
         return jsonify({'error': 'Access denied'}), 403
 
     
-    db, osu_client, _ = get_components()
+    db, _, _ = get_components()
     
     try:
-        user_info = osu_client.get_user_info(username)
-        if not user_info:
+        user = resolve_user(db, username)
+        if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        user_id = db.upsert_user(user_info)
-        history = db.get_analysis_history(user_id, 10)
+        history = db.get_analysis_history(user['id'], 10)
         
         return jsonify({
             'username': username,
@@ -445,19 +702,17 @@ def api_user_position(username):
     if 'username' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
 
-    db, osu_client, _ = get_components()
+    db, _, _ = get_components()
 
     try:
-        user_info = osu_client.get_user_info(username)
-        if not user_info:
+        user = resolve_user(db, username)
+        if not user:
             return jsonify({'error': 'User not found'}), 404
 
-        user_id = db.upsert_user(user_info)
-
         # Get user's leaderboard position
-        position = db.get_user_leaderboard_position(user_id)
+        position = db.get_user_leaderboard_position(user['id'])
 
-        latest_analysis = db.get_latest_analysis(user_id)
+        latest_analysis = user['latest_analysis']
         analysis_timestamp = latest_analysis.get('created_at') if latest_analysis else None
 
         if not position:
@@ -526,6 +781,24 @@ def api_wipe():
         return jsonify({'error': str(e)}), 500
 
 
+def reanalyze_user(db, osu_client, analyzer, user_id, username):
+    """Fetch, analyse and store one user; returns the analysis or None"""
+    try:
+        user_data = fetch_user_data(osu_client, username, analyzer)
+        
+        if not user_data or not user_data.get('user_info'):
+            print(f"Skipping {username}: could not fetch data")
+            return None
+        
+        analysis = analyzer.analyze_user_skill(user_data)
+        db.save_analysis_result(user_id, analysis)
+        db.update_leaderboard(user_id, analysis)
+        return analysis
+    
+    except Exception as e:
+        print(f"Error analyzing {username}: {e}")
+        return None
+
 @analysis_bp.route('/api/admin/force_reanalyze/<username>')
 @admin_required
 def force_reanalyze_user(username):
@@ -534,7 +807,7 @@ def force_reanalyze_user(username):
     if not user_info:
         return jsonify({'error': 'User not found'}), 404
     user_id = db.upsert_user(user_info)
-    user_data = osu_client.get_comprehensive_user_data(username)
+    user_data = fetch_user_data(osu_client, username, analyzer)
     analysis = analyzer.analyze_user_skill(user_data)
     db.save_analysis_result(user_id, analysis)
     db.update_leaderboard(user_id, analysis)
@@ -544,6 +817,11 @@ def force_reanalyze_user(username):
 @admin_required
 def reanalyze_all_users():
     """Admin endpoint to reanalyze all users with progress tracking"""
+    # The sweep only uses osu! API capacity left over by interactive requests
+    with request_lane(BACKGROUND):
+        return _reanalyze_all_users()
+
+def _reanalyze_all_users():
     db, osu_client, analyzer = get_components()
 
     try:
@@ -578,26 +856,14 @@ def reanalyze_all_users():
                 user_id = user.get('id')
                 processed += 1
 
-                try:
-                    print(f"Reanalyzing ({processed}/{total_users}): {username}")
-                    user_data = osu_client.get_comprehensive_user_data(username)
-
-                    if not user_data or not user_data.get('user_info'):
-                        print(f"Skipping {username}: could not fetch data")
-                        continue
-
-                    analysis = analyzer.analyze_user_skill(user_data)
-                    db.save_analysis_result(user_id, analysis)
-                    db.update_leaderboard(user_id, analysis)
+                print(f"Reanalyzing ({processed}/{total_users}): {username}")
+                analysis = reanalyze_user(db, osu_client, analyzer, user_id, username)
+                if analysis:
                     reanalyzed.append({
                         'username': username,
                         'verdict': analysis['verdict']
                     })
 
-                except Exception as e:
-                    print(f"Error analyzing {username}: {e}")
-                    continue
-
             # If we got fewer than page_size records, we've reached the end
             if len(response.data) < page_size:
                 break
@@ -614,4 +880,71 @@ def reanalyze_all_users():
         })
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/api/admin/ingest_scores')
+@admin_required
+def ingest_scores():
+    """Admin endpoint to pull new scores from the global osu! score feed"""
+    try:
+        ingester = get_score_ingester()
+        run = ingester.run_once()
+        
+        return jsonify({
+            'run': run,
+            'ingester': ingester.stats(),
+            'timestamp': datetime.now(pytz.UTC).isoformat()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/api/admin/update_ranks')
+@admin_required
+def update_leaderboard_ranks():
+    """Admin endpoint to recompute the stored rank_position column (ranks shown are counted at read time)"""
+    db, _, _ = get_components()
+    
+    if not db.update_leaderboard_ranks():
+        return jsonify({'error': 'Failed to update leaderboard ranks'}), 500
+    
+    return jsonify({
+        'updated': True,
+        'timestamp': datetime.now(pytz.UTC).isoformat()
+    })
+
+@analysis_bp.route('/api/admin/reanalyze_marked')
+@admin_required
+def reanalyze_marked_users():
+    """Admin endpoint to reanalyze only users the score feed marked as changed"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    
+    with request_lane(BACKGROUND):
+        db, osu_client, analyzer = get_components()
+        
+        try:
+            reanalyzed = []
+            marked_users = db.get_users_marked_for_reanalysis(limit)
+            
+            for user in marked_users:
+                # Cleared first, so a mark the feed sets during the run survives it
+                db.clear_reanalysis_mark(user['id'])
+                analysis = reanalyze_user(db, osu_client, analyzer, user['id'], user['username'])
+                if analysis:
+                    reanalyzed.append({
+                        'username': user['username'],
+                        'verdict': analysis['verdict']
+                    })
+                else:
+                    # Failed: leave it marked for the next sweep
+                    db.mark_users_for_reanalysis([user['osu_id']])
+            
+            return jsonify({
+                'reanalyzed_count': len(reanalyzed),
+                'marked_count': len(marked_users),
+                'reanalyzed_users': reanalyzed,
+                'timestamp': datetime.now(pytz.UTC).isoformat()
+            })
+        
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
@@ -5,6 +5,22 @@ let currentUsername = null; // Will be set from HTML
 let loadingTimeout = null;
 let cache = new Map();
 
+// Keyset pagination: cursor of the next page (null once the end is reached)
+let nextCursor = null;
+let loadingMore = false;
+let loadGeneration = 0; // bumped on every full reload, so late pages are dropped
+let pageObserver = null;
+let pageBoundary = null;  // last row of the last page fetched: where nextCursor continues
+
+// Leaderboard version the loaded rows are current to (see /api/leaderboard/changes)
+let leaderboardVersion = null;
+
+let leaderboardStream = null;
+let streamConnected = false;
+
+const CHANGES_POLL_INTERVAL = 60000;    // 1 minute
+const FULL_RELOAD_INTERVAL = 1800000;   // 30 minutes
+
 // Cache configuration
 const CACHE_DURATION = 30000; // 30 seconds
 const LOAD_TIMEOUT = 10000;   // 10 seconds
@@ -26,6 +42,8 @@ function initializeCurrentUser() {
 
 async function loadLeaderboard(useCache = true) {
   const cacheKey = `leaderboard_${currentFilter}_${currentLimit}`;
+  loadGeneration++;
+  nextCursor = null;
 
   // Check cache
   if (useCache && cache.has(cacheKey)) {
@@ -33,6 +51,9 @@ async function loadLeaderboard(useCache = true) {
     if (Date.now() - cachedData.timestamp < CACHE_DURATION) {
       console.log('Using cached leaderboard data');
       leaderboardData = cachedData.data.leaderboard;
+      nextCursor = cachedData.data.next_cursor;
+      pageBoundary = leaderboardData[leaderboardData.length - 1] || null;
+      leaderboardVersion = cachedData.data.version;
       updateStats(cachedData.data.stats);
       renderLeaderboard();
       updateTimestamp(cachedData.data.timestamp);
@@ -51,9 +72,10 @@ async function loadLeaderboard(useCache = true) {
   });
 
   try {
+    // Revalidated with the server's ETag: an unchanged leaderboard is a 304
     const fetchPromise = fetch(`/api/leaderboard?verdict=${currentFilter}&limit=${currentLimit}`, {
       method: 'GET',
-      headers: { 'Cache-Control': 'no-cache', 'Pragma': 'no-cache' }
+      cache: 'no-cache'
     });
 
     const response = await Promise.race([fetchPromise, timeoutPromise]);
@@ -68,6 +90,9 @@ async function loadLeaderboard(useCache = true) {
     cleanCache();
 
     leaderboardData = data.leaderboard;
+    nextCursor = data.next_cursor;
+    pageBoundary = leaderboardData[leaderboardData.length - 1] || null;
+    leaderboardVersion = data.version;
     updateStats(data.stats);
     renderLeaderboard();
     updateTimestamp();
@@ -80,6 +105,201 @@ async function loadLeaderboard(useCache = true) {
   }
 }
 
+// Fetch the page after the last loaded row and append it to the table
+async function loadMoreLeaderboard() {
+  if (!nextCursor || loadingMore) return;
+
+  loadingMore = true;
+  const generation = loadGeneration;
+
+  try {
+    // Revalidated with the server's ETag, like the first page
+    const response = await fetch(
+      `/api/leaderboard?verdict=${currentFilter}&limit=${currentLimit}&cursor=${encodeURIComponent(nextCursor)}`,
+      { method: 'GET', cache: 'no-cache' }
+    );
+    if (!response.ok) throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+
+    const data = await response.json();
+    if (data.error) throw new Error(data.error);
+
+    // The filter changed (or the list was reloaded) while this page was loading
+    if (generation !== loadGeneration) return;
+
+    // Rows a pushed change already moved into the loaded pages
+    const loaded = new Set(leaderboardData.map(p => p.user_id));
+    const pageRows = data.leaderboard.filter(p => !loaded.has(p.user_id));
+
+    const table = document.getElementById('leaderboard-table');
+    if (table) {
+      const offset = leaderboardData.length;
+      table.insertAdjacentHTML('beforeend', pageRows
+        .map((p, index) => renderPlayerRow({...p, rank: offset + index + 1}, p.username === currentUsername))
+        .join(''));
+    }
+
+    leaderboardData = leaderboardData.concat(pageRows);
+    nextCursor = data.next_cursor;
+    pageBoundary = data.leaderboard[data.leaderboard.length - 1] || pageBoundary;
+  } catch (error) {
+    console.error('Leaderboard page load error:', error);
+  } finally {
+    loadingMore = false;
+    if (generation === loadGeneration) observeEndOfList();
+  }
+}
+
+// Load the next page when the end of the list scrolls into view
+function observeEndOfList() {
+  if (pageObserver) pageObserver.disconnect();
+
+  const sentinel = document.getElementById('leaderboard-sentinel');
+  if (!sentinel) return;
+  if (!nextCursor) {
+    sentinel.remove();
+    return;
+  }
+
+  pageObserver = new IntersectionObserver((entries) => {
+    if (entries.some(entry => entry.isIntersecting)) loadMoreLeaderboard();
+  }, { rootMargin: '400px' });
+  pageObserver.observe(sentinel);
+}
+
+// Leaderboard order: skill_score descending, then user_id
+function compareRows(a, b) {
+  return (b.skill_score - a.skill_score) || (a.user_id - b.user_id);
+}
+
+// Ask the server what changed since leaderboardVersion and patch the loaded rows
+async function pollLeaderboardChanges(force = false) {
+  if (leaderboardVersion === null || loadingMore) return;
+  if (streamConnected && !force) return;
+
+  const generation = loadGeneration;
+
+  try {
+    const response = await fetch(`/api/leaderboard/changes?since=${leaderboardVersion}`, {
+      method: 'GET',
+      cache: 'no-store'
+    });
+    if (!response.ok) return;
+
+    const data = await response.json();
+    if (generation !== loadGeneration) return;
+
+    if (data.reset) {
+      loadLeaderboard(false);
+      return;
+    }
+
+    leaderboardVersion = Math.max(leaderboardVersion, data.version);
+    applyLeaderboardChanges(data.changes);
+  } catch (error) {
+    console.error('Leaderboard changes error:', error);
+  }
+}
+
+// Whether a changed row belongs among the loaded rows
+function belongsInLoadedRows(row) {
+  if (currentFilter !== 'all' && row.verdict !== currentFilter) return false;
+  // Rows that now sort past the loaded pages arrive with the next page
+  return !(nextCursor && pageBoundary && compareRows(row, pageBoundary) > 0);
+}
+
+function rowElement(player) {
+  const template = document.createElement('template');
+  template.innerHTML = renderPlayerRow(player, player.username === currentUsername).trim();
+  return template.content.firstElementChild;
+}
+
+// Move, insert or remove just the changed rows, then renumber ranks in place
+function applyLeaderboardChanges(changes) {
+  if (!changes || changes.length === 0) return;
+
+  const table = document.getElementById('leaderboard-table');
+
+  for (const row of changes) {
+    const index = leaderboardData.findIndex(p => p.user_id === row.user_id);
+    if (index !== -1) leaderboardData.splice(index, 1);
+
+    const existing = table && table.querySelector(`.table-row[data-user-id="${row.user_id}"]`);
+    if (existing) existing.remove();
+
+    if (!belongsInLoadedRows(row)) continue;
+
+    let position = leaderboardData.findIndex(p => compareRows(row, p) < 0);
+    if (position === -1) position = leaderboardData.length;
+    leaderboardData.splice(position, 0, row);
+
+    if (table) {
+      const next = leaderboardData[position + 1];
+      const nextElement = next && table.querySelector(`.table-row[data-user-id="${next.user_id}"]`);
+      table.insertBefore(rowElement({...row, rank: position + 1}), nextElement || null);
+    }
+  }
+
+  cache.clear();
+  updateTimestamp();
+
+  if (table) {
+    renumberRows(table);
+  } else {
+    // Nothing was shown yet (e.g. the empty state)
+    renderLeaderboard();
+  }
+}
+
+function renumberRows(table) {
+  table.querySelectorAll('.table-row').forEach((element, index) => {
+    const rank = index + 1;
+    const rankCell = element.querySelector('.rank-cell');
+    if (!rankCell || rankCell.textContent === `#${rank}`) return;
+
+    rankCell.textContent = `#${rank}`;
+    if (!rankCell.classList.contains('current-user-rank')) {
+      rankCell.className = rank <= 3 ? `rank-cell rank-${rank}` : 'rank-cell';
+    }
+  });
+}
+
+// Whether the server runs the live stream (LEADERBOARD_STREAM); without it
+// the page keeps polling for changes
+function liveStreamEnabled() {
+  const userData = document.getElementById('user-data');
+  return Boolean(userData && userData.dataset.stream === '1');
+}
+
+// Live updates: the server pushes changed rows as they happen. Polling
+// only runs while the stream is down. The server closes the stream every
+// few minutes; EventSource reconnects and onopen catches up
+function connectLeaderboardStream() {
+  if (!window.EventSource || !liveStreamEnabled()) return;
+
+  leaderboardStream = new EventSource('/api/leaderboard/stream');
+
+  leaderboardStream.onopen = () => {
+    streamConnected = true;
+    // The stream only carries changes made from now on
+    pollLeaderboardChanges(true);
+  };
+
+  leaderboardStream.onerror = () => {
+    // EventSource reconnects by itself; poll until it does
+    streamConnected = false;
+  };
+
+  leaderboardStream.addEventListener('changes', (message) => {
+    const event = JSON.parse(message.data);
+    if (leaderboardVersion === null) return;
+
+    applyLeaderboardChanges(event.changes.map(change => change.row));
+    leaderboardVersion = Math.max(leaderboardVersion, event.version);
+  });
+
+  leaderboardStream.addEventListener('reset', () => loadLeaderboard(false));
+}
+
 async function getCurrentUserPosition() {
   if (!currentUsername) return null;
 
@@ -164,8 +384,8 @@ async function renderLeaderboard() {
     currentUserData = await getCurrentUserPosition();
   }
 
-  // Get top players (including current user if they're in the top results)
-  let topPlayersData = filteredData.slice(0, currentLimit);
+  // Every loaded page (including current user if they're in the results)
+  let topPlayersData = filteredData;
 
   if (filteredData.length === 0) {
     content.innerHTML = `
@@ -208,7 +428,7 @@ async function renderLeaderboard() {
     leaderboardSection.className = 'leaderboard-section';
     leaderboardSection.innerHTML = `
       <h2 class="section-title">${currentUserData && currentUserData.rank > currentLimit ? 'Global Leaderboard' : 'Leaderboard'}</h2>
-      <div class="leaderboard-table">
+      <div class="leaderboard-table" id="leaderboard-table">
         <div class="table-header">
           <div>Rank</div>
           <div>Player</div>
@@ -220,12 +440,14 @@ async function renderLeaderboard() {
         </div>
         ${topPlayersData.map((p, index) => renderPlayerRow({...p, rank: index + 1}, p.username === currentUsername)).join('')}
       </div>
+      <div class="loading-more" id="leaderboard-sentinel">Loading more players...</div>
     `;
     fragment.appendChild(leaderboardSection);
   }
 
   content.innerHTML = '';
   content.appendChild(fragment);
+  observeEndOfList();
 }
 
 function renderPlayerRow(player, isCurrentUser) {
@@ -269,7 +491,7 @@ function renderPlayerRow(player, isCurrentUser) {
   const avatarUrl = player.avatar_url || 'https://a.ppy.sh/14752899?1628953484.png';
 
   return `
-      <div class="${rowClass}">
+      <div class="${rowClass}" data-user-id="${player.user_id}">
       <div class="${rankClass}">#${player.rank}</div>
       <div class="player-cell">
           <img src="${avatarUrl}" alt="${player.username}" class="${avatarClass}"
@@ -322,13 +544,20 @@ function handleFilterChange() {
 document.getElementById('verdict-filter').addEventListener('change', handleFilterChange);
 document.getElementById('limit-filter').addEventListener('change', handleFilterChange);
 
-// Auto-refresh every 5 minutes
-setInterval(() => loadLeaderboard(false), 300000);
+// Poll for changed rows while the live stream is unavailable
+setInterval(() => pollLeaderboardChanges(), CHANGES_POLL_INTERVAL);
+
+// Occasional full reload as a safety net (a 304 when nothing changed), unless
+// further pages were scrolled into (a reload would drop them and the scroll position)
+setInterval(() => {
+  if (leaderboardData.length <= currentLimit) loadLeaderboard(false);
+}, FULL_RELOAD_INTERVAL);
 
 // Initial load
 document.addEventListener('DOMContentLoaded', () => {
   initializeCurrentUser();
-  loadLeaderboard(false);
+  // Connected once rows are loaded, so no pushed change arrives before them
+  loadLeaderboard(false).then(connectLeaderboardStream);
 });
 
 // Add loading styles
@@ -355,6 +584,13 @@ style.textContent = `
     100% { transform: rotate(360deg); }
   }
 
+  .loading-more {
+    text-align: center;
+    padding: 20px;
+    color: var(--color-text-light);
+    font-size: 14px;
+  }
+
   .loading-tip, .error-tip {
     font-size: 14px;
     opacity: 0.8;
@@ -0,0 +1,142 @@
+"""Benchmark the full get_comprehensive_user_data flow against the fake osu! API.
+
+Runs a workload (N distinct users, C concurrent callers) through OsuClient
+and reports throughput, latency percentiles and upstream request counts. The
+fake API runs in its own process so it does not compete with the client for
+the GIL.
+
+    python -m benchmarks.bench_osu_client --users 60 --concurrency 12 --latency 0.03
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@contextlib.contextmanager
+def fake_api_process(port, latency, sparse_scores=False, server_rate_limit=0):
+    """Start benchmarks.fake_osu_api in a subprocess and yield its environment"""
+    command = [sys.executable, '-m', 'benchmarks.fake_osu_api', '--port', str(port), '--latency', str(latency),
+               '--rate-limit', str(server_rate_limit)]
+    if sparse_scores:
+        command.append('--sparse-scores')
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        env = {}
+        # The server prints KEY=value lines, then a blank line
+        for line in iter(process.stdout.readline, ''):
+            if not line.strip():
+                break
+            key, _, value = line.strip().partition('=')
+            env[key] = value
+        yield env
+    finally:
+        process.terminate()
+        process.wait(timeout=5)
+
+
+def upstream_counts(base_url, reset=False):
+    method = requests.post if reset else requests.get
+    return method(f'{base_url}/_stats', timeout=5).json()
+
+
+def run_workload(fetch, usernames, concurrency):
+    """Call fetch(username) for every user from a pool of worker threads"""
+    latencies = []
+
+    def timed(username):
+        start = time.perf_counter()
+        data = fetch(username)
+        latencies.append(time.perf_counter() - start)
+        return data
+
+    start = time.perf_counter()
+    # Keep the clients' progress logging out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, usernames))
+    elapsed = time.perf_counter() - start
+
+    failures = sum(1 for data in results if not data or not data.get('user_info'))
+    client_calls = [data.get('upstream_calls', 0) for data in results if data]
+    timings = [data['timings'] for data in results if data and data.get('timings')]
+    return elapsed, latencies, failures, client_calls, timings
+
+
+def stage_medians(timings):
+    """Median duration of each pipeline stage, in order of median start"""
+    stages = {}
+    for timing in timings:
+        for name, stage in timing['stages'].items():
+            stages.setdefault(name, []).append(stage)
+    ordered = sorted(stages.items(), key=lambda item: statistics.median(s['start_ms'] for s in item[1]))
+    return ', '.join(f"{name} {statistics.median(s['duration_ms'] for s in samples):.0f}" for name, samples in ordered)
+
+
+def report(name, counts, elapsed, latencies, failures, client_calls, flows, timings):
+    upstream = sum(counts.values())
+    print(f"{name}")
+    print(f"  flows/s         {flows / elapsed:8.2f}")
+    print(f"  upstream req/s  {upstream / elapsed:8.2f}  ({upstream} requests, {upstream / flows:.1f} per flow)")
+    print(f"  p50 latency     {statistics.median(latencies) * 1000:8.1f} ms")
+    print(f"  p99 latency     {percentile(latencies, 99) * 1000:8.1f} ms")
+    print(f"  calls/analysis  {statistics.mean(client_calls or [0]):8.1f}  (client-side upstream_calls)")
+    if timings:
+        critical_path = statistics.median(timing['total_ms'] for timing in timings)
+        print(f"  critical path   {critical_path:8.1f} ms  (p50 stage ms: {stage_medians(timings)})")
+    print(f"  failures        {failures:8d}")
+    print(f"  by route        {counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=60)
+    parser.add_argument('--concurrency', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=0.03, help='fake API latency in seconds')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate-limit', action='store_true', help='keep the client\'s token-bucket rate limit enabled')
+    parser.add_argument('--sparse-scores', action='store_true',
+                        help='serve scores without beatmap difficulty fields, forcing enrichment')
+    parser.add_argument('--server-rate-limit', type=int, default=0,
+                        help='make the fake API answer 429 beyond this many calls per second')
+    args = parser.parse_args()
+
+    with fake_api_process(args.port, args.latency, args.sparse_scores, args.server_rate_limit) as env:
+        os.environ.update(env)
+        if not args.rate_limit:
+            os.environ['OSU_RATE_LIMIT'] = '0'
+        base_url = env['OSU_TOKEN_URL'].rsplit('/oauth/', 1)[0]
+
+        # Imported after the environment points at the fake API
+        from app.api.osu_client import OsuClient
+
+        print(f"{args.users} users, {args.concurrency} concurrent callers, "
+              f"{args.latency * 1000:.0f} ms upstream latency\n")
+
+        client = OsuClient()
+        usernames = [f'user{i}' for i in range(args.users)]
+        upstream_counts(base_url, reset=True)
+        elapsed, latencies, failures, client_calls, timings = run_workload(
+            client.get_comprehensive_user_data, usernames, args.concurrency
+        )
+        report('OsuClient', upstream_counts(base_url), elapsed, latencies, failures, client_calls, len(usernames),
+               timings)
+
+
+if __name__ == '__main__':
+    main()
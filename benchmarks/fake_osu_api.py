@@ -0,0 +1,318 @@
+"""Local stand-in for the osu! v2 API.
+
+Serves deterministic users, scores and beatmaps with a configurable latency so
+the osu! clients can be exercised without touching osu.ppy.sh. Point a client at
+it with OSU_API_URL / OSU_TOKEN_URL (see FakeOsuApi.env()). GET /_stats returns
+per-route request counts, POST /_stats returns them and resets the counters.
+With --rate-limit N, API calls beyond N per second get 429 with Retry-After.
+GET /scores (the global score feed) replays a recorded fixture page by page,
+following cursor_string (see fixtures/score_feed.json). POST
+/beatmaps/{id}/attributes scales star ratings with the usual mod multipliers.
+
+    python -m benchmarks.fake_osu_api --port 8765 --latency 0.03
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BEATMAP_POOL_SIZE = 400
+
+SCORE_FEED_FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'score_feed.json')
+
+# Mod combinations handed out to generated scores, by seed
+SCORE_MODS = (['HD'], [], [], ['HD', 'DT'], [], ['HR'])
+
+# Star rating multipliers used for fake difficulty attributes
+STAR_RATING_MULTIPLIERS = {'EZ': 0.5, 'HT': 0.75, 'HR': 1.1, 'DT': 1.4, 'NC': 1.4, 'FL': 1.05}
+
+
+def _seed(value) -> int:
+    return int(hashlib.md5(str(value).encode()).hexdigest()[:8], 16)
+
+
+def make_beatmap(beatmap_id: int) -> dict:
+    seed = _seed(beatmap_id)
+    return {
+        'id': beatmap_id,
+        'beatmapset_id': beatmap_id // 3,
+        'mode': 'osu',
+        'status': 'ranked' if seed % 10 else 'loved',
+        'difficulty_rating': round(2.0 + (seed % 600) / 100, 2),
+        'ar': round(7.0 + (seed % 30) / 10, 1),
+        'cs': round(3.0 + (seed % 20) / 10, 1),
+        'accuracy': round(7.0 + (seed % 25) / 10, 1),
+        'bpm': 120 + seed % 160,
+        'total_length': 60 + seed % 240,
+        'version': f'Difficulty {seed % 7}'
+    }
+
+
+def make_difficulty_attributes(beatmap_id: int, mods: list) -> dict:
+    beatmap = make_beatmap(beatmap_id)
+    star_rating = beatmap['difficulty_rating']
+    for mod in mods:
+        star_rating *= STAR_RATING_MULTIPLIERS.get(mod, 1.0)
+    return {
+        'attributes': {
+            'star_rating': round(star_rating, 2),
+            'max_combo': 200 + _seed(beatmap_id) % 1800,
+            'aim_difficulty': round(star_rating * 0.52, 2),
+            'speed_difficulty': round(star_rating * 0.48, 2),
+            'approach_rate': beatmap['ar'],
+            'overall_difficulty': beatmap['accuracy']
+        }
+    }
+
+
+def make_user(username: str) -> dict:
+    user_id = _seed(username.lower()) % 30000000 + 1
+    return {
+        'id': user_id,
+        'username': username,
+        'avatar_url': f'https://a.ppy.sh/{user_id}',
+        'statistics': {
+            'global_rank': user_id % 200000 + 1,
+            'pp': float(2000 + user_id % 8000),
+            'play_count': 1000 + user_id % 50000
+        }
+    }
+
+
+def make_scores(user_id: int, score_type: str, limit: int, sparse: bool = False, offset: int = 0) -> list:
+    now = datetime.now(timezone.utc)
+    scores = []
+    for i in range(offset, offset + limit):
+        seed = _seed(f'{user_id}:{score_type}:{i}')
+        beatmap = make_beatmap(1000 + seed % BEATMAP_POOL_SIZE)
+        if sparse:
+            # Older payload shape without the difficulty fields the analysis needs
+            beatmap = {key: beatmap[key] for key in ('id', 'beatmapset_id', 'mode', 'status')}
+        hours_ago = i * 3 if score_type == 'recent' else seed % 8000
+        scores.append({
+            'id': seed,
+            'user_id': user_id,
+            'accuracy': 0.9 + (seed % 100) / 1000,
+            'mods': list(SCORE_MODS[seed % len(SCORE_MODS)]),
+            'pp': 100 + seed % 300,
+            'passed': True,
+            'created_at': (now - timedelta(hours=hours_ago)).isoformat().replace('+00:00', 'Z'),
+            'beatmap': beatmap
+        })
+    return scores
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Clients open their whole connection pool at once
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Hedged requests that lost the race are cancelled mid-response
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeOsuApi:
+    """Threaded HTTP server emulating the osu! endpoints used by the clients"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.02,
+                 sparse_scores: bool = False, rate_limit: int = 0, score_feed: str = SCORE_FEED_FIXTURE,
+                 bulk_omitted_beatmaps=()):
+        self.latency = latency
+        self.sparse_scores = sparse_scores
+        self.rate_limit = rate_limit
+        # Ids GET /beatmaps leaves out of its response; GET /beatmaps/{id} still serves them
+        self.bulk_omitted_beatmaps = set(bulk_omitted_beatmaps)
+        with open(score_feed) as f:
+            self.score_feed_pages = json.load(f)['pages']
+        self._window = (0, 0)  # (second, API calls seen in it)
+        self.request_counts = Counter()
+        self._counts_lock = threading.Lock()
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self) -> dict:
+        """Environment variables that point an osu! client at this server"""
+        return {
+            'OSU_API_URL': f'{self.base_url}/api/v2',
+            'OSU_TOKEN_URL': f'{self.base_url}/oauth/token',
+            'OSU_CLIENT_ID': 'fake',
+            'OSU_CLIENT_SECRET': 'fake'
+        }
+
+    def start(self) -> 'FakeOsuApi':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._counts_lock:
+            self.request_counts.clear()
+
+    def total_requests(self) -> int:
+        with self._counts_lock:
+            return sum(self.request_counts.values())
+
+    def _record(self, route: str):
+        if route is None:
+            return
+        with self._counts_lock:
+            self.request_counts[route] += 1
+
+    def _throttled(self) -> bool:
+        """Fixed one-second window limiter for API calls"""
+        if not self.rate_limit:
+            return False
+        second = int(time.time())
+        with self._counts_lock:
+            window_second, calls = self._window
+            calls = calls + 1 if window_second == second else 1
+            self._window = (second, calls)
+        return calls > self.rate_limit
+
+    def route(self, method: str, path: str, query: dict, body: dict):
+        """Resolve a request to (route name, status, payload)"""
+        parts = [part for part in path.split('/') if part]
+
+        if parts == ['_stats']:
+            if method == 'POST':
+                self.reset_counts()
+            with self._counts_lock:
+                return None, 200, dict(self.request_counts)
+
+        if method == 'POST' and parts == ['oauth', 'token']:
+            return 'token', 200, {'access_token': 'fake-token', 'expires_in': 86400}
+
+        if parts[:2] != ['api', 'v2']:
+            return 'unknown', 404, {'error': 'not found'}
+        parts = parts[2:]
+
+        if self._throttled():
+            return 'throttled', 429, {'error': 'rate limited'}
+
+        if len(parts) == 3 and parts[0] == 'users' and parts[2] == 'osu':
+            return 'user', 200, make_user(parts[1])
+
+        if len(parts) == 4 and parts[0] == 'users' and parts[2] == 'scores':
+            limit = int(query.get('limit', ['50'])[0])
+            offset = int(query.get('offset', ['0'])[0])
+            return 'scores', 200, make_scores(int(parts[1]), parts[3], min(limit, 100), self.sparse_scores, offset)
+
+        if parts == ['scores']:
+            return 'score_feed', 200, self.score_feed_page(query.get('cursor_string', [None])[0])
+
+        if parts == ['beatmaps']:
+            ids = [int(beatmap_id) for beatmap_id in query.get('ids[]', []) if beatmap_id.isdigit()]
+            if len(ids) > 50:
+                return 'beatmaps', 422, {'error': 'too many ids'}
+            return 'beatmaps', 200, {'beatmaps': [
+                make_beatmap(beatmap_id) for beatmap_id in ids if beatmap_id not in self.bulk_omitted_beatmaps
+            ]}
+
+        if len(parts) == 2 and parts[0] == 'beatmaps' and parts[1].isdigit():
+            return 'beatmap', 200, make_beatmap(int(parts[1]))
+
+        if method == 'POST' and len(parts) == 3 and parts[0] == 'beatmaps' and parts[2] == 'attributes':
+            return 'attributes', 200, make_difficulty_attributes(int(parts[1]), body.get('mods') or [])
+
+        return 'unknown', 404, {'error': 'not found'}
+
+    def respond(self, method: str, target: str, body: bytes):
+        """Answer one request: (status, headers, body bytes), after the configured latency"""
+        parsed = urlparse(target)
+        payload = json.loads(body) if body else {}
+
+        route, status, payload = self.route(method, parsed.path, parse_qs(parsed.query), payload)
+        self._record(route)
+
+        if self.latency and route is not None:
+            time.sleep(self.latency)
+
+        data = json.dumps(payload).encode()
+        headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(data)))]
+        if status == 429:
+            headers.append(('Retry-After', '1'))
+        return status, headers, data
+
+    def score_feed_page(self, cursor_string):
+        """The recorded feed page after cursor_string (the first page when it is missing)"""
+        index = 0
+        if cursor_string:
+            index = int(cursor_string.rsplit('-', 1)[-1])
+        if index >= len(self.score_feed_pages):
+            # Caught up: nothing new, same cursor
+            return {'scores': [], 'cursor_string': cursor_string}
+        return self.score_feed_pages[index]
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _handle(self, method: str):
+                length = int(self.headers.get('Content-Length') or 0)
+                status, headers, data = api.respond(method, self.path, self.rfile.read(length) if length else b'')
+
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local fake osu! API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every response')
+    parser.add_argument('--sparse-scores', action='store_true', help='omit difficulty fields from score beatmaps')
+    parser.add_argument('--rate-limit', type=int, default=0, help='API calls per second before answering 429')
+    parser.add_argument('--score-feed', default=SCORE_FEED_FIXTURE, help='recorded /scores feed to replay')
+    args = parser.parse_args()
+
+    api = FakeOsuApi(args.host, args.port, args.latency, args.sparse_scores, args.rate_limit,
+                     args.score_feed).start()
+    for key, value in api.env().items():
+        print(f'{key}={value}', flush=True)
+    # A blank line ends the environment block
+    print(flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == '__main__':
+    main()
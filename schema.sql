@@ -7,10 +7,14 @@ CREATE TABLE IF NOT EXISTS users (
     rank INTEGER,
     pp REAL,
     playcount INTEGER,
+    needs_reanalysis BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Set by the score feed ingester when a user's scores change (existing databases)
+ALTER TABLE users ADD COLUMN IF NOT EXISTS needs_reanalysis BOOLEAN DEFAULT FALSE;
+
 -- Create Analysis Results table
 CREATE TABLE IF NOT EXISTS analysis_results (
     id BIGSERIAL PRIMARY KEY,
@@ -33,6 +37,41 @@ CREATE TABLE IF NOT EXISTS api_cache (
     expires_at TIMESTAMPTZ,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
+-- Create Scores table (every fetched osu! score, keyed by the osu! score id)
+CREATE TABLE IF NOT EXISTS scores (
+    id BIGINT PRIMARY KEY,
+    osu_user_id INTEGER NOT NULL,
+    beatmap_id INTEGER,
+    pp REAL,
+    is_best BOOLEAN DEFAULT FALSE,
+    -- Seen among the user's recent plays (recent endpoint or score feed),
+    -- as opposed to only in their best scores
+    is_recent BOOLEAN DEFAULT FALSE,
+    score_data JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL,
+    stored_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Existing databases: every stored score that isn't a best score came from
+-- recent plays (only rows from before the column existed are NULL)
+ALTER TABLE scores ADD COLUMN IF NOT EXISTS is_recent BOOLEAN;
+UPDATE scores SET is_recent = NOT COALESCE(is_best, FALSE) WHERE is_recent IS NULL;
+ALTER TABLE scores ALTER COLUMN is_recent SET DEFAULT FALSE;
+
+-- Cursor checkpoints of feed ingesters (e.g. the global osu! score feed)
+CREATE TABLE IF NOT EXISTS ingest_state (
+    name TEXT PRIMARY KEY,
+    cursor_string TEXT,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Per-user score sync state (when scores were last fetched, and at what total pp)
+CREATE TABLE IF NOT EXISTS score_sync (
+    osu_user_id INTEGER PRIMARY KEY,
+    best_pp REAL,
+    best_synced_at TIMESTAMPTZ,
+    recent_synced_at TIMESTAMPTZ
+);
 
 -- Create Leaderboard table
 CREATE TABLE IF NOT EXISTS leaderboard (
@@ -45,49 +84,344 @@ CREATE TABLE IF NOT EXISTS leaderboard (
     verdict TEXT DEFAULT 'unknown',
     skill_score REAL DEFAULT 0,
     rank_position INTEGER DEFAULT 0,
+    last_analysis_at TIMESTAMPTZ,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW(),
     UNIQUE(user_id)
 );
 
+-- Leaderboard change versions: every insert or change of a leaderboard row
+-- (its scores, or the user's profile shown with it) stamps it with the next
+-- value, so clients can ask for the rows changed since the version
+-- they last saw
+CREATE SEQUENCE IF NOT EXISTS leaderboard_version_seq;
+ALTER TABLE leaderboard ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+
+-- Deletions leave no row to report, so the version at the last one is kept
+-- and clients that saw an older version reload instead
+CREATE TABLE IF NOT EXISTS leaderboard_resets (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    reset_version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO leaderboard_resets (id, reset_version) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;
+
+-- Per-verdict leaderboard aggregates, kept current by triggers on leaderboard
+-- so the stats shown with the leaderboard are a read of a handful of rows.
+-- Zero skill/confidence values are left out of the averages and maximum
+CREATE TABLE IF NOT EXISTS leaderboard_stats (
+    verdict TEXT PRIMARY KEY,
+    players BIGINT NOT NULL DEFAULT 0,
+    skill_count BIGINT NOT NULL DEFAULT 0,
+    skill_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    top_skill REAL NOT NULL DEFAULT 0,
+    confidence_count BIGINT NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE PRECISION NOT NULL DEFAULT 0
+);
+
+-- Exact row counts of large tables (users, analysis_results), kept by
+-- triggers so counting never scans the table
+CREATE TABLE IF NOT EXISTS row_counters (
+    name TEXT PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0
+);
+
+-- Time of the user's latest analysis, written with each leaderboard update
+-- (existing databases: add the column and backfill it once)
+ALTER TABLE leaderboard ADD COLUMN IF NOT EXISTS last_analysis_at TIMESTAMPTZ;
+UPDATE leaderboard
+SET last_analysis_at = latest.created_at
+FROM (
+    SELECT user_id, MAX(created_at) AS created_at
+    FROM analysis_results
+    GROUP BY user_id
+) latest
+WHERE leaderboard.user_id = latest.user_id
+  AND leaderboard.last_analysis_at IS NULL;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_leaderboard_skill_score ON leaderboard (skill_score DESC);
+-- Leaderboard order, and the key its pages are fetched by
+CREATE INDEX IF NOT EXISTS idx_leaderboard_skill_score_user ON leaderboard (skill_score DESC, user_id);
 CREATE INDEX IF NOT EXISTS idx_leaderboard_user_id ON leaderboard (user_id);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_version ON leaderboard (version);
 CREATE INDEX IF NOT EXISTS idx_users_username ON users USING GIN (username gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS idx_users_osu_id ON users (osu_id);
 CREATE INDEX IF NOT EXISTS idx_analysis_user_id ON analysis_results (user_id);
 CREATE INDEX IF NOT EXISTS idx_analysis_created_at ON analysis_results (created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_api_cache_key ON api_cache (cache_key);
 CREATE INDEX IF NOT EXISTS idx_api_cache_expires ON api_cache (expires_at);
+-- Recent play history; best scores are read through idx_scores_user_best
+DROP INDEX IF EXISTS idx_scores_user_created;
+CREATE INDEX IF NOT EXISTS idx_scores_user_recent ON scores (osu_user_id, created_at DESC) WHERE is_recent;
+CREATE INDEX IF NOT EXISTS idx_users_needs_reanalysis ON users (updated_at) WHERE needs_reanalysis;
+CREATE INDEX IF NOT EXISTS idx_scores_user_best ON scores (osu_user_id, pp DESC) WHERE is_best;
 
 -- Enable Row Level Security (RLS)
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE analysis_results ENABLE ROW LEVEL SECURITY;
 ALTER TABLE api_cache ENABLE ROW LEVEL SECURITY;
+ALTER TABLE scores ENABLE ROW LEVEL SECURITY;
+ALTER TABLE score_sync ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ingest_state ENABLE ROW LEVEL SECURITY;
 ALTER TABLE leaderboard ENABLE ROW LEVEL SECURITY;
+ALTER TABLE leaderboard_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE row_counters ENABLE ROW LEVEL SECURITY;
+ALTER TABLE leaderboard_resets ENABLE ROW LEVEL SECURITY;
 
 -- Create RLS policies (allowing all operations for now - adjust as needed)
 CREATE POLICY "Enable all operations for users" ON users FOR ALL USING (true);
 CREATE POLICY "Enable all operations for analysis_results" ON analysis_results FOR ALL USING (true);
 CREATE POLICY "Enable all operations for api_cache" ON api_cache FOR ALL USING (true);
+CREATE POLICY "Enable all operations for scores" ON scores FOR ALL USING (true);
+CREATE POLICY "Enable all operations for score_sync" ON score_sync FOR ALL USING (true);
+CREATE POLICY "Enable all operations for ingest_state" ON ingest_state FOR ALL USING (true);
 CREATE POLICY "Enable all operations for leaderboard" ON leaderboard FOR ALL USING (true);
+CREATE POLICY "Enable all operations for leaderboard_stats" ON leaderboard_stats FOR ALL USING (true);
+CREATE POLICY "Enable all operations for row_counters" ON row_counters FOR ALL USING (true);
+CREATE POLICY "Enable all operations for leaderboard_resets" ON leaderboard_resets FOR ALL USING (true);
 
--- Create function to update leaderboard ranks
+-- Create function to update the stored rank_position column (the app counts
+-- ranks at read time). Only rows whose position changed are written, they keep
+-- their version, and concurrent runs are serialized rather than fighting over
+-- the same rows
 CREATE OR REPLACE FUNCTION update_leaderboard_ranks()
 RETURNS void AS $$
 BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('update_leaderboard_ranks'));
+
     UPDATE leaderboard 
     SET rank_position = ranked.rank
     FROM (
         SELECT id, 
-               ROW_NUMBER() OVER (ORDER BY skill_score DESC) as rank
+               ROW_NUMBER() OVER (ORDER BY skill_score DESC, user_id) as rank
         FROM leaderboard
     ) ranked
-    WHERE leaderboard.id = ranked.id;
+    WHERE leaderboard.id = ranked.id
+      AND leaderboard.rank_position IS DISTINCT FROM ranked.rank;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replace a user's best scores with p_scores (a JSON array of score rows) in
+-- one transaction, so readers never see the set half swapped. Scores that
+-- left the set stay stored, no longer flagged is_best
+CREATE OR REPLACE FUNCTION replace_best_scores(p_osu_user_id INTEGER, p_scores JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    stored INTEGER;
+BEGIN
+    -- Two replacements for the same user would interleave their flags
+    PERFORM pg_advisory_xact_lock(hashtext('replace_best_scores'), p_osu_user_id);
+
+    UPDATE scores
+    SET is_best = FALSE
+    WHERE osu_user_id = p_osu_user_id
+      AND is_best
+      AND id NOT IN (SELECT (score->>'id')::BIGINT FROM jsonb_array_elements(p_scores) score);
+
+    INSERT INTO scores (id, osu_user_id, beatmap_id, pp, is_best, score_data, created_at)
+    SELECT best.id, p_osu_user_id, best.beatmap_id, best.pp, TRUE, best.score_data, best.created_at
+    FROM jsonb_to_recordset(p_scores)
+        AS best(id BIGINT, beatmap_id INTEGER, pp REAL, score_data JSONB, created_at TIMESTAMPTZ)
+    ON CONFLICT (id) DO UPDATE SET
+        is_best = TRUE,
+        beatmap_id = EXCLUDED.beatmap_id,
+        pp = EXCLUDED.pp,
+        score_data = EXCLUDED.score_data;
+
+    GET DIAGNOSTICS stored = ROW_COUNT;
+    RETURN stored;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one leaderboard row's values
+-- to/from its verdict's leaderboard_stats row
+CREATE OR REPLACE FUNCTION apply_leaderboard_stats(p_verdict TEXT, p_sign INTEGER, p_skill REAL, p_confidence REAL)
+RETURNS void AS $$
+BEGIN
+    p_skill := COALESCE(p_skill, 0);
+    p_confidence := COALESCE(p_confidence, 0);
+
+    INSERT INTO leaderboard_stats AS stats
+        (verdict, players, skill_count, skill_sum, top_skill, confidence_count, confidence_sum)
+    VALUES (
+        p_verdict,
+        p_sign,
+        CASE WHEN p_skill > 0 THEN p_sign ELSE 0 END,
+        p_sign * p_skill,
+        CASE WHEN p_sign > 0 THEN p_skill ELSE 0 END,
+        CASE WHEN p_confidence > 0 THEN p_sign ELSE 0 END,
+        p_sign * p_confidence
+    )
+    ON CONFLICT (verdict) DO UPDATE SET
+        players = stats.players + EXCLUDED.players,
+        skill_count = stats.skill_count + EXCLUDED.skill_count,
+        skill_sum = stats.skill_sum + EXCLUDED.skill_sum,
+        top_skill = GREATEST(stats.top_skill, EXCLUDED.top_skill),
+        confidence_count = stats.confidence_count + EXCLUDED.confidence_count,
+        confidence_sum = stats.confidence_sum + EXCLUDED.confidence_sum;
+
+    -- A maximum can't be decremented: rescan only when the top skill left
+    IF p_sign < 0 AND p_skill > 0 THEN
+        UPDATE leaderboard_stats
+        SET top_skill = COALESCE(
+            (SELECT MAX(recent_skill) FROM leaderboard WHERE verdict = p_verdict AND recent_skill > 0), 0)
+        WHERE verdict = p_verdict AND top_skill <= p_skill;
+    END IF;
 END;
 $$ LANGUAGE plpgsql;
 
--- Create function to automatically update updated_at timestamp
+CREATE OR REPLACE FUNCTION track_leaderboard_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_leaderboard_stats(OLD.verdict, -1, OLD.recent_skill, OLD.confidence);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_leaderboard_stats(NEW.verdict, 1, NEW.recent_skill, NEW.confidence);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute leaderboard_stats from scratch (initial fill, or repair)
+CREATE OR REPLACE FUNCTION rebuild_leaderboard_stats()
+RETURNS void AS $$
+BEGIN
+    LOCK TABLE leaderboard IN SHARE MODE;
+    DELETE FROM leaderboard_stats;
+    INSERT INTO leaderboard_stats
+        (verdict, players, skill_count, skill_sum, top_skill, confidence_count, confidence_sum)
+    SELECT verdict,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE recent_skill > 0),
+           COALESCE(SUM(recent_skill) FILTER (WHERE recent_skill > 0), 0),
+           COALESCE(MAX(recent_skill) FILTER (WHERE recent_skill > 0), 0),
+           COUNT(*) FILTER (WHERE confidence > 0),
+           COALESCE(SUM(confidence) FILTER (WHERE confidence > 0), 0)
+    FROM leaderboard
+    GROUP BY verdict;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Add the rows a statement inserted (or subtract those it deleted) to the
+-- table's row_counters entry
+CREATE OR REPLACE FUNCTION track_row_counter()
+RETURNS TRIGGER AS $$
+DECLARE
+    delta BIGINT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT COUNT(*) INTO delta FROM new_rows;
+    ELSE
+        SELECT -COUNT(*) INTO delta FROM old_rows;
+    END IF;
+
+    IF delta <> 0 THEN
+        INSERT INTO row_counters (name, value) VALUES (TG_TABLE_NAME, delta)
+        ON CONFLICT (name) DO UPDATE SET value = row_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recount the tracked tables (initial fill, or repair)
+CREATE OR REPLACE FUNCTION rebuild_row_counters()
+RETURNS void AS $$
+BEGIN
+    INSERT INTO row_counters (name, value)
+    VALUES ('users', (SELECT COUNT(*) FROM users)),
+           ('analysis_results', (SELECT COUNT(*) FROM analysis_results))
+    ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Earlier versions exposed a generic EXPLAIN-based estimate as an RPC
+DROP FUNCTION IF EXISTS count_estimate(TEXT);
+
+-- Database statistics for the leaderboard page: exact totals from
+-- row_counters, and the planner's row estimate (EXPLAIN of one fixed query,
+-- never executed) for the analyses made in the last 7 days
+CREATE OR REPLACE FUNCTION get_user_stats()
+RETURNS TABLE (total_users BIGINT, total_analyses BIGINT, recent_analyses BIGINT) AS $$
+DECLARE
+    plan JSONB;
+BEGIN
+    EXECUTE format(
+        'EXPLAIN (FORMAT JSON) SELECT 1 FROM analysis_results WHERE created_at >= %L',
+        NOW() - INTERVAL '7 days'
+    ) INTO plan;
+
+    RETURN QUERY SELECT
+        COALESCE((SELECT value FROM row_counters WHERE name = 'users'), 0),
+        COALESCE((SELECT value FROM row_counters WHERE name = 'analysis_results'), 0),
+        (plan->0->'Plan'->>'Plan Rows')::BIGINT;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Earlier versions locked every leaderboard write, rank recomputes included
+DROP TRIGGER IF EXISTS lock_leaderboard_version ON leaderboard;
+DROP FUNCTION IF EXISTS lock_leaderboard_version();
+
+-- Draw the next leaderboard version. The lock is held until the transaction
+-- commits, so versions commit in the order they were drawn: a client that
+-- has seen version N can never later miss a row stamped below N. Only writes
+-- that draw a version take it; rank recomputes and timestamp-only updates
+-- don't wait for it
+CREATE OR REPLACE FUNCTION next_leaderboard_version()
+RETURNS BIGINT AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('leaderboard_version'));
+    RETURN nextval('leaderboard_version_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+-- Stamp inserted rows, and rows whose scores changed, with a new version
+-- (rank_position and timestamp-only updates keep theirs: a rank moves with
+-- every change above it, and clients number rows by their order)
+CREATE OR REPLACE FUNCTION stamp_leaderboard_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.version IS NOT DISTINCT FROM OLD.version
+       AND (NEW.user_id, NEW.recent_skill, NEW.peak_skill, NEW.skill_match, NEW.confidence,
+            NEW.verdict, NEW.skill_score, NEW.last_analysis_at)
+           IS NOT DISTINCT FROM
+           (OLD.user_id, OLD.recent_skill, OLD.peak_skill, OLD.skill_match, OLD.confidence,
+            OLD.verdict, OLD.skill_score, OLD.last_analysis_at) THEN
+        RETURN NEW;
+    END IF;
+    NEW.version := next_leaderboard_version();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Leaderboard rows embed the user's profile, so a profile change is a change
+-- of their row (setting version to 0 makes stamp_leaderboard_version restamp it)
+CREATE OR REPLACE FUNCTION stamp_leaderboard_user()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE leaderboard SET version = 0 WHERE user_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_leaderboard_reset()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE leaderboard_resets SET reset_version = next_leaderboard_version();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Current leaderboard version (the highest committed row version) and the
+-- version of the last deletion
+CREATE OR REPLACE FUNCTION get_leaderboard_version()
+RETURNS TABLE (version BIGINT, reset_version BIGINT) AS $$
+    SELECT
+        (SELECT COALESCE(MAX(version), 0) FROM leaderboard),
+        (SELECT reset_version FROM leaderboard_resets);
+$$ LANGUAGE sql STABLE;
+
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -107,5 +441,62 @@ CREATE TRIGGER update_leaderboard_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
+CREATE OR REPLACE TRIGGER stamp_leaderboard_version
+    BEFORE INSERT OR UPDATE ON leaderboard
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_leaderboard_version();
+
+CREATE OR REPLACE TRIGGER stamp_leaderboard_user
+    AFTER UPDATE OF username, avatar_url, rank, pp ON users
+    FOR EACH ROW
+    WHEN ((OLD.username, OLD.avatar_url, OLD.rank, OLD.pp) IS DISTINCT FROM (NEW.username, NEW.avatar_url, NEW.rank, NEW.pp))
+    EXECUTE FUNCTION stamp_leaderboard_user();
+
+CREATE OR REPLACE TRIGGER record_leaderboard_reset
+    AFTER DELETE ON leaderboard
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION record_leaderboard_reset();
+
+-- Keep leaderboard_stats current; rank and timestamp updates don't touch it
+CREATE OR REPLACE TRIGGER track_leaderboard_stats_insert_delete
+    AFTER INSERT OR DELETE ON leaderboard
+    FOR EACH ROW
+    EXECUTE FUNCTION track_leaderboard_stats();
+
+CREATE OR REPLACE TRIGGER track_leaderboard_stats_update
+    AFTER UPDATE ON leaderboard
+    FOR EACH ROW
+    WHEN ((OLD.verdict, OLD.recent_skill, OLD.confidence) IS DISTINCT FROM (NEW.verdict, NEW.recent_skill, NEW.confidence))
+    EXECUTE FUNCTION track_leaderboard_stats();
+
+SELECT rebuild_leaderboard_stats();
+
+-- Keep row_counters current (statement-level, so bulk deletes are one update)
+CREATE OR REPLACE TRIGGER count_users_insert
+    AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION track_row_counter();
+
+CREATE OR REPLACE TRIGGER count_users_delete
+    AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION track_row_counter();
+
+CREATE OR REPLACE TRIGGER count_analysis_results_insert
+    AFTER INSERT ON analysis_results
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION track_row_counter();
+
+CREATE OR REPLACE TRIGGER count_analysis_results_delete
+    AFTER DELETE ON analysis_results
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION track_row_counter();
+
+SELECT rebuild_row_counters();
+
 -- Enable pg_trgm extension for better text search (if not already enabled)
 CREATE EXTENSION IF NOT EXISTS pg_trgm;
\ No newline at end of file
@@ -0,0 +1,39 @@
+import pytest
+
+from app.api.osu_client import OsuClient
+from benchmarks.fake_osu_api import FakeOsuApi
+
+
+@pytest.fixture
+def start_fake_api(monkeypatch):
+    """Start a FakeOsuApi (keyword arguments as for FakeOsuApi) and point osu! clients at it"""
+    servers = []
+
+    def start(**kwargs):
+        kwargs.setdefault('latency', 0)
+        api = FakeOsuApi(**kwargs).start()
+        servers.append(api)
+        for key, value in api.env().items():
+            monkeypatch.setenv(key, value)
+        # No client-side rate limit, and no state shared with other runs on this host
+        monkeypatch.setenv('OSU_RATE_LIMIT', '0')
+        monkeypatch.setenv('OSU_RATE_LIMIT_FILE', '')
+        monkeypatch.setenv('OSU_BEATMAP_STORE', '')
+        # Hedged duplicates would make upstream request counts timing-dependent
+        monkeypatch.setenv('OSU_HEDGE_REQUESTS', '0')
+        return api
+
+    yield start
+
+    for api in servers:
+        api.stop()
+
+
+@pytest.fixture
+def fake_api(start_fake_api):
+    return start_fake_api()
+
+
+@pytest.fixture
+def osu_client(fake_api):
+    return OsuClient()
@@ -0,0 +1,73 @@
+import time
+
+from app.api.cache import TTLCache, estimate_size
+
+
+def test_entries_expire_after_their_ttl():
+    cache = TTLCache('test', default_ttl=0.05)
+    cache.set('default', 1)
+    cache.set('longer', 2, ttl=60)
+
+    time.sleep(0.1)
+
+    assert cache.get('default') is None
+    assert cache.get('longer') == 2
+    assert cache.stats()['expirations'] == 1
+
+
+def test_entries_without_ttl_never_expire():
+    cache = TTLCache('test')
+    cache.set('key', 'value')
+
+    assert cache.get('key') == 'value'
+    assert cache.purge_expired() == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache('test', max_entries=3)
+    for key in 'abc':
+        cache.set(key, key)
+
+    # Reading 'a' makes 'b' the least recently used
+    assert cache.get('a') == 'a'
+    cache.set('d', 'd')
+
+    assert cache.get_many('abcd') == {'a': 'a', 'c': 'c', 'd': 'd'}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_limit_evicts_and_skips_oversized_values():
+    value = 'x' * 100
+    size = estimate_size(value)
+    cache = TTLCache('test', max_bytes=size * 2)
+
+    cache.set_many({1: value, 2: value})
+    cache.set(3, value)
+    assert sorted(cache.get_many([1, 2, 3])) == [2, 3]
+
+    cache.set(4, 'x' * 1000)
+    assert cache.get(4) is None
+    assert cache.stats()['bytes'] <= size * 2
+
+
+def test_expired_entries_are_reclaimed_on_write():
+    cache = TTLCache('test')
+    cache.set('stale', 1, ttl=0.01)
+    time.sleep(0.05)
+
+    cache.set('fresh', 2)
+
+    assert len(cache) == 1
+    assert cache.stats()['expirations'] == 1
+
+
+def test_delete_and_purge_expired():
+    cache = TTLCache('test')
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=0.01)
+    time.sleep(0.05)
+
+    assert cache.delete('a')
+    assert not cache.delete('a')
+    assert cache.purge_expired() == 1
+    assert len(cache) == 0
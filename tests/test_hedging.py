@@ -0,0 +1,67 @@
+from app.api.hedging import HedgeBudget, LatencyTracker
+from app.api.osu_client import OsuClient
+from app.api.rate_limiter import BACKGROUND, INTERACTIVE, TokenBucket
+
+
+def test_hedge_delay_needs_enough_samples():
+    tracker = LatencyTracker(min_samples=5, min_delay=0.01)
+    for _ in range(4):
+        tracker.record('beatmaps', 0.2)
+    assert tracker.hedge_delay('beatmaps') is None
+
+    tracker.record('beatmaps', 0.2)
+    assert tracker.hedge_delay('beatmaps') == 0.2
+
+
+def test_hedge_budget_allows_a_fraction_of_requests():
+    budget = HedgeBudget(fraction=0.25, burst=2)
+
+    hedges = 0
+    for _ in range(100):
+        budget.record_request()
+        if budget.try_spend():
+            hedges += 1
+
+    assert hedges == 25
+
+
+def test_hedge_budget_saves_up_at_most_burst():
+    budget = HedgeBudget(fraction=0.5, burst=2)
+    for _ in range(100):
+        budget.record_request()
+
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+
+    budget.refund()
+    assert budget.try_spend()
+
+
+def test_try_acquire_never_queues():
+    bucket = TokenBucket(rate=1, burst=3, background_headroom=1)
+
+    assert bucket.try_acquire(BACKGROUND)
+    assert bucket.try_acquire(BACKGROUND)
+    # The last token is reserved for interactive callers
+    assert not bucket.try_acquire(BACKGROUND)
+    assert bucket.try_acquire(INTERACTIVE)
+    assert not bucket.try_acquire(INTERACTIVE)
+
+
+def test_slow_route_hedges_only_a_fraction_of_requests(start_fake_api, monkeypatch):
+    api = start_fake_api(latency=0.1)
+    monkeypatch.setenv('OSU_HEDGE_REQUESTS', '1')
+    client = OsuClient()
+    # Enough fast samples that every request below outlives the route's p95
+    client.latency = LatencyTracker(window=1000)
+    for _ in range(1000):
+        client.latency.record('beatmaps', 0.01)
+    assert client.get_client_credentials_token()
+    api.reset_counts()
+
+    for beatmap_id in range(1, 41):
+        assert client.get_beatmap_info(beatmap_id)['id'] == beatmap_id
+
+    assert client.hedged_requests <= 2
+    assert client.hedges_skipped >= 30
+    assert api.request_counts['beatmap'] == 40 + client.hedged_requests
@@ -0,0 +1,19 @@
+from app.routes.analysis import decode_leaderboard_cursor, encode_leaderboard_cursor
+
+
+def test_cursor_round_trips_the_last_row():
+    cursor = encode_leaderboard_cursor({'skill_score': 1234.5, 'user_id': 42, 'username': 'someone'})
+
+    assert decode_leaderboard_cursor(cursor) == (1234.5, 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_leaderboard_cursor({'skill_score': 99999.99, 'user_id': 2 ** 40})
+
+    assert all(char.isalnum() or char in '-_' for char in cursor)
+
+
+def test_malformed_cursors_decode_to_none():
+    assert decode_leaderboard_cursor('') is None
+    assert decode_leaderboard_cursor('not a cursor') is None
+    assert decode_leaderboard_cursor(encode_leaderboard_cursor({'skill_score': 'x', 'user_id': 1})) is None
@@ -0,0 +1,84 @@
+import threading
+
+from app.api.osu_client import BEATMAPS_BULK_LIMIT, OsuClient
+
+
+def test_get_beatmaps_batch_fetches_in_bulk_chunks(osu_client, fake_api):
+    beatmap_ids = list(range(1, 2 * BEATMAPS_BULK_LIMIT + 21))
+
+    beatmaps = osu_client.get_beatmaps_batch(beatmap_ids)
+
+    assert sorted(beatmaps) == beatmap_ids
+    assert fake_api.request_counts['beatmaps'] == 3
+    assert fake_api.request_counts['beatmap'] == 0
+
+
+def test_get_beatmaps_batch_falls_back_to_per_id_lookups(start_fake_api):
+    api = start_fake_api(bulk_omitted_beatmaps={3, 7})
+    client = OsuClient()
+
+    beatmaps = client.get_beatmaps_batch(list(range(1, 11)))
+
+    assert sorted(beatmaps) == list(range(1, 11))
+    assert beatmaps[7]['id'] == 7
+    assert api.request_counts['beatmaps'] == 1
+    assert api.request_counts['beatmap'] == 2
+
+
+def test_get_beatmaps_batch_serves_cached_beatmaps(osu_client, fake_api):
+    osu_client.get_beatmaps_batch([1, 2, 3])
+    fake_api.reset_counts()
+
+    beatmaps = osu_client.get_beatmaps_batch([1, 2, 3])
+
+    assert sorted(beatmaps) == [1, 2, 3]
+    assert fake_api.total_requests() == 0
+
+
+def test_concurrent_batches_share_one_fetch(start_fake_api):
+    api = start_fake_api(latency=0.1)
+    client = OsuClient()
+    # Fetch the token first so only beatmap requests are counted
+    assert client.get_client_credentials_token()
+    api.reset_counts()
+
+    beatmap_ids = list(range(100, 120))
+    start = threading.Barrier(4)
+    results = []
+
+    def fetch():
+        start.wait()
+        results.append(client.get_beatmaps_batch(beatmap_ids))
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(sorted(result) == beatmap_ids for result in results)
+    assert api.request_counts['beatmaps'] == 1
+
+
+def test_concurrent_attribute_lookups_share_one_request(start_fake_api):
+    api = start_fake_api(latency=0.1)
+    client = OsuClient()
+    assert client.get_client_credentials_token()
+    api.reset_counts()
+
+    start = threading.Barrier(5)
+    results = []
+
+    def fetch():
+        start.wait()
+        results.append(client.get_difficulty_attributes(42, ('DT',)))
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5 and results[0] is not None
+    assert all(result == results[0] for result in results)
+    assert api.request_counts['attributes'] == 1
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from app.api.rate_limiter import BACKGROUND, INTERACTIVE, TokenBucket, request_lane
+
+
+def test_interactive_callers_queue_for_tokens():
+    bucket = TokenBucket(rate=10, burst=2, background_headroom=0)
+
+    assert bucket._take(INTERACTIVE) == (True, 0.0)
+    assert bucket._take(INTERACTIVE) == (True, 0.0)
+
+    # Out of tokens: still granted, but told to wait for the refill
+    granted, wait = bucket._take(INTERACTIVE)
+    assert granted
+    assert wait == pytest.approx(0.1, abs=0.02)
+
+
+def test_background_leaves_headroom_for_interactive():
+    bucket = TokenBucket(rate=1, burst=4, background_headroom=2)
+
+    assert bucket._take(BACKGROUND)[0]
+    assert bucket._take(BACKGROUND)[0]
+
+    # Only the headroom is left: background is refused, interactive is not
+    granted, wait = bucket._take(BACKGROUND)
+    assert not granted and wait > 0
+    assert bucket._take(INTERACTIVE) == (True, 0.0)
+    assert bucket._take(INTERACTIVE) == (True, 0.0)
+
+
+def test_penalize_holds_back_both_lanes():
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.penalize(0.5)
+
+    granted, wait = bucket._take(BACKGROUND)
+    assert not granted and wait == pytest.approx(0.5, abs=0.05)
+
+    granted, wait = bucket._take(INTERACTIVE)
+    assert granted and wait == pytest.approx(0.5, abs=0.05)
+
+
+def test_acquire_uses_the_current_lane():
+    bucket = TokenBucket(rate=0)
+
+    bucket.acquire()
+    with request_lane(BACKGROUND):
+        bucket.acquire()
+
+    lanes = bucket.stats()['lanes']
+    assert lanes[INTERACTIVE]['acquired'] == 1
+    assert lanes[BACKGROUND]['acquired'] == 1
+
+
+def test_background_acquire_waits_for_refill():
+    bucket = TokenBucket(rate=20, burst=2, background_headroom=1)
+
+    started = time.monotonic()
+    bucket.acquire(BACKGROUND)
+    bucket.acquire(BACKGROUND)
+
+    # The second token is only taken once the headroom has refilled
+    assert time.monotonic() - started >= 0.03
@@ -0,0 +1,118 @@
+import pytest
+
+from app.api.score_ingester import FEED_NAME, ScoreFeedIngester
+
+
+class FeedDatabase:
+    """In-memory stand-in for the SupabaseDatabase methods the ingester uses"""
+
+    def __init__(self, tracked, cursor=None):
+        self.tracked = set(tracked)
+        self.cursors = {FEED_NAME: cursor} if cursor else {}
+        self.scores = {}
+        self.marked = set()
+        self.fail_saves_for = set()
+
+    def get_tracked_osu_ids(self):
+        return set(self.tracked)
+
+    def get_ingest_cursor(self, name):
+        return self.cursors.get(name)
+
+    def save_ingest_cursor(self, name, cursor_string):
+        self.cursors[name] = cursor_string
+        return True
+
+    def save_scores(self, osu_user_id, scores, is_best=False):
+        if osu_user_id in self.fail_saves_for:
+            return None
+        for score in scores:
+            self.scores[score['id']] = (osu_user_id, score)
+        return len(scores)
+
+    def mark_users_for_reanalysis(self, osu_ids):
+        self.marked.update(osu_ids)
+        return len(osu_ids)
+
+
+def feed_scores(api, pages=None):
+    pages = api.score_feed_pages if pages is None else [api.score_feed_pages[index] for index in pages]
+    return [score for page in pages for score in page['scores']]
+
+
+@pytest.fixture
+def tracked(fake_api):
+    # A handful of players from every fixture page
+    return {page['scores'][0]['user_id'] for page in fake_api.score_feed_pages} | {
+        page['scores'][-1]['user_id'] for page in fake_api.score_feed_pages
+    }
+
+
+def test_run_once_stores_only_tracked_users_scores(osu_client, fake_api, tracked):
+    db = FeedDatabase(tracked)
+
+    run = ScoreFeedIngester(osu_client, db).run_once()
+
+    expected = {
+        score['id'] for score in feed_scores(fake_api)
+        if score['user_id'] in tracked and score.get('passed', True)
+    }
+    assert set(db.scores) == expected
+    assert all(osu_user_id in tracked for osu_user_id, _ in db.scores.values())
+    assert db.marked == {osu_user_id for osu_user_id, _ in db.scores.values()}
+    assert run['scores_seen'] == len(feed_scores(fake_api))
+    assert run['scores_stored'] == len(expected)
+
+
+def test_stored_scores_carry_their_beatmap(osu_client, fake_api, tracked):
+    db = FeedDatabase(tracked)
+
+    ScoreFeedIngester(osu_client, db).run_once()
+
+    for _, score in db.scores.values():
+        assert score['beatmap']['id'] == score['beatmap_id']
+        assert 'status' in score['beatmap']
+        assert score['created_at'] == score['ended_at']
+
+
+def test_cursor_is_checkpointed_and_resumed(osu_client, fake_api, tracked):
+    db = FeedDatabase(tracked)
+    ingester = ScoreFeedIngester(osu_client, db)
+
+    ingester.run_once()
+    last_cursor = fake_api.score_feed_pages[-1]['cursor_string']
+    assert db.cursors[FEED_NAME] == last_cursor
+
+    # Caught up: the next run asks for one page past the checkpoint and stores nothing
+    fake_api.reset_counts()
+    run = ingester.run_once()
+    assert fake_api.request_counts['score_feed'] == 1
+    assert run['scores_stored'] == 0
+    assert db.cursors[FEED_NAME] == last_cursor
+
+
+def test_run_starts_from_the_saved_cursor(osu_client, fake_api, tracked):
+    db = FeedDatabase(tracked, cursor=fake_api.score_feed_pages[1]['cursor_string'])
+
+    ScoreFeedIngester(osu_client, db).run_once()
+
+    last_page_ids = {score['id'] for score in feed_scores(fake_api, pages=[2])}
+    assert db.scores and set(db.scores) <= last_page_ids
+
+
+def test_failed_save_keeps_the_cursor_on_that_page(osu_client, fake_api, tracked):
+    second_page = fake_api.score_feed_pages[1]
+    failing_user = next(score['user_id'] for score in second_page['scores'] if score['user_id'] in tracked)
+    db = FeedDatabase(tracked)
+    db.fail_saves_for.add(failing_user)
+
+    run = ScoreFeedIngester(osu_client, db).run_once()
+
+    # Only the first page was ingested; the next run retries the second
+    assert run['pages'] == 1
+    assert db.cursors[FEED_NAME] == fake_api.score_feed_pages[0]['cursor_string']
+
+    db.fail_saves_for.clear()
+    ScoreFeedIngester(osu_client, db).run_once()
+    assert {score['id'] for score in second_page['scores'] if score['user_id'] == failing_user} <= set(db.scores)
+    assert db.cursors[FEED_NAME] == fake_api.score_feed_pages[-1]['cursor_string']
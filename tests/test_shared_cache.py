@@ -0,0 +1,47 @@
+from app.api.shared_cache import SharedCache, shared_cache_from_env
+
+
+class ApiCacheTable:
+    """In-memory stand-in for the api_cache methods of SupabaseDatabase"""
+
+    def __init__(self):
+        self.rows = {}
+        self.upserts = 0
+
+    def get_api_cache_entries(self, keys):
+        return {key: self.rows[key][0] for key in keys if key in self.rows}
+
+    def set_api_cache_entries(self, entries):
+        self.rows.update(entries)
+        self.upserts += 1
+
+    def purge_expired_api_cache(self):
+        return 0
+
+
+def test_without_background_writer_entries_wait_for_flush():
+    table = ApiCacheTable()
+    cache = SharedCache(table, background=False)
+
+    cache.set_many({'a': 1, 'b': 2}, ttl=60)
+    cache.set_many({'c': 3}, ttl=60)
+
+    assert cache._writer is None
+    assert table.rows == {}
+    # Buffered entries are still visible to this process
+    assert cache.get_many(['a', 'c']) == {'a': 1, 'c': 3}
+
+    cache.flush()
+    assert sorted(table.rows) == ['a', 'b', 'c']
+    assert table.upserts == 1
+
+
+def test_vercel_defaults_to_flushing_per_request(monkeypatch):
+    monkeypatch.setenv('VERCEL', '1')
+    assert not shared_cache_from_env(ApiCacheTable()).background
+
+    monkeypatch.delenv('VERCEL')
+    assert shared_cache_from_env(ApiCacheTable()).background
+
+    monkeypatch.setenv('OSU_SHARED_CACHE_BACKGROUND', '0')
+    assert not shared_cache_from_env(ApiCacheTable()).background
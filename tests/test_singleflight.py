@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from app.api.deadline import request_deadline
+from app.api.rate_limiter import BACKGROUND, request_lane
+from app.api.singleflight import SingleFlight
+
+
+def run_concurrently(count, fn):
+    """Call fn() from count threads released together; returns results and errors"""
+    start = threading.Barrier(count)
+    results, errors = [], []
+
+    def call():
+        start.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'result'
+
+    results, errors = run_concurrently(8, lambda: flight.do('key', work))
+
+    assert results == ['result'] * 8 and not errors
+    assert len(calls) == 1
+    assert flight.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 7, 'unshared': 0}
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight()
+
+    def work():
+        time.sleep(0.1)
+        raise ValueError('upstream failed')
+
+    results, errors = run_concurrently(4, lambda: flight.do('key', work))
+
+    assert not results
+    assert len(errors) == 4 and all(isinstance(e, ValueError) for e in errors)
+    assert flight.stats()['executed'] == 1
+
+
+def test_finished_calls_are_not_remembered():
+    flight = SingleFlight()
+
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
+    assert flight.stats()['executed'] == 2
+
+
+def test_follower_gives_up_at_its_deadline():
+    flight = SingleFlight()
+    call, is_leader = flight.begin('key')
+    assert is_leader
+
+    started = time.monotonic()
+    with request_deadline(0.1):
+        with pytest.raises(TimeoutError):
+            flight.do('key', lambda: 'unused')
+    assert time.monotonic() - started < 1
+
+    flight.finish('key', call, 'late')
+
+
+def test_background_callers_never_lead_a_shared_call():
+    flight = SingleFlight()
+
+    with request_lane(BACKGROUND):
+        background_call, background_leads = flight.begin('key')
+    assert background_leads
+
+    # An interactive caller does not wait on the background work...
+    call, is_leader = flight.begin('key')
+    assert is_leader and call is not background_call
+
+    # ...but background callers still join interactive flights
+    with request_lane(BACKGROUND):
+        joined, background_leads = flight.begin('key')
+    assert joined is call and not background_leads
+
+    flight.finish('key', background_call, 'background')
+    flight.finish('key', call, 'interactive')
+    assert joined.wait() == 'interactive'
+    assert flight.stats() == {'in_flight': 0, 'executed': 2, 'coalesced': 1, 'unshared': 1}
+
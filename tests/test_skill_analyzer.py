@@ -0,0 +1,39 @@
+from app.api.skill_analyzer import SkillAnalyzer
+
+
+def make_play(mods, star_rating=None, difficulty_rating=6.0):
+    play = {
+        'accuracy': 0.97,
+        'created_at': '2026-01-01T00:00:00Z',
+        'mods': mods,
+        'beatmap': {'id': 1, 'difficulty_rating': difficulty_rating, 'ar': 9.0, 'bpm': 180}
+    }
+    if star_rating is not None:
+        play['difficulty_attributes'] = {'star_rating': star_rating}
+    return play
+
+
+def test_skill_components_use_the_fetched_star_rating():
+    analyzer = SkillAnalyzer()
+    unmodded = analyzer.calculate_skill_components(make_play([]))
+    with_attributes = analyzer.calculate_skill_components(make_play(['DT'], star_rating=8.4))
+    assert all(modded > base for modded, base in zip(with_attributes, unmodded))
+    assert analyzer.calculate_skill_components(make_play(['DT'])) == unmodded
+
+
+def test_fetched_star_rating_replaces_the_mod_bonus():
+    analyzer = SkillAnalyzer()
+    assert analyzer.get_mod_multiplier(['DT', 'HD'], star_rating_adjusted=True) == analyzer.mod_multipliers['HD']
+    assert analyzer.get_mod_multiplier(['HR'], star_rating_adjusted=True) == 1.0
+    assert analyzer.get_mod_multiplier(['HR']) == analyzer.mod_multipliers['HR']
+
+    # A DT play with its real 8.4* rating scores as an 8.4* nomod play would
+    assert analyzer.calculate_skill_score(make_play(['DT'], star_rating=8.4)) == \
+        analyzer.calculate_skill_score(make_play([], difficulty_rating=8.4))
+
+
+def test_validation_checks_the_mod_adjusted_star_rating():
+    analyzer = SkillAnalyzer()
+    assert analyzer.validate_play_data(make_play(['HT'], star_rating=9.5, difficulty_rating=12.5))
+    assert analyzer.validate_play_data(make_play(['DT'], star_rating=12.8, difficulty_rating=9.1))
+    assert not analyzer.validate_play_data(make_play(['DT'], star_rating=16.0, difficulty_rating=11.0))